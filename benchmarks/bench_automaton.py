@@ -0,0 +1,73 @@
+"""
+字典树最长匹配打分与jieba分词后打分的一致性报告：得分完全一致、正负号一致的比例，平均绝对差，相关系数，以及两者的吞吐量
+运行：python -m benchmarks.bench_automaton [评论数] [-mongo]
+  -mongo 使用MongoDB中清洗、去重后的真实评论，默认使用与bench_segment相同的合成评论
+"""
+import sys
+import time
+import tempfile
+from pathlib import Path
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import jieba
+from preprocessing.lexicon import ROOT, Lexicon
+from preprocessing.automaton import Automaton
+from preprocessing.pipeline import Pipeline, clean
+from benchmarks.bench_segment import make_corpus
+
+
+def mongo_corpus(lexicon: Lexicon, count: int) -> list[str]:
+  from pymongo import MongoClient
+  from common.db.schema import DATABASE
+  contents = []
+  for batch in Pipeline(MongoClient("mongodb://localhost:27017/")[DATABASE], lexicon).batches():
+    contents.extend(row.content for row in batch)
+    if len(contents) >= count:
+      break
+  return contents[:count]
+
+
+def main(count: int, mongo: bool) -> None:
+  lexicon = Lexicon()
+  jieba.initialize()
+  if mongo:
+    contents = mongo_corpus(lexicon, count)
+  else:
+    contents = [content for content in map(clean, make_corpus(lexicon, count)) if content is not None]
+  count = len(contents)
+  print(f"{count}条{'真实' if mongo else '合成'}评论，平均{sum(map(len, contents)) / count:.0f}字")
+
+  with tempfile.TemporaryDirectory() as directory:
+    path = Path(directory).joinpath("automaton.pickle")
+    start = time.perf_counter()
+    Automaton.load(ROOT, path)
+    build = time.perf_counter() - start
+    start = time.perf_counter()
+    automaton = Automaton.load(ROOT, path)
+    load = time.perf_counter() - start
+    print(f"字典树 {len(automaton.children)}个状态  构建{build:.3f}s  读取{load:.3f}s  {path.stat().st_size / 1024:.0f}KB")
+
+  start = time.perf_counter()
+  expected = np.array([lexicon.get_emotion(lexicon.cut_content(content)) for content in contents])
+  segmented = time.perf_counter() - start
+  start = time.perf_counter()
+  result = np.array(automaton(contents))
+  fast = time.perf_counter() - start
+  print(f"{'jieba分词+打分':<14} {count / segmented:>10.0f} 条/s")
+  print(f"{'字典树':<14} {count / fast:>10.0f} 条/s  相对jieba {segmented / fast:.2f}x")
+
+  print(f"得分完全一致   {np.mean(result == expected):.2%}")
+  print(f"正负号一致     {np.mean(np.sign(result) == np.sign(expected)):.2%}")
+  print(f"平均绝对差     {np.mean(np.abs(result - expected)):.4f}")
+  if expected.std() > 0 and result.std() > 0:
+    print(f"相关系数       {np.corrcoef(result, expected)[0, 1]:.4f}")
+  print("正负号混淆矩阵（行为jieba，列为字典树；负/零/正）")
+  for row in (-1, 0, 1):
+    print("  " + " ".join(f"{np.sum((np.sign(expected) == row) & (np.sign(result) == column)):>8}" for column in (-1, 0, 1)))
+
+
+if __name__ == "__main__":
+  count = int(sys.argv[1]) if len(sys.argv) > 1 and not sys.argv[1].startswith("-") else 50000
+  main(count, "-mongo" in sys.argv)
@@ -0,0 +1,81 @@
+"""
+端到端对比两种评论暂存后端：模拟爬虫逐页暂存评论、每隔若干页提交检查点，统计从爬取开始到全部写入MongoDB的耗时
+  redis：LPUSH到Redis列表，提交时transfer读回并写入MongoDB（每条评论经过三次网络）
+  memory：进程内有界队列，后台协程边爬取边写入MongoDB（每条评论经过一次网络）
+需要本地redis-server与mongod
+运行：python -m benchmarks.bench_backends [redis端口] [mongod端口] [每页模拟请求耗时(秒)]
+Redis使用第15号库，MongoDB使用独立的测试库，结束后清空
+"""
+import sys
+import time
+import asyncio
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from bili.api import schema
+from common.db.redis import Redis
+from common.db.staging import Backend, create_staging
+
+PAGES = 500
+COMMENTS_PER_PAGE = 80
+CHECKPOINT_EVERY = 10
+DB = 15
+DATABASE = "MobileGameCommentsBench"
+
+
+def make_pages() -> list[list[bytes]]:
+  pages = []
+  for page in range(PAGES):
+    comments = []
+    for i in range(COMMENTS_PER_PAGE):
+      rpid = page * COMMENTS_PER_PAGE + i
+      comment = schema.Comment(id=rpid, rpid=rpid, aid=1, level=5, time=1700000000 + rpid, content="新版本太好玩了" * 4, like=rpid % 100, is_root=i % 4 == 0)
+      comments.append(schema.encode(comment))
+    pages.append(comments)
+  return pages
+
+
+async def crawl(writer, pages: list[list[bytes]], delay: float) -> None:
+  """与fetch_video_comments相同的暂存/提交节奏，delay模拟每页请求的耗时"""
+  for page, comments in enumerate(pages, 1):
+    await asyncio.sleep(delay)
+    await writer.add(comments)
+    if page % CHECKPOINT_EVERY == 0:
+      await writer.commit()
+  await writer.commit()
+  await writer.close()
+
+
+async def main(redis_port: int, mongo_port: int, delay: float) -> None:
+  redis = Redis(port=redis_port, db=DB)
+  client = AsyncIOMotorClient(port=mongo_port)
+  collection = client[DATABASE]["BilibiliComments"]
+  pages = make_pages()
+  count = PAGES * COMMENTS_PER_PAGE
+  print(f"{PAGES}页，每页{COMMENTS_PER_PAGE}条评论，每{CHECKPOINT_EVERY}页提交一次，每页模拟请求耗时{delay * 1000:.0f}ms")
+  results = {}
+  try:
+    for backend in Backend:
+      key = f"bench:backends:{backend.value}"
+      await redis.client.delete(key, f"{key}:inflight")
+      await collection.drop()
+      writer = create_staging(backend, redis, key, collection)
+      start = time.perf_counter()
+      await crawl(writer, pages, delay)
+      cost = time.perf_counter() - start
+      assert await collection.count_documents({}) == count, "写入数量不一致"
+      results[backend] = cost
+      print(f"{backend.value:<8} {cost:>8.2f} s  {count / cost:>10.0f} 条/s")
+    print(f"memory相对redis加速 {results[Backend.Redis] / results[Backend.Memory]:.2f}x")
+  finally:
+    await client.drop_database(DATABASE)
+    await redis.client.aclose()
+
+
+if __name__ == "__main__":
+  redis_port = int(sys.argv[1]) if len(sys.argv) > 1 else 6379
+  mongo_port = int(sys.argv[2]) if len(sys.argv) > 2 else 27017
+  delay = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+  asyncio.run(main(redis_port, mongo_port, delay))
@@ -0,0 +1,195 @@
+"""
+对比评论页响应的两种解码方式，统计每条评论的解析 + 序列化开销：
+  dict：json.loads完整响应，手动复制字段到新dict，再json.dumps（旧方式）
+  typed：按类型化模式只解码需要的字段，结构体直接序列化为缓存格式
+运行：python -m benchmarks.bench_decode [录制的响应.json ...]
+录制的响应可以用 bili/api/api.py 或 weibo/api.py 的 test 保存；未指定时使用按真实响应结构构造的样本
+"""
+import sys
+import json
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from bili.api import schema as bili_schema
+from weibo import schema as weibo_schema
+
+ROUNDS = 200
+
+
+def bili_member(mid: int) -> dict:
+  return {
+    "mid": str(mid), "uname": f"用户{mid}", "sex": "保密", "sign": "这个人很懒，什么都没有写" * 2,
+    "avatar": f"https://i0.hdslb.com/bfs/face/{mid:040x}.jpg", "rank": "10000", "face_nft_new": 0,
+    "is_senior_member": 0, "senior": {}, "level_info": {"current_level": mid % 7, "current_min": 0, "current_exp": 0, "next_exp": 0},
+    "pendant": {"pid": 0, "name": "", "image": "", "expire": 0, "image_enhance": "", "image_enhance_frame": "", "n_pid": 0},
+    "nameplate": {"nid": 0, "name": "", "image": "", "image_small": "", "level": "", "condition": ""},
+    "official_verify": {"type": -1, "desc": ""},
+    "vip": {
+      "vipType": 1, "vipDueDate": 1700000000000, "dueRemark": "", "accessStatus": 0, "vipStatus": 1,
+      "vipStatusWarn": "", "themeType": 0, "label": {"path": "", "text": "", "label_theme": "", "text_color": "",
+      "bg_style": 0, "bg_color": "", "border_color": ""}, "avatar_subscript": 0, "nickname_color": "",
+    },
+    "fans_detail": None, "user_sailing": {"pendant": None, "cardbg": None, "cardbg_with_focus": None},
+    "user_sailing_v2": {}, "is_contractor": False, "contract_desc": "", "nft_interaction": None,
+    "avatar_item": {"container_size": {"width": 1.8, "height": 1.8}, "fallback_layers": {"layers": [], "is_critical_group": True}},
+  }
+
+
+def bili_reply(rpid: int, root: int, replies: list[dict]) -> dict:
+  return {
+    "rpid": rpid, "oid": 712909579, "type": 1, "mid": rpid % 100000, "root": root, "parent": root, "dialog": 0,
+    "count": len(replies), "rcount": len(replies) * 3, "state": 0, "fansgrade": 0, "attr": 0,
+    "ctime": 1700000000 + rpid % 100000, "mid_str": str(rpid % 100000), "oid_str": "712909579",
+    "rpid_str": str(rpid), "root_str": str(root), "parent_str": str(root), "dialog_str": "0",
+    "like": rpid % 1000, "action": 0, "member": bili_member(rpid % 100000),
+    "content": {
+      "message": "原神启动！这次的新角色强度怎么样？[doge][doge] 求大佬解答" * 2, "members": [],
+      "emote": {"[doge]": {"id": 26, "package_id": 1, "state": 0, "type": 1, "attr": 0, "text": "[doge]",
+                           "url": "https://i0.hdslb.com/bfs/emote/doge.png", "meta": {"size": 1, "suggest": [""]},
+                           "mtime": 1668688325, "jump_title": "doge"}},
+      "jump_url": {}, "max_line": 6,
+    },
+    "replies": replies or None, "assist": 0,
+    "up_action": {"like": False, "reply": False}, "invisible": False,
+    "reply_control": {"max_line": 6, "sub_reply_entry_text": f"共{len(replies) * 3}条回复",
+                      "sub_reply_title_text": f"相关回复共{len(replies) * 3}条", "time_desc": "1天前发布", "location": "IP属地：上海"},
+    "folder": {"has_folded": False, "is_folded": False, "rule": ""}, "dynamic_id_str": "0", "note_cvid_str": "0", "track_info": "",
+  }
+
+
+def bili_page() -> str:
+  replies = []
+  for i in range(20):
+    root = 200000000 + i * 10
+    subs = [bili_reply(root + j, root, []) for j in range(1, 4)]
+    replies.append(bili_reply(root, 0, subs))
+  return json.dumps({
+    "code": 0, "message": "0", "ttl": 1,
+    "data": {
+      "cursor": {"is_begin": True, "prev": 1, "next": 2, "is_end": False, "mode": 3, "mode_text": "热门评论",
+                 "all_count": 12345, "support_mode": [2, 3], "name": "热门评论", "pagination_reply": {"next_offset": "x" * 60}},
+      "hots": None, "notice": None, "replies": replies, "top": {"admin": None, "upper": None, "vote": None},
+      "top_replies": None, "up_selection": {"pending_count": 0, "ignore_count": 0}, "effects": {"preloading": ""},
+      "assist": 0, "blacklist": 0, "vote": 0, "config": {"showtopic": 1, "show_up_flag": True, "read_only": False},
+      "upper": {"mid": 401742377}, "control": {"input_disable": False, "root_input_text": "发一条友善的评论"},
+      "note": 1, "esports_grade_card": None, "callbacks": None, "context_feature": "",
+    },
+  }, ensure_ascii=False)
+
+
+def weibo_user(uid: int) -> dict:
+  return {
+    "id": uid, "idstr": str(uid), "pc_new": 7, "screen_name": f"微博用户{uid}",
+    "profile_image_url": f"https://tvax1.sinaimg.cn/crop.0.0.1080.1080.50/{uid:032x}.jpg",
+    "profile_url": f"/u/{uid}", "verified": False, "verified_type": -1, "domain": "", "weihao": "",
+    "avatar_large": f"https://tvax1.sinaimg.cn/crop.0.0.1080.1080.180/{uid:032x}.jpg",
+    "avatar_hd": f"https://tvax1.sinaimg.cn/crop.0.0.1080.1080.1024/{uid:032x}.jpg",
+    "follow_me": False, "following": False, "mbrank": 0, "mbtype": 0, "v_plus": 0, "user_ability": 0,
+    "planet_video": False, "icon_list": [], "location": "上海", "gender": "f", "followers_count": 123,
+    "followers_count_str": "123", "friends_count": 456, "statuses_count": 789, "description": "简介" * 10,
+  }
+
+
+def weibo_page() -> str:
+  data = []
+  for i in range(20):
+    id = 5100000000000000 + i
+    data.append({
+      "created_at": "Sat Oct 12 10:00:00 +0800 2024", "id": id, "rootid": id, "rootidstr": str(id),
+      "floor_number": i + 1, "text": "<a href='/n/xx'>@xx</a> 新版本太好玩了" * 2, "disable_reply": 0,
+      "restrictOperate": 0, "source": "来自上海", "user": weibo_user(1000000000 + i), "mid": str(id), "idstr": str(id),
+      "url_objects": [], "liked": False, "readtimetype": "comment", "analysis_extra": "", "match_ai_play_picture": False,
+      "rid": "0_0_0_0_0_0", "allow_follow": True, "item_category": "comment", "degrade_type": "", "report_scheme": "",
+      "like_counts": i * 7, "isLikedByMblogAuthor": False, "more_info_type": 0, "comments": [], "max_id": 0,
+      "total_number": 0, "isExpand": False, "text_raw": "@xx 新版本太好玩了" * 2,
+    })
+  return json.dumps({
+    "ok": 1, "filter_group": [{"title": "按热度", "scheme": ""}, {"title": "按时间", "scheme": ""}],
+    "data": data, "rootComment": [], "total_number": 4567, "max_id": 139000000000000, "trendsText": "已加载全部评论",
+  }, ensure_ascii=False)
+
+
+def bili_dict(text: str) -> list[str]:
+  """旧方式（fetch_page_comments）"""
+  out = []
+  for reply in json.loads(text)["data"]["replies"]:
+    for r, is_root in [(reply, True)] + [(rr, False) for rr in reply["replies"] or []]:
+      comment = {}
+      comment["rpid"] = r["rpid"]
+      comment["aid"] = 712909579
+      comment["level"] = r["member"]["level_info"]["current_level"]
+      comment["time"] = r["ctime"]
+      comment["content"] = r["content"]["message"]
+      comment["like"] = r["like"]
+      comment["is_root"] = is_root
+      out.append(json.dumps(comment))
+  return out
+
+
+def bili_typed(text: str) -> list[bytes]:
+  out = []
+  for reply in bili_schema.decode_replies(text).replies:
+    out.append(bili_schema.encode(bili_schema.Comment.of(reply, 712909579, True)))
+    for rreply in reply.replies or []:
+      out.append(bili_schema.encode(bili_schema.Comment.of(rreply, 712909579, False)))
+  return out
+
+
+def weibo_dict(text: str) -> list[str]:
+  """旧方式（run_fetch_blog_comments）"""
+  out = []
+  for info in json.loads(text)["data"]:
+    comment = {"blogid": 1, "time": info["created_at"], "likes": info["like_counts"], "content": info["text_raw"]}
+    out.append(json.dumps(comment))
+  return out
+
+
+def weibo_typed(text: str) -> list[bytes]:
+  return [weibo_schema.encode(weibo_schema.Comment.of(raw, 1)) for raw in weibo_schema.decode_comments(text).data]
+
+
+def bench(name: str, fn, pages: list[str]) -> float:
+  count = sum(len(fn(page)) for page in pages)
+  start = time.perf_counter()
+  for _ in range(ROUNDS):
+    for page in pages:
+      fn(page)
+  cost = (time.perf_counter() - start) / ROUNDS / count
+  print(f"{name:<14} {cost * 1e6:>8.2f} μs/条  （{count}条评论，{sum(map(len, pages)) / 1024:.0f}KiB）")
+  return cost
+
+
+def main(paths: list[str]) -> None:
+  bili_pages, weibo_pages = [], []
+  for path in paths:
+    with open(path, "r", encoding="utf-8") as f:
+      text = f.read()
+    (bili_pages if "code" in json.loads(text) else weibo_pages).append(text)
+  bili_pages = bili_pages or [bili_page()]
+  weibo_pages = weibo_pages or [weibo_page()]
+
+  # 新格式多了以评论id作为的_id（微博评论还多了is_root），其余字段一致
+  def without_id(records: list) -> list[dict]:
+    documents = [json.loads(x) for x in records]
+    for document in documents:
+      document.pop("_id", None)
+      if "blogid" in document:
+        document.pop("is_root", None)
+    return documents
+
+  for page in bili_pages:
+    assert without_id(bili_dict(page)) == without_id(bili_typed(page))
+  for page in weibo_pages:
+    assert without_id(weibo_dict(page)) == without_id(weibo_typed(page))
+
+  for platform, pages, old, new in [("bilibili", bili_pages, bili_dict, bili_typed), ("weibo", weibo_pages, weibo_dict, weibo_typed)]:
+    print(f"[{platform}]")
+    before = bench("dict", old, pages)
+    after = bench("typed", new, pages)
+    print(f"{'加速':<14} {before / after:>8.1f}x")
+
+
+if __name__ == "__main__":
+  main(sys.argv[1:])
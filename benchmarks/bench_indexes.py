@@ -0,0 +1,136 @@
+"""
+对比创建索引前后热点查询的耗时与执行计划，需要本地mongod
+运行：python -m benchmarks.bench_indexes [host] [port] [评论数]
+向独立的测试库写入合成数据（默认B站评论200万条、微博评论100万条），结束后删除该库
+"""
+import sys
+import time
+import random
+import asyncio
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from common.db.schema import ensure_indexes
+
+DATABASE = "MobileGameCommentsBench"
+CHUNK = 10000
+# 每个视频/文章的平均评论数
+COMMENTS_PER_ITEM = 2000
+MIDS = [401742377, 161775300, 57863910, 211005705, 211700578, 414149787, 404145357]
+UIDS = [6593199887, 6279793937, 5698023579, 6140485374, 6355968578]
+GAMES = ["原神", "明日方舟", "王者荣耀", "第五人格", "光遇", "Phigros", "Arcaea"]
+
+
+async def insert(db: AsyncIOMotorDatabase, name: str, make, count: int) -> None:
+  """分块并发写入count条由make(i)生成的文档"""
+  semaphore = asyncio.Semaphore(4)
+
+  async def chunk(start: int) -> None:
+    async with semaphore:
+      await db[name].insert_many([make(i) for i in range(start, min(start + CHUNK, count))], ordered=False)
+
+  await asyncio.gather(*[chunk(start) for start in range(0, count, CHUNK)])
+
+
+async def seed(db: AsyncIOMotorDatabase, bili_count: int, weibo_count: int) -> None:
+  videos = max(1, bili_count // COMMENTS_PER_ITEM)
+  articles = max(1, weibo_count // COMMENTS_PER_ITEM)
+  rand = random.Random(0)
+  await insert(db, "BilibiliVideos", lambda i: {
+    "_id": i, "mid": MIDS[i % len(MIDS)], "comments": rand.randint(0, 50000), "finished": i % 10 != 0,
+  }, videos)
+  await insert(db, "WeiboArticles", lambda i: {
+    "_id": i, "uid": UIDS[i % len(UIDS)], "comments": rand.randint(0, 5000), "finished": i % 10 != 0,
+  }, articles)
+  await insert(db, "BilibiliComments", lambda i: {
+    "_id": i, "rpid": i, "aid": rand.randrange(videos), "level": rand.randint(0, 6), "time": 1600000000 + i,
+    "content": "新版本太好玩了", "like": rand.randint(0, 100), "is_root": rand.random() < 0.3,
+  }, bili_count)
+  await insert(db, "WeiboComments", lambda i: {
+    "_id": i, "blogid": rand.randrange(articles), "time": "Sat Oct 12 10:00:00 +0800 2024",
+    "likes": rand.randint(0, 100), "content": "新版本太好玩了",
+  }, weibo_count)
+  for name in ["Result", "BilibiliResult", "WeiboResult"]:
+    await insert(db, name, lambda i: {
+      "game": GAMES[i % len(GAMES)], "time": 1600000000 + i // len(GAMES) * 2592000, "emotion": rand.random(),
+    }, len(GAMES) * 48)
+
+
+def queries() -> dict[str, dict]:
+  """名称 -> 要explain的命令，与爬虫、预处理中的查询一致"""
+  return {
+    "加载待爬视频": {"find": "BilibiliVideos", "filter": {"mid": {"$in": MIDS[:3]}, "finished": {"$ne": True}}},
+    "加载待爬文章": {"find": "WeiboArticles", "filter": {"uid": {"$in": UIDS[:3]}, "finished": {"$ne": True}}},
+    "推算B站水位线": {
+      "find": "BilibiliComments", "filter": {"aid": 1, "is_root": True}, "sort": {"time": -1, "rpid": -1},
+      "projection": {"time": 1, "rpid": 1}, "limit": 1,
+    },
+    "读取文章评论": {"find": "WeiboComments", "filter": {"blogid": 1}, "projection": {"time": 1}},
+    # explain不会真正执行删除与写入
+    "删除文章评论": {"delete": "WeiboComments", "deletes": [{"q": {"blogid": 1}, "limit": 0}]},
+    "写入情绪结果": {
+      "update": "Result",
+      "updates": [{"q": {"game": GAMES[0], "time": 1600000000}, "u": {"$set": {"emotion": 0.5}}, "upsert": True}],
+    },
+  }
+
+
+def winning_stages(plan: dict) -> str:
+  """执行计划的阶段链，如 FETCH <- IXSCAN"""
+  stages = []
+  while plan:
+    stages.append(plan["stage"])
+    plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+  return " <- ".join(stages)
+
+
+async def measure(db: AsyncIOMotorDatabase, rounds: int = 5) -> dict[str, tuple[float, int, str]]:
+  """每个查询：(中位耗时ms, 扫描的文档数, 执行计划)"""
+  results = {}
+  for name, command in queries().items():
+    costs = []
+    for _ in range(rounds):
+      start = time.perf_counter()
+      explain = await db.command("explain", command, verbosity="executionStats")
+      costs.append(time.perf_counter() - start)
+    stats = explain["executionStats"]
+    plan = explain["queryPlanner"]["winningPlan"]
+    results[name] = (sorted(costs)[rounds // 2] * 1000, stats["totalDocsExamined"], winning_stages(plan.get("queryPlan", plan)))
+  return results
+
+
+async def main(host: str, port: int, count: int) -> None:
+  client = AsyncIOMotorClient(host=host, port=port)
+  await client.drop_database(DATABASE)
+  db = client[DATABASE]
+  try:
+    start = time.perf_counter()
+    await seed(db, count, count // 2)
+    print(f"写入合成数据：B站评论{count}条，微博评论{count // 2}条，用时{time.perf_counter() - start:.1f}s")
+
+    before = await measure(db)
+    start = time.perf_counter()
+    await ensure_indexes(db)
+    print(f"创建索引用时{time.perf_counter() - start:.1f}s")
+    after = await measure(db)
+    start = time.perf_counter()
+    await ensure_indexes(db)
+    print(f"再次创建（已存在）用时{(time.perf_counter() - start) * 1000:.0f}ms")
+
+    for name in before:
+      (t0, docs0, plan0), (t1, docs1, plan1) = before[name], after[name]
+      print(f"[{name}]")
+      print(f"  无索引 {t0:>10.1f} ms  扫描{docs0:>9}条  {plan0}")
+      print(f"  有索引 {t1:>10.1f} ms  扫描{docs1:>9}条  {plan1}")
+      print(f"  加速   {t0 / t1:>10.1f}x")
+  finally:
+    await client.drop_database(DATABASE)
+
+
+if __name__ == "__main__":
+  host = sys.argv[1] if len(sys.argv) > 1 else "localhost"
+  port = int(sys.argv[2]) if len(sys.argv) > 2 else 27017
+  count = int(sys.argv[3]) if len(sys.argv) > 3 else 2_000_000
+  asyncio.run(main(host, port, count))
@@ -0,0 +1,73 @@
+"""
+对比逐条调用Lexicon.get_emotion与向量化打分的吞吐量，并检查两者得分完全一致
+运行：python -m benchmarks.bench_scorer [评论数] [每批条数]
+使用与bench_segment相同的合成评论，经过与流水线相同的清洗。
+前半部分分词不计入耗时；后半部分对比流水线中分词+打分两个阶段的总耗时（前PIPELINE_COUNT条），
+并单独列出jieba分词本身的耗时，两者之差即分词之后的开销
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from preprocessing.lexicon import Lexicon
+from preprocessing.scorer import VectorScorer
+from preprocessing.pipeline import clean
+from benchmarks.bench_segment import make_corpus
+from jieba import cut
+
+PIPELINE_COUNT = 20000
+
+
+def main(count: int, batch_size: int) -> None:
+  lexicon = Lexicon()
+  contents = [content for content in map(clean, make_corpus(lexicon, count)) if content is not None]
+  words = [lexicon.cut_content(content) for content in contents]
+  count = len(words)
+  print(f"{count}条合成评论，平均{sum(len(sentence.split()) for sentence in words) / count:.1f}个词")
+
+  start = time.perf_counter()
+  scorer = VectorScorer(lexicon)
+  print(f"构建词汇表 {len(scorer.vocabulary)}个词 {time.perf_counter() - start:.3f}s")
+
+  start = time.perf_counter()
+  expected = [lexicon.get_emotion(sentence) for sentence in words]
+  serial = time.perf_counter() - start
+  print(f"{'get_emotion':<12} {count / serial:>10.0f} 条/s")
+
+  batches = [words[i:i + batch_size] for i in range(0, count, batch_size)]
+  start = time.perf_counter()
+  encoded = [scorer.encode(batch) for batch in batches]
+  encode = time.perf_counter() - start
+  start = time.perf_counter()
+  result = [score for batch in encoded for score in scorer.score_ids(*batch).tolist()]
+  score = time.perf_counter() - start
+  assert result == expected, "向量化打分结果与get_emotion不一致"
+  print(f"{'编码+打分':<12} {count / (encode + score):>10.0f} 条/s  相对get_emotion {serial / (encode + score):.2f}x")
+  print(f"{'仅打分':<12} {count / score:>10.0f} 条/s  相对get_emotion {serial / score:.2f}x")
+
+  contents = contents[:PIPELINE_COUNT]
+  count = len(contents)
+  batches = [contents[i:i + batch_size] for i in range(0, count, batch_size)]
+  print(f"流水线阶段（{count}条）")
+  start = time.perf_counter()
+  for batch in batches:
+    [[word for word in cut(content) if word not in lexicon.stopwords] for content in batch]
+  jieba_cost = time.perf_counter() - start
+  start = time.perf_counter()
+  expected = [lexicon.get_emotion(lexicon.cut_content(content)) for batch in batches for content in batch]
+  strings = time.perf_counter() - start
+  start = time.perf_counter()
+  result = [score for batch in batches for score in scorer.score_ids(*scorer.cut(batch)).tolist()]
+  ids = time.perf_counter() - start
+  assert result == expected, "分词直接编码后的打分结果与get_emotion不一致"
+  print(f"{'仅jieba分词':<12} {count / jieba_cost:>10.0f} 条/s")
+  print(f"{'字符串+get_emotion':<12} {count / strings:>10.0f} 条/s  分词之后的开销 {max(strings - jieba_cost, 0) / count * 1e6:.1f}us/条")
+  print(f"{'词id+向量化':<12} {count / ids:>10.0f} 条/s  分词之后的开销 {max(ids - jieba_cost, 0) / count * 1e6:.1f}us/条")
+
+
+if __name__ == "__main__":
+  count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+  batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+  main(count, batch_size)
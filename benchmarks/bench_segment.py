@@ -0,0 +1,55 @@
+"""
+对比串行分词与1..N个进程并行分词的吞吐量，并检查结果与串行完全一致
+运行：python -m benchmarks.bench_segment [评论数] [最大进程数]
+使用由情绪词、程度副词、否定词和常用词随机拼接的合成中文评论
+"""
+import os
+import sys
+import time
+import random
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import jieba
+from preprocessing.lexicon import Lexicon
+from preprocessing.segment import ParallelSegmenter
+
+COMMON = ["游戏", "角色", "版本", "抽卡", "活动", "剧情", "策划", "玩家", "今天", "我们", "这个", "真的", "感觉", "一下", "什么", "还是"]
+
+
+def make_corpus(lexicon: Lexicon, count: int, seed: int = 0) -> list[str]:
+  rand = random.Random(seed)
+  pool = sorted(lexicon.goods)[:2000] + sorted(lexicon.bads)[:2000] + sorted(lexicon.advs) + sorted(lexicon.nots) + COMMON * 50
+  pool = [word for word in pool if word]
+  return ["".join(rand.choice(pool) for _ in range(rand.randint(3, 30))) for _ in range(count)]
+
+
+def main(count: int, max_workers: int) -> None:
+  lexicon = Lexicon()
+  jieba.initialize()
+  corpus = make_corpus(lexicon, count)
+  print(f"{count}条合成评论，平均{sum(map(len, corpus)) / count:.0f}字")
+
+  start = time.perf_counter()
+  expected = [lexicon.cut_content(content) for content in corpus]
+  serial = time.perf_counter() - start
+  print(f"{'串行':<8} {count / serial:>10.0f} 条/s")
+
+  workers = 1
+  while workers <= max_workers:
+    with ParallelSegmenter(workers) as segmenter:
+      # 预热：等待所有进程加载完词典，不计入耗时
+      segmenter(corpus[:workers * 10])
+      start = time.perf_counter()
+      result = segmenter(corpus)
+      cost = time.perf_counter() - start
+    assert result == expected, "并行分词结果与串行不一致"
+    print(f"{f'{workers}进程':<8} {count / cost:>10.0f} 条/s  相对串行 {serial / cost:.2f}x")
+    workers *= 2
+
+
+if __name__ == "__main__":
+  count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+  max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1
+  main(count, max_workers)
@@ -0,0 +1,66 @@
+"""
+对比每个视频新建AsyncClient与长连接会话池的吞吐量
+运行：python -m benchmarks.bench_session
+"""
+import sys
+import time
+import asyncio
+from pathlib import Path
+from httpx import AsyncClient
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from common.session import HttpSession
+from benchmarks.stub import StubServer
+
+VIDEOS = 200
+PAGES = 5
+WORKERS = 5
+
+
+async def per_video_client(url: str) -> None:
+  """旧方式：每个视频新建一个客户端"""
+  queue = asyncio.Queue()
+  for aid in range(VIDEOS):
+    queue.put_nowait(aid)
+
+  async def work():
+    while not queue.empty():
+      aid = queue.get_nowait()
+      async with AsyncClient(verify=False, follow_redirects=True) as client:
+        for page in range(1, PAGES + 1):
+          await client.get(f"{url}/x/v2/reply/wbi/main?oid={aid}&next={page}")
+
+  await asyncio.gather(*[work() for _ in range(WORKERS)])
+
+
+async def pooled_client(url: str) -> None:
+  """新方式：每个爬虫持有一个长连接会话池"""
+  queue = asyncio.Queue()
+  for aid in range(VIDEOS):
+    queue.put_nowait(aid)
+
+  async def work(session: HttpSession):
+    while not queue.empty():
+      aid = queue.get_nowait()
+      client = session.client()
+      for page in range(1, PAGES + 1):
+        await client.get(f"{url}/x/v2/reply/wbi/main?oid={aid}&next={page}")
+
+  sessions = [HttpSession(name="Benchmark", timeout=5) for _ in range(WORKERS)]
+  await asyncio.gather(*[work(session) for session in sessions])
+  await asyncio.gather(*[session.close() for session in sessions])
+
+
+def bench(name: str, fn) -> None:
+  with StubServer() as server:
+    start = time.perf_counter()
+    asyncio.run(fn(server.url))
+    cost = time.perf_counter() - start
+    print(f"{name:<20} {server.requests / cost:>10.1f} req/s  连接数：{server.connections}")
+
+
+if __name__ == "__main__":
+  print(f"{VIDEOS}个视频 x {PAGES}页，{WORKERS}个爬虫")
+  bench("每视频新建客户端", per_video_client)
+  bench("长连接会话池", pooled_client)
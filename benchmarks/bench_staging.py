@@ -0,0 +1,72 @@
+"""
+对比逐条LPUSH与批量写入器写入Redis缓存的耗时，需要本地redis-server
+运行：python -m benchmarks.bench_staging [host] [port]
+使用第15号库，会清空其中的测试键
+"""
+import sys
+import time
+import asyncio
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from bili.api import schema
+from common.db.redis import Redis
+from common.db.staging import StagingWriter
+
+PAGES = 50
+COMMENTS_PER_PAGE = 80
+DB = 15
+
+
+def make_pages() -> list[list[bytes]]:
+  pages = []
+  for page in range(PAGES):
+    comments = []
+    for i in range(COMMENTS_PER_PAGE):
+      rpid = page * COMMENTS_PER_PAGE + i
+      comment = schema.Comment(id=rpid, rpid=rpid, aid=1, level=5, time=1700000000 + rpid, content="新版本太好玩了" * 4, like=rpid % 100, is_root=i % 4 == 0)
+      comments.append(schema.encode(comment))
+    pages.append(comments)
+  return pages
+
+
+async def one_by_one(redis: Redis, key: str, pages: list[list[bytes]]) -> None:
+  """旧方式：每条评论一次LPUSH"""
+  for comments in pages:
+    for comment in comments:
+      await redis.client.lpush(key, comment)
+
+
+async def batched(redis: Redis, key: str, pages: list[list[bytes]]) -> None:
+  """新方式：写入器按批大小写入，结束时flush"""
+  writer = StagingWriter(redis, key)
+  for comments in pages:
+    await writer.add(comments)
+  await writer.flush()
+
+
+async def main(host: str, port: int) -> None:
+  redis = Redis(host=host, port=port, db=DB)
+  pages = make_pages()
+  count = PAGES * COMMENTS_PER_PAGE
+  results = {}
+  for name, fn in [("逐条LPUSH", one_by_one), ("批量写入器", batched)]:
+    key = f"bench:staging:{name}"
+    await redis.client.delete(key)
+    start = time.perf_counter()
+    await fn(redis, key, pages)
+    cost = time.perf_counter() - start
+    results[name] = (cost, await redis.client.lrange(key, 0, -1))
+    await redis.client.delete(key)
+    print(f"{name:<10} {cost * 1000:>8.1f} ms  {count / cost:>10.0f} 条/s")
+  (before, a), (after, b) = results.values()
+  assert a == b, "写入顺序不一致"
+  print(f"顺序一致，加速 {before / after:.1f}x")
+  await redis.client.aclose()
+
+
+if __name__ == "__main__":
+  host = sys.argv[1] if len(sys.argv) > 1 else "localhost"
+  port = int(sys.argv[2]) if len(sys.argv) > 2 else 6379
+  asyncio.run(main(host, port))
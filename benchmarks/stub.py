@@ -0,0 +1,75 @@
+import json
+import asyncio
+import threading
+from typing import Callable, Optional
+
+# 模拟B站评论接口的最小响应
+DEFAULT_BODY = json.dumps({"code": 0, "message": "0", "data": {"replies": []}}).encode()
+
+
+class StubServer:
+  """
+  运行在独立线程中的本地HTTP/1.1桩服务器，支持keep-alive，用于基准测试
+  Args:
+    handler(Callable | None): 根据请求路径返回响应体的函数，为空时返回固定响应
+    host(str): 监听地址
+    port(int): 监听端口，0表示随机端口
+  """
+
+  def __init__(self, handler: Optional[Callable[[str], bytes]] = None, host: str = "127.0.0.1", port: int = 0) -> None:
+    self.handler = handler or (lambda _: DEFAULT_BODY)
+    self.host = host
+    self.port = port
+    self.connections = 0
+    self.requests = 0
+    self._ready = threading.Event()
+    self._loop: Optional[asyncio.AbstractEventLoop] = None
+    self._server: Optional[asyncio.AbstractServer] = None
+    self._thread = threading.Thread(target=self._run, daemon=True)
+
+  @property
+  def url(self) -> str:
+    return f"http://{self.host}:{self.port}"
+
+  async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    self.connections += 1
+    try:
+      while True:
+        head = await reader.readuntil(b"\r\n\r\n")
+        path = head.split(b" ", 2)[1].decode()
+        body = self.handler(path)
+        self.requests += 1
+        writer.write(
+          b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+          + f"Content-Length: {len(body)}\r\n\r\n".encode()
+          + body
+        )
+        await writer.drain()
+    except (asyncio.IncompleteReadError, asyncio.CancelledError, ConnectionError):
+      pass
+    finally:
+      writer.close()
+
+  def _run(self) -> None:
+    self._loop = asyncio.new_event_loop()
+    self._server = self._loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+    self.port = self._server.sockets[0].getsockname()[1]
+    self._ready.set()
+    self._loop.run_forever()
+
+  def __enter__(self) -> "StubServer":
+    self._thread.start()
+    self._ready.wait()
+    return self
+
+  async def _shutdown(self) -> None:
+    self._server.close()
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in tasks:
+      task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    self._loop.stop()
+
+  def __exit__(self, *_) -> None:
+    asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop)
+    self._thread.join(timeout=5)
@@ -11,7 +11,7 @@ sys.path.append(str(import_path))
 
 from common.api import AsyncAPI
 from .enums import Sort
-from .wbi import getWbiKeys, encWbi
+from .wbi import encWbi, wbi_keys
 
 async def fetch_reply(client: AsyncClient,
                       oid: str,
@@ -43,21 +43,20 @@ class fetch_reply_wbi(AsyncAPI):
                   img_key: Optional[str] = None,
                   sub_key: Optional[str] = None) -> str:
     URL = "https://api.bilibili.com/x/v2/reply/wbi/main"
-    if not img_key or not sub_key:
-      img_key, sub_key = getWbiKeys()
-    params = encWbi({
-      "oid": oid, "type": 1, "mode": mode, "next": page
-    }, img_key, sub_key)
+    params = {"oid": oid, "type": 1, "mode": mode, "next": page}
+    if img_key and sub_key:
+      params = encWbi(params, img_key, sub_key)
+    else:
+      params = await wbi_keys.sign(params)
     response = await client.get(f"{URL}?{urllib.parse.urlencode(params)}", timeout=2000)
     return response.text
   
   @staticmethod
   async def test(headers: dict | None = None, proxy: str | None = None) -> bool:
     URL = "https://api.bilibili.com/x/v2/reply/wbi/main"
-    img_key, sub_key = getWbiKeys()
-    params = encWbi({
+    params = await wbi_keys.sign({
       "oid": 1256438678, "type": 1, "mode": 3, "next": 76642,
-    }, img_key, sub_key)
+    })
     try:
       async with AsyncClient(headers=headers, proxies=proxy) as client:
         print(f"{URL}?{urllib.parse.urlencode(params)}")
@@ -154,11 +153,11 @@ async def fetch_user_videos(client: AsyncClient,
                             img_key: Optional[str] = None,
                             sub_key: Optional[str] = None) -> str:
   URL = "https://api.bilibili.com/x/space/wbi/arc/search"
-  if not img_key or not sub_key:
-    img_key, sub_key = getWbiKeys()
-  params = encWbi({
-    "mid": mid, "ps": ps, "pn": pn
-  }, img_key, sub_key)
+  params = {"mid": mid, "ps": ps, "pn": pn}
+  if img_key and sub_key:
+    params = encWbi(params, img_key, sub_key)
+  else:
+    params = await wbi_keys.sign(params)
   response = await client.get(f"{URL}?{urllib.parse.urlencode(params)}")
   return response.text
 
@@ -168,11 +167,11 @@ async def fetch_user_info(client: AsyncClient,
                           img_key: Optional[str] = None,
                           sub_key: Optional[str] = None) -> str:
   URL = "https://api.bilibili.com/x/space/wbi/acc/info"
-  if not img_key or not sub_key:
-    img_key, sub_key = getWbiKeys()
-  params = encWbi({
-    "mid": mid, "platform": "web",
-  }, img_key, sub_key)
+  params = {"mid": mid, "platform": "web"}
+  if img_key and sub_key:
+    params = encWbi(params, img_key, sub_key)
+  else:
+    params = await wbi_keys.sign(params)
   response = await client.get(f"{URL}?{urllib.parse.urlencode(params)}")
   return response.text
 
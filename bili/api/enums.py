@@ -8,10 +8,17 @@ class Sort(IntEnum):
   ByReplies = 2
 
 
+class Mode(IntEnum):
+  """评论区排序（wbi/main接口的mode参数）"""
+  ByTime = 2,
+  ByHot = 3
+
+
 class StatusCode(IntEnum):
   """响应code枚举"""
   Success = 0,
   Error = -400,
+  RiskControl = -352,
   NoPermit = -403,
   NoSuch = -404,
   Closed = 12002,
@@ -22,6 +29,7 @@ class StatusCode(IntEnum):
 
 STATUS_CODES = {
   0: "成功",
+  -352: "风控校验失败",
   -400: "请求错误",
   -403: "权限不足",
   -404: "无此项",
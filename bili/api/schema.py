@@ -0,0 +1,95 @@
+"""
+评论接口响应的类型化解码。
+只声明需要存储的字段，解码时跳过用户资料、挂件、表情等其余字段，直接得到紧凑的结构体；
+评论记录可以直接序列化为Redis缓存格式（JSON对象）
+"""
+import json
+from typing import Optional
+import msgspec
+
+
+class LevelInfo(msgspec.Struct):
+  current_level: int = 0
+
+
+class Member(msgspec.Struct):
+  level_info: LevelInfo = msgspec.field(default_factory=LevelInfo)
+
+
+class Content(msgspec.Struct):
+  message: str = ""
+
+
+class Reply(msgspec.Struct):
+  rpid: int
+  ctime: int
+  like: int = 0
+  rcount: int = 0
+  member: Member = msgspec.field(default_factory=Member)
+  content: Content = msgspec.field(default_factory=Content)
+  replies: Optional[list["Reply"]] = None
+
+
+class ReplyData(msgspec.Struct):
+  replies: Optional[list[Reply]] = None
+
+
+class ReplyResponse(msgspec.Struct):
+  """/x/v2/reply/wbi/main 与 /x/v2/reply/reply 的响应"""
+  code: int
+  data: Optional[ReplyData] = None
+
+  @property
+  def replies(self) -> list[Reply]:
+    """响应中的评论，没有评论时为空列表"""
+    return (self.data.replies if self.data else None) or []
+
+
+class Comment(msgspec.Struct):
+  """存储的评论记录，字段与BilibiliComments集合一致，以rpid作为_id，重复写入同一条评论是幂等的"""
+  id: int = msgspec.field(name="_id")
+  rpid: int
+  aid: int
+  level: int
+  time: int
+  content: str
+  like: int
+  is_root: bool
+
+  @staticmethod
+  def of(reply: Reply, aid: int, is_root: bool) -> "Comment":
+    return Comment(
+      id=reply.rpid,
+      rpid=reply.rpid,
+      aid=aid,
+      level=reply.member.level_info.current_level,
+      time=reply.ctime,
+      content=reply.content.message,
+      like=reply.like,
+      is_root=is_root,
+    )
+
+
+reply_decoder = msgspec.json.Decoder(ReplyResponse)
+encoder = msgspec.json.Encoder()
+
+
+def decode_replies(text: str | bytes) -> ReplyResponse:
+  """
+  解码评论接口响应
+  Raises:
+    json.decoder.JSONDecodeError: 响应不是JSON（大概率风控）
+    KeyError: 响应结构与预期不符
+  """
+  try:
+    return reply_decoder.decode(text)
+  except msgspec.ValidationError as e:
+    raise KeyError(str(e)) from e
+  except msgspec.DecodeError as e:
+    raise json.decoder.JSONDecodeError(str(e), text if isinstance(text, str) else text.decode(errors="replace"), 0) from e
+
+
+def encode(comment: Comment) -> bytes:
+  """序列化为Redis缓存格式"""
+  return encoder.encode(comment)
+
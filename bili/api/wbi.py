@@ -1,8 +1,11 @@
-from functools import reduce
+from functools import reduce, lru_cache
 from hashlib import md5
+from typing import Optional
 import urllib.parse
+import asyncio
 import time
 import requests
+import httpx
 
 mixinKeyEncTab = [
     46, 47, 18, 2, 53, 8, 23, 32, 15, 50, 10, 31, 58, 3, 45, 35, 27, 43, 5, 49,
@@ -11,20 +14,28 @@ mixinKeyEncTab = [
     36, 20, 34, 44, 52
 ]
 
+NAV_URL = 'https://api.bilibili.com/x/web-interface/nav'
+NAV_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3',
+    'Referer': 'https://www.bilibili.com/'
+}
+
+@lru_cache(maxsize=8)
 def getMixinKey(orig: str):
-    '对 imgKey 和 subKey 进行字符顺序打乱编码'
+    '对 imgKey 和 subKey 进行字符顺序打乱编码（结果按 orig 缓存）'
     return reduce(lambda s, i: s + orig[i], mixinKeyEncTab, '')[:32]
 
-def encWbi(params: dict, img_key: str, sub_key: str):
-    '为请求参数进行 wbi 签名'
-    mixin_key = getMixinKey(img_key + sub_key)
+def encWbi(params: dict, img_key: Optional[str] = None, sub_key: Optional[str] = None, mixin_key: Optional[str] = None):
+    '为请求参数进行 wbi 签名，已有 mixin_key 时可直接传入'
+    if mixin_key is None:
+        mixin_key = getMixinKey(img_key + sub_key)
     curr_time = round(time.time())
     params['wts'] = curr_time                                   # 添加 wts 字段
     params = dict(sorted(params.items()))                       # 按照 key 重排参数
     # 过滤 value 中的 "!'()*" 字符
     params = {
         k : ''.join(filter(lambda chr: chr not in "!'()*", str(v)))
-        for k, v 
+        for k, v
         in params.items()
     }
     query = urllib.parse.urlencode(params)                      # 序列化参数
@@ -32,25 +43,97 @@ def encWbi(params: dict, img_key: str, sub_key: str):
     params['w_rid'] = wbi_sign
     return params
 
-def getWbiKeys() -> tuple[str, str]:
-    '获取最新的 img_key 和 sub_key'
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3',
-        'Referer': 'https://www.bilibili.com/'
-    }
-    resp = requests.get('https://api.bilibili.com/x/web-interface/nav', headers=headers)
-    resp.raise_for_status()
-    json_content = resp.json()
+def parseWbiKeys(json_content: dict) -> tuple[str, str]:
+    '从 nav 接口的响应中解析 img_key 和 sub_key'
     img_url: str = json_content['data']['wbi_img']['img_url']
     sub_url: str = json_content['data']['wbi_img']['sub_url']
     img_key = img_url.rsplit('/', 1)[1].split('.')[0]
     sub_key = sub_url.rsplit('/', 1)[1].split('.')[0]
     return img_key, sub_key
 
-img_key, sub_key = getWbiKeys()
+def getWbiKeys() -> tuple[str, str]:
+    '获取最新的 img_key 和 sub_key（同步阻塞，仅供脚本使用，爬虫请使用 wbi_keys）'
+    resp = requests.get(NAV_URL, headers=NAV_HEADERS)
+    resp.raise_for_status()
+    return parseWbiKeys(resp.json())
+
+
+class WbiKeyProvider:
+    '''
+    异步 wbi 密钥提供者。
+    首次使用时才请求 nav 接口，缓存 img_key、sub_key 与 mixin_key，超过 ttl 后重新获取；
+    签名校验失败时调用 invalidate：密钥立即标记为过期并在后台刷新，调用者不等待；
+    刷新完成前其他协程的 sign 会等待刷新结果（旧密钥已失效，继续使用只会再次失败），刷新失败时才继续使用旧密钥。
+    '''
+
+    def __init__(self, ttl: float = 3600, retry_after: float = 10):
+        '''
+        Args:
+          ttl(float): 密钥缓存时间（秒）
+          retry_after(float): 刷新失败后多久再次尝试（秒）
+        '''
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self.img_key: Optional[str] = None
+        self.sub_key: Optional[str] = None
+        self.mixin_key: Optional[str] = None
+        self.expires = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self._refreshing: Optional[asyncio.Task] = None
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def refresh(self, client: Optional[httpx.AsyncClient] = None) -> None:
+        '请求 nav 接口并更新缓存'
+        if client is None:
+            async with httpx.AsyncClient(headers=NAV_HEADERS) as client:
+                resp = await client.get(NAV_URL)
+        else:
+            resp = await client.get(NAV_URL, headers=NAV_HEADERS)
+        resp.raise_for_status()
+        img_key, sub_key = parseWbiKeys(resp.json())
+        self.img_key, self.sub_key = img_key, sub_key
+        self.mixin_key = getMixinKey(img_key + sub_key)
+        self.expires = time.monotonic() + self.ttl
+
+    async def get(self, client: Optional[httpx.AsyncClient] = None) -> tuple[str, str]:
+        '获取 img_key 和 sub_key，缓存过期时重新获取，并发调用只会请求一次'
+        if self.mixin_key is None or time.monotonic() >= self.expires:
+            async with self.lock:
+                if self.mixin_key is None or time.monotonic() >= self.expires:
+                    try:
+                        await self.refresh(client)
+                    except Exception:
+                        if self.mixin_key is None:
+                            raise
+                        # 刷新失败时继续使用旧密钥
+                        self.expires = time.monotonic() + self.retry_after
+        return self.img_key, self.sub_key
+
+    def invalidate(self) -> None:
+        '签名失效时调用：标记密钥过期并在后台刷新，不等待刷新完成；之后的 get/sign 会等待这次刷新'
+        if self._refreshing is not None and not self._refreshing.done():
+            return
+        self.expires = 0.0
+        self._refreshing = asyncio.get_running_loop().create_task(self.get())
+        self._refreshing.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+    async def sign(self, params: dict, client: Optional[httpx.AsyncClient] = None) -> dict:
+        '使用缓存的 mixin_key 为请求参数签名'
+        await self.get(client)
+        return encWbi(params, mixin_key=self.mixin_key)
+
+
+# 所有爬虫共享的密钥提供者
+wbi_keys = WbiKeyProvider()
 
 
 if __name__ == "__main__":
+  img_key, sub_key = asyncio.run(wbi_keys.get())
   signed_params = encWbi(
     params={
         'foo': '114',
@@ -62,4 +145,4 @@ if __name__ == "__main__":
   )
   query = urllib.parse.urlencode(signed_params)
   print(signed_params)
-  print(query)
\ No newline at end of file
+  print(query)
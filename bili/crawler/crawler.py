@@ -2,162 +2,372 @@ import sys
 import json
 import asyncio
 import httpx
+from collections import deque
 from copy import deepcopy
 from pathlib import Path
 from typing import Optional, Callable
-from time import sleep
 
 import_path = Path(__file__).parent.parent.parent
 sys.path.append(str(import_path))
 
-from common.crawler import random_sleep, Err, CrawlResult
+from common.crawler import Err, CrawlResult, CrawlerRunner, slot_id, CircuitBreaker, circuit_breaker, RateLimiter, rate_limiter
 from common.log import get_logger
 from common.db.mongo import MongoDB
 from common.db.redis import Redis
-from common.db.bridge import transfer
-from bili.api import api
-from bili.api.enums import STATUS_CODES, StatusCode
-from bili.api.wbi import getWbiKeys
+from common.db.staging import Backend, create_staging, recover
+from common.db.bloom import BloomFilter
+from common.session import HttpSession
+from common.proxy import ProxyPool
+from bili.api import api, schema
+from bili.api.enums import STATUS_CODES, StatusCode, Mode
+from bili.api.wbi import wbi_keys
 
 class BiliCrawler:
 
-  lock = asyncio.Lock()
   crawler_count = 0
 
-  def __init__(self):
+  def __init__(self,
+               session: Optional[HttpSession] = None,
+               breaker: Optional[CircuitBreaker] = None,
+               limiter: Optional[RateLimiter] = None,
+               seen: Optional[BloomFilter] = None,
+               backend: Backend = Backend.Redis):
+    """
+    Args:
+      session(HttpSession | None): 长连接会话池，可在多个爬虫之间共享；为空时创建爬虫自己的会话池
+      breaker(CircuitBreaker | None): 风控熔断器，为空时使用所有爬虫共享的熔断器
+      limiter(RateLimiter | None): 自建会话池使用的限速器，为空时使用所有爬虫共享的限速器
+      seen(BloomFilter | None): 已写入评论的rpid过滤器，缓存前跳过已写入的评论，应在所有爬虫之间共享；为空时不过滤
+      backend(Backend): 评论暂存后端
+    """
     self.db = MongoDB().client["MobileGameComments"]
-    self.img_key, self.sub_key = getWbiKeys()
     # 爬虫ID
     BiliCrawler.crawler_count += 1
     self.id = BiliCrawler.crawler_count
     self.redis = Redis(db=self.id)
+    # 缓存键在主机、进程槽位之间唯一且重启后不变，崩溃遗留的缓存由recover回收
+    self.uid = slot_id("Bilibili", self.id)
+    self.staging_key = f"BilibiliComments:{self.uid}"
     self.logger = get_logger(f"Bilibili#{self.id}")
+    self.staging = create_staging(backend, self.redis, self.staging_key, self.db["BilibiliComments"], logger=self.logger)
+    self.seen = seen
+    # 已缓存、尚未提交的评论rpid，提交后加入过滤器
+    self.pending: set[int] = set()
+    self.own_session = session is None
+    self.session = session or HttpSession(name=f"Bilibili#{self.id}", limiter=limiter or rate_limiter)
+    self.breaker = breaker or circuit_breaker
+
+  async def unseen(self, comments: list[schema.Comment]) -> list[schema.Comment]:
+    """过滤已写入（过滤器判定）或已缓存的评论，返回的评论记为待提交"""
+    flags = await self.seen.contains([comment.rpid for comment in comments]) if self.seen else [False] * len(comments)
+    fresh = []
+    for comment, seen in zip(comments, flags):
+      if not seen and comment.rpid not in self.pending:
+        self.pending.add(comment.rpid)
+        fresh.append(comment)
+    return fresh
+
+  async def mark_seen(self) -> None:
+    """评论写入MongoDB后调用，将待提交的评论加入过滤器"""
+    if self.seen and self.pending:
+      await self.seen.add(list(self.pending))
+    self.pending = set()
+
+  async def recover(self) -> int:
+    """开始爬取前调用，将上次运行崩溃时遗留的暂存评论写入MongoDB"""
+    return await recover(self.redis, [self.staging_key, f"{self.staging_key}:*"], self.db["BilibiliComments"], logger=self.logger)
+
+  async def discard(self) -> None:
+    """丢弃缓存中尚未提交的评论"""
+    self.pending = set()
+    await self.staging.discard()
+
+  async def close(self) -> None:
+    """写入尚未写入的缓存，关闭爬虫持有的会话池（共享的会话池由创建者负责关闭）"""
+    await self.staging.close()
+    if self.own_session:
+      await self.session.close()
 
   async def fetch_one_reply_reply(self, client: httpx.Client, aid: int, rpid: int, page: int) -> CrawlResult:
-    res, url = "", ""
-    async def run_once() -> CrawlResult:
-      nonlocal url, res
-      res, url = await api.fetch_reply_reply.call(client, aid, rpid, pn=page, return_url=True)
-      data = json.loads(res)
-      code = int(data["code"])
+    """爬取某条根评论的某一页回复，成功时返回该页的回复列表"""
+    url = f"https://api.bilibili.com/x/v2/reply/reply?oid={aid}&type=1&root={rpid}&pn={page}"
+    try:
+      data = await self.breaker.fetch_json(
+        "bilibili", self.session.identity_of(client),
+        lambda: api.fetch_reply_reply.call(client, aid, rpid, pn=page),
+        logger=self.logger,
+        decode=schema.decode_replies
+      )
+      code = data.code
       if code != 0:
         self.logger.warning(f"获取评论的回复失败，代码：{code}，原因：{STATUS_CODES.get(code, '未知')}")
         return False, Err.FAILED
 
-      replies = data["data"]["replies"]
+      replies = data.replies
       if not replies:
         return False, Err.EOF
-
-      for reply in replies:
-        comment = {}
-        comment["aid"] = aid
-        comment["level"] = reply["member"]["level_info"]["current_level"]
-        comment["time"] = reply["ctime"]
-        comment["content"] = reply["content"]["message"]
-        comment["like"] = reply["like"]
-        comment["is_root"] = False
-        async with BiliCrawler.lock:
-          await self.db["BilibiliComments"].insert_one(comment)
-      return True, None
-
-    try:
-      return await run_once()
+      return True, [schema.Comment.of(reply, aid, is_root=False) for reply in replies]
     except KeyError as e:
       self.logger.warning(f"响应信息中没有键：{e}")
+      return False, Err.FAILED
     except json.decoder.JSONDecodeError as e:
-      self.logger.error(f"非JSON格式数据：{res}") # 大概率风控
+      self.logger.error(f"多次重试后依然风控，放弃") # 大概率风控
       self.logger.info(f"可以尝试访问{url}")
-      self.logger.warning("大概率风控，线程睡眠17分钟，所有爬虫暂停...")
-      while True:
-        sleep(1020)
-        self.logger.info("重试中")
-        try:
-          return await run_once()
-        except json.decoder.JSONDecodeError as e:
-          self.logger.warning("依然风控，继续等待17分钟")
-          continue
-        except:
-          return False, Err.FAILED
+      return False, Err.IP_BANNED
     except Exception as e:
       self.logger.exception(e)
       return False, Err.FAILED
-    
-  async def fetch_one_page(self, client: httpx.Client, aid: int, page: int) -> CrawlResult:
-    """爬取某个视频的某一页的所有评论"""
+
+  async def fetch_reply_thread(self, client: httpx.Client, aid: int, rpid: int, seen: set[int], max_pages: int = 100) -> CrawlResult:
+    """
+    逐页爬取某条根评论下的所有回复，跳过已随评论页爬取的回复，加入缓存写入器，成功时返回缓存的回复数
+    Args:
+      client(AsyncClient): httpx会话
+      aid(int): 视频av号
+      rpid(int): 根评论id
+      seen(set[int]): 已随评论页爬取的回复id
+      max_pages(int): 最大页数
+    """
+    count = 0
+    for page in range(1, max_pages + 1):
+      res, data = await self.fetch_one_reply_reply(client, aid, rpid, page)
+      if not res:
+        return (True, count) if data == Err.EOF else (res, data)
+      fresh = await self.unseen([comment for comment in data if comment.rpid not in seen])
+      await self.staging.add([schema.encode(comment) for comment in fresh])
+      count += len(fresh)
+    return True, count
+
+  async def expand_reply_threads(self, client: httpx.Client, aid: int, threads: dict[int, set[int]], concurrency: int = 4) -> CrawlResult:
+    """
+    展开回复楼层：以有限并发爬取多条根评论的全部回复，与评论页一样加入缓存，提交检查点时写入MongoDB。
+    任一楼层展开失败时返回失败，不提交检查点，重试时从上一个检查点重新爬取
+    Args:
+      client(AsyncClient): httpx会话
+      aid(int): 视频av号
+      threads(dict[int, set[int]]): 根评论id -> 已随评论页爬取的回复id
+      concurrency(int): 同时展开的楼层数
+    """
+    if not threads:
+      return True, None
+    self.logger.info(f"正在展开视频 av{aid} 的{len(threads)}个回复楼层")
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def expand(rpid: int, seen: set[int]) -> CrawlResult:
+      async with semaphore:
+        return await self.fetch_reply_thread(client, aid, rpid, seen)
+
+    results = await asyncio.gather(*[expand(rpid, seen) for rpid, seen in threads.items()])
+    failed = [err for res, err in results if not res]
+    if failed:
+      self.logger.warning(f"视频 av{aid} 有{len(failed)}个回复楼层展开失败")
+      return False, Err.IP_BANNED if Err.IP_BANNED in failed else Err.FAILED
+    self.logger.info(f"视频 av{aid} 回复楼层展开完毕，共缓存{sum(count for _, count in results)}条回复")
+    return True, None
+
+  async def fetch_page_comments(self, client: httpx.Client, aid: int, page: int, mode: Mode = Mode.ByHot) -> CrawlResult:
+    """
+    爬取某个视频的某一页的所有评论。
+    成功时返回 (评论列表, 楼层)：评论列表中每条根评论后紧跟其子评论；
+    楼层为回复未完整展示的根评论id -> 已展示的回复id
+    """
     self.logger.info(f"正在爬取视频 av{aid} 第{page}页")
+    comments = []
+    threads = {}
     try:
-      data = await api.fetch_reply_wbi.call(client, oid=str(aid), page=page, img_key=self.img_key, sub_key=self.sub_key)
-      data = json.loads(data)
-
-      code = int(data["code"])
+      data = await self.breaker.fetch_json(
+        "bilibili", self.session.identity_of(client),
+        lambda: api.fetch_reply_wbi.call(client, oid=str(aid), page=page, mode=int(mode)),
+        logger=self.logger,
+        decode=schema.decode_replies
+      )
+
+      code = data.code
       if code != 0:
         self.logger.warning(f"获取评论失败，代码：{code}，原因：{STATUS_CODES.get(code, '未知')}")
+        if code == StatusCode.RiskControl:
+          # 签名可能失效，后台刷新wbi密钥
+          wbi_keys.invalidate()
         if code == StatusCode.Closed:
           return False, Err.EOF
         else:
           return False, Err.FAILED
       
-      replies = data["data"]["replies"]
+      replies = data.replies
 
       if not replies:
         self.logger.info(f"已到达视频 av{aid} 评论最后一页")
         return False, Err.EOF
       
       for reply in replies:
-        comment = {}
-        comment["rpid"] = reply["rpid"]
-        comment["aid"] = aid
-        comment["level"] = reply["member"]["level_info"]["current_level"]
-        comment["time"] = reply["ctime"]
-        comment["content"] = reply["content"]["message"]
-        comment["like"] = reply["like"]
-        comment["rpid"] = reply["rpid"]
-        comment["is_root"] = True
-        await self.redis.client.lpush("BilibiliComments", json.dumps(comment))
+        comments.append(schema.Comment.of(reply, aid, is_root=True))
         # 子评论
-        for rreply in reply["replies"]:
-          sub_comment = {}
-          sub_comment["rpid"] = rreply["rpid"]
-          sub_comment["aid"] = aid
-          sub_comment["level"] = rreply["member"]["level_info"]["current_level"]
-          sub_comment["time"] = rreply["ctime"]
-          sub_comment["content"] = rreply["content"]["message"]
-          sub_comment["like"] = rreply["like"]
-          sub_comment["rpid"] = rreply["rpid"]
-          sub_comment["is_root"] = False
-          await self.redis.client.lpush("BilibiliComments", json.dumps(sub_comment))
+        rreplies = reply.replies or []
+        if reply.rcount > len(rreplies):
+          threads[reply.rpid] = {rreply.rpid for rreply in rreplies}
+        for rreply in rreplies:
+          comments.append(schema.Comment.of(rreply, aid, is_root=False))
     except KeyError as e:
       self.logger.warning(f"响应信息中没有键：{e}")
       return False, Err.FAILED
     except json.decoder.JSONDecodeError:
-      return False, Err.FAILED
+      return False, Err.IP_BANNED
     except Exception as e:
+      # 在并发的预取任务中运行，不能退出进程，交给调度器重试
       self.logger.exception(e)
-      exit(-1)
       return False, Err.FAILED
-    return True, None
-    
-  async def fetch_video_comments(self, client: httpx.Client, aid: int, start_page: int = 1, max_pages: int = 100) -> CrawlResult:
-    """爬取某个视频的评论区的所有评论"""
+    return True, (comments, threads)
+
+  async def save_page_comments(self, comments: list[schema.Comment]) -> None:
+    """跳过已写入的评论，将一页评论按顺序加入Redis缓存写入器，写入器满或提交检查点时批量写入"""
+    comments = await self.unseen(comments)
+    await self.staging.add([schema.encode(comment) for comment in comments])
+
+  async def fetch_video_comments(self,
+                                 client: httpx.Client,
+                                 aid: int,
+                                 start_page: int = 1,
+                                 max_pages: int = 100,
+                                 lookahead: int = 1,
+                                 expand_replies: bool = False,
+                                 reply_concurrency: int = 4,
+                                 checkpoint_every: int = 10) -> CrawlResult:
+    """
+    爬取某个视频的评论区的所有评论
+    Args:
+      client(AsyncClient): httpx会话
+      aid(int): 视频av号
+      start_page(int): 起始页
+      max_pages(int): 最大页数
+      lookahead(int): 同时在途的页请求数，为1时逐页顺序爬取。
+        无论取值多少，评论都按页序写入缓存；任一页到达末尾后，之后的在途请求会被取消并丢弃
+      expand_replies(bool): 是否在评论页爬取完毕后展开回复未完整展示的楼层
+      reply_concurrency(int): 同时展开的楼层数
+      checkpoint_every(int): 每爬取多少页提交一次检查点：将已缓存的评论写入MongoDB并记录last_page，
+        中断后从last_page的下一页继续；为0时只在爬取完毕后提交
+    """
     self.logger.info(f"正在爬取视频 av{aid} 评论区的所有评论，从第{start_page}页开始")
-    for page in range(start_page, max_pages + 1):
-      res, err = await self.fetch_one_page(client, aid=aid, page=page)
-      if not res and err != Err.EOF:
-        self.logger.warning("无法获取视频评论，跳过")
-        return res, err
-      elif err == Err.EOF:
-        self.logger.info(f"视频 av{aid} 所有评论爬取完毕")
-        await transfer(self.redis, "BilibiliComments", self.db["BilibiliComments"], upsert=False, logger=self.logger)
-        await self.db["BilibiliVideos"].update_one({"_id": aid}, {"$set": {"finished": True}})
-        break
-      # await random_sleep(0.1, 0.3)
+    pages = iter(range(start_page, max_pages + 1))
+    pending: deque[tuple[int, asyncio.Task]] = deque()
+    threads: dict[int, set[int]] = {}
+
+    def schedule():
+      while len(pending) < max(lookahead, 1):
+        page = next(pages, None)
+        if page is None:
+          return
+        pending.append((page, asyncio.create_task(self.fetch_page_comments(client, aid=aid, page=page))))
+
+    try:
+      schedule()
+      while pending:
+        page, task = pending.popleft()
+        res, data = await task
+        if not res and data != Err.EOF:
+          self.logger.warning("无法获取视频评论，跳过")
+          return res, data
+        elif data == Err.EOF:
+          self.logger.info(f"视频 av{aid} 所有评论爬取完毕")
+          if expand_replies:
+            ok, err = await self.expand_reply_threads(client, aid, threads, concurrency=reply_concurrency)
+            if not ok:
+              return ok, err
+          await self.commit(aid, page - 1, finished=True)
+          break
+        comments, page_threads = data
+        await self.save_page_comments(comments)
+        threads.update(page_threads)
+        if checkpoint_every > 0 and (page - start_page + 1) % checkpoint_every == 0:
+          # 楼层在提交前展开，检查点之前的数据都已完整写入
+          if expand_replies:
+            ok, err = await self.expand_reply_threads(client, aid, threads, concurrency=reply_concurrency)
+            if not ok:
+              return ok, err
+          threads = {}
+          await self.commit(aid, page)
+        schedule()
+    finally:
+      # 丢弃末页之后的在途请求
+      for _, task in pending:
+        task.cancel()
+      await asyncio.gather(*[task for _, task in pending], return_exceptions=True)
     return True, None
   
+  async def commit(self, aid: int, page: int, finished: bool = False) -> None:
+    """
+    提交检查点：先将缓存的评论写入MongoDB，再记录已写入的最后一页。
+    两步之间中断时，重启后会重新爬取上一个检查点之后的页
+    Args:
+      aid(int): 视频av号
+      page(int): 已完整写入的最后一页
+      finished(bool): 是否已爬取完毕
+    """
+    await self.staging.commit()
+    await self.mark_seen()
+    checkpoint = {"last_page": page}
+    if finished:
+      checkpoint["finished"] = True
+    await self.db["BilibiliVideos"].update_one({"_id": aid}, {"$set": checkpoint})
+    self.logger.info(f"视频 av{aid} 检查点：第{page}页")
+
+  async def get_watermark(self, aid: int) -> Optional[tuple[int, int]]:
+    """获取视频的水位线 (最新根评论的时间, rpid)；没有记录时由已写入的评论推算，仍没有时返回None"""
+    video = await self.db["BilibiliVideos"].find_one({"_id": aid}, {"watermark": 1})
+    if video and video.get("watermark"):
+      return tuple(video["watermark"])
+    latest = await self.db["BilibiliComments"].find_one(
+      {"aid": aid, "is_root": True}, {"time": 1, "rpid": 1}, sort=[("time", -1), ("rpid", -1)]
+    )
+    return None if latest is None else (latest["time"], latest["rpid"])
+
+  async def fetch_new_comments(self,
+                               client: httpx.Client,
+                               aid: int,
+                               watermark: Optional[tuple[int, int]],
+                               max_pages: int = 100) -> CrawlResult:
+    """
+    按时间倒序爬取比水位线新的根评论（及其展示的子评论）并写入缓存，遇到第一条不比水位线新的根评论时停止。
+    成功时返回新的水位线
+    Args:
+      client(AsyncClient): httpx会话
+      aid(int): 视频av号
+      watermark(tuple[int, int] | None): (时间, rpid)，rpid单调递增，同一秒内的评论按rpid区分；为None时爬取全部
+      max_pages(int): 最大页数
+    """
+    latest = watermark
+    count = 0
+    for page in range(1, max_pages + 1):
+      res, data = await self.fetch_page_comments(client, aid, page, mode=Mode.ByTime)
+      if not res:
+        if data == Err.EOF:
+          break
+        return res, data
+      comments, _ = data
+      fresh = []
+      reached = False
+      for comment in comments:
+        if comment.is_root:
+          key = (comment.time, comment.rpid)
+          if watermark is not None and key <= watermark:
+            reached = True
+            break
+          latest = key if latest is None else max(latest, key)
+          count += 1
+        fresh.append(comment)
+      await self.save_page_comments(fresh)
+      if reached:
+        break
+    self.logger.info(f"视频 av{aid} 共有{count}条新的根评论")
+    return True, latest
+
   async def fetch_video_info(self, client: httpx.Client, aid: int) -> Optional[dict]:
     self.logger.info("正在爬取视频信息")
     try:
-      res = await api.fetch_video_info(client, aid=aid)
-      data = json.loads(res)
+      data = await self.breaker.fetch_json(
+        "bilibili", self.session.identity_of(client),
+        lambda: api.fetch_video_info(client, aid=aid),
+        logger=self.logger
+      )
       code = int(data["code"])
       if code != 0:
         self.logger.warning(f"获取视频信息失败，代码：{code}，原因：{STATUS_CODES.get(code, '未知')}")
@@ -174,76 +384,107 @@ class BiliCrawler:
     except KeyError as e:
       self.logger.warning(f"响应信息中没有键：{e}")
     except json.decoder.JSONDecodeError as e:
-      self.logger.error(f"非JSON格式数据：{res}")
+      self.logger.error(f"多次重试后依然风控，放弃")
     except Exception as e:
       self.logger.exception(e)
 
-  async def run_get_comments(self, aid: int, headers: Optional[dict] = None, proxy: Optional[str] = None) -> CrawlResult:
-    """运行爬虫，爬取一个视频的信息和评论"""
+  async def run_get_comments(self,
+                             aid: int,
+                             headers: Optional[dict] = None,
+                             proxy: Optional[str] = None,
+                             lookahead: int = 1,
+                             expand_replies: bool = False,
+                             checkpoint_every: int = 10) -> CrawlResult:
+    """
+    运行爬虫，爬取一个视频的评论，从上次的检查点继续。
+    lookahead为同时在途的页请求数，expand_replies为是否展开回复楼层，checkpoint_every为每多少页提交一次检查点
+    """
 
     self.logger.info(f"正在爬取视频 av{aid} 的所有评论")
     if not headers:
       self.logger.warning("未设置请求头，可能无法正常爬取数据")
     if proxy:
       self.logger.info(f"使用代理：{proxy}")
-      proxy = {"http://": proxy, "https://": proxy}
 
-    async with httpx.AsyncClient(headers=headers, proxies=proxy, verify=False, follow_redirects=True) as client:
+    client = self.session.client(headers=headers, proxy=proxy)
+
+    finished = await self.is_finished(aid)
+    if finished is None:
+      self.logger.warning(f"数据库中无此视频（av{aid}）数据，跳过")
+      return True, None
+    if finished:
+      self.logger.info(f"视频{aid} 已爬取完毕，跳过")
+      return True, None
 
-      finished = await self.is_finished(aid)
-      if finished is None:
-        self.logger.warning(f"数据库中无此视频（av{aid}）数据，跳过")
-        return True, None
-      if finished:
-        self.logger.info(f"视频{aid} 已爬取完毕，跳过")
-        return True, None
+    start_page = (await self.get_last_page(aid) or 0) + 1
+    if start_page > 1:
+      self.logger.info(f"视频 av{aid} 从检查点继续：第{start_page}页")
+    res, err = await self.fetch_video_comments(
+      client, aid, start_page=start_page, lookahead=lookahead,
+      expand_replies=expand_replies, checkpoint_every=checkpoint_every
+    )
+    if not res:
+      return res, err
 
-      res, err = await self.fetch_video_comments(client, aid, start_page=1)
-      if not res:
-        return res, err
-        
     self.logger.info(f"视频 av{aid} 评论爬取完毕")
     return True, None
   
+  async def run_get_new_comments(self,
+                                 aid: int,
+                                 headers: Optional[dict] = None,
+                                 proxy: Optional[str] = None,
+                                 max_pages: int = 100) -> CrawlResult:
+    """增量模式：爬取已爬取完毕的视频中比水位线新的评论，写入MongoDB后更新水位线"""
+    self.logger.info(f"正在爬取视频 av{aid} 的新评论")
+    if proxy:
+      self.logger.info(f"使用代理：{proxy}")
+    client = self.session.client(headers=headers, proxy=proxy)
+
+    watermark = await self.get_watermark(aid)
+    res, data = await self.fetch_new_comments(client, aid, watermark, max_pages=max_pages)
+    if not res:
+      return res, data
+    await self.staging.commit()
+    await self.mark_seen()
+    if data is not None:
+      await self.db["BilibiliVideos"].update_one({"_id": aid}, {"$set": {"watermark": list(data)}})
+    self.logger.info(f"视频 av{aid} 新评论爬取完毕")
+    return True, None
+
   async def run_get_video_info(self, aid: int, filter: Callable | None = None, headers: Optional[dict] = None, proxy: Optional[str] = None) -> bool:
     self.logger.info(f"正在爬取视频 av{aid} 的基本信息")
     if not headers:
       self.logger.warning("未设置请求头，可能无法正常爬取数据")
     if proxy:
       self.logger.info(f"使用代理：{proxy}")
-      proxy = {"https://": proxy}
-
-    async with httpx.AsyncClient(headers=headers, proxies=proxy, verify=False, follow_redirects=True) as client:
-      last_page = await self.get_last_page(aid)
-      if last_page is None:
-        self.logger.info("数据库中无此视频数据")
-        document = {"_id": aid, "last_page": 0, "comments": []}
-        info = await self.fetch_video_info(client, aid)
-        if info is None:
-          self.logger.warning(f"无法获取视频基本信息，跳过")
-          await random_sleep(0.3, 0.4)
-          return False
-        document.update(info)
-        if not filter or filter(document):
-          async with BiliCrawler.lock:
-            await self.db["BilibiliVideos"].update_one({"_id": aid}, {"$set": document}, upsert=True)
-        else:
-          self.logger.info(f"视频{aid} 被过滤")
-        await random_sleep(0.3, 0.4)
+
+    client = self.session.client(headers=headers, proxy=proxy)
+    last_page = await self.get_last_page(aid)
+    if last_page is None:
+      self.logger.info("数据库中无此视频数据")
+      document = {"_id": aid, "last_page": 0, "comments": []}
+      info = await self.fetch_video_info(client, aid)
+      if info is None:
+        self.logger.warning(f"无法获取视频基本信息，跳过")
+        return False
+      document.update(info)
+      if not filter or filter(document):
+        await self.db["BilibiliVideos"].update_one({"_id": aid}, {"$set": document}, upsert=True)
       else:
-        self.logger.info("数据库中已存在该视频，跳过")
+        self.logger.info(f"视频{aid} 被过滤")
+    else:
+      self.logger.info("数据库中已存在该视频，跳过")
 
     self.logger.info(f"爬取视频 av{aid} 结束")
     return True
   
   async def get_last_page(self, aid: int) -> Optional[int]:
-    async with BiliCrawler.lock:
-      result = await self.db["BilibiliVideos"].find_one({"_id": aid})
-    return result if result is None else result["last_page"]
+    result = await self.db["BilibiliVideos"].find_one({"_id": aid})
+    return result if result is None else result.get("last_page", 0)
   
   async def is_finished(self, aid: int) -> Optional[bool]:
     result = await self.db["BilibiliVideos"].find_one({"_id": aid})
-    return result if result is None else result["finished"]
+    return result if result is None else result.get("finished", False)
   
   async def run_fetch_all_user_videos(self,
                                       mid: int,
@@ -256,47 +497,122 @@ class BiliCrawler:
     aids = []
     page = 1
 
-    async with httpx.AsyncClient(**params) as client:
-      while True:
-        self.logger.info(f"正在爬取第{page}页投稿")
-        try:
-          res = await api.fetch_user_videos(client, mid, pn=page, img_key=self.img_key, sub_key=self.sub_key)
-          data = json.loads(res)
-          code = data["code"]
-          if code != 0:
-            self.logger.warning(f"获取用户投稿视频失败，代码：{code}，原因：{STATUS_CODES.get(code, '未知')}")
-            break
-          vlist = data["data"]["list"]["vlist"]
-          if not vlist:
-            self.logger.info("最后一页，结束")
-            break
-          for video in vlist:
-            aids.append(video["aid"])
-          await random_sleep(1, 1)
-        except KeyError as e:
-          self.logger.warning(f"响应信息中没有键：{e}")
-          return False
-        except json.decoder.JSONDecodeError as e:
-          self.logger.exception(f"非JSON格式数据：{e}")
-          return False
-        except Exception as e:
-          self.logger.exception(e)
+    client = self.session.client(headers=params["headers"], proxy=params.get("proxy"))
+    while True:
+      self.logger.info(f"正在爬取第{page}页投稿")
+      try:
+        data = await self.breaker.fetch_json(
+          "bilibili", self.session.identity_of(client),
+          lambda: api.fetch_user_videos(client, mid, pn=page),
+          logger=self.logger
+        )
+        code = data["code"]
+        if code != 0:
+          self.logger.warning(f"获取用户投稿视频失败，代码：{code}，原因：{STATUS_CODES.get(code, '未知')}")
+          if code == StatusCode.RiskControl:
+            wbi_keys.invalidate()
           break
-        page += 1
+        vlist = data["data"]["list"]["vlist"]
+        if not vlist:
+          self.logger.info("最后一页，结束")
+          break
+        for video in vlist:
+          aids.append(video["aid"])
+      except KeyError as e:
+        self.logger.warning(f"响应信息中没有键：{e}")
+        return False
+      except json.decoder.JSONDecodeError as e:
+        self.logger.exception(f"非JSON格式数据：{e}")
+        return False
+      except Exception as e:
+        self.logger.exception(e)
+        break
+      page += 1
 
     return aids
   
 
-class BiliCrawlerRunner: ...
+class BiliCrawlerRunner:
+  """将B站爬虫接入全局调度器：每个爬虫实例是一个工作协程，视频按评论数优先爬取"""
+
+  platform = "bilibili"
+
+  def __init__(self,
+               runner: CrawlerRunner,
+               crawlers: list[BiliCrawler],
+               headers: Optional[dict] = None,
+               lookahead: int = 1,
+               expand_replies: bool = False,
+               checkpoint_every: int = 10,
+               incremental: bool = False,
+               proxies: Optional[ProxyPool] = None):
+    """
+    Args:
+      runner(CrawlerRunner): 全局调度器
+      crawlers(list[BiliCrawler]): 爬虫实例
+      headers(dict | None): 请求头
+      lookahead(int): 单个视频同时在途的页请求数
+      expand_replies(bool): 是否展开回复楼层
+      checkpoint_every(int): 每爬取多少页提交一次检查点
+      incremental(bool): 增量模式：只刷新已爬取完毕的视频，爬取比水位线新的评论
+      proxies(ProxyPool | None): 代理池，每个视频分配一个分数最高的代理，没有空闲的代理时等待，代理全部被淘汰后直连
+    """
+    self.runner = runner
+    self.headers = headers
+    self.proxies = proxies
+    self.lookahead = lookahead
+    self.expand_replies = expand_replies
+    self.checkpoint_every = checkpoint_every
+    self.incremental = incremental
+    self.db = MongoDB().client["MobileGameComments"]
+    runner.register(self.platform, [self.handler(crawler) for crawler in crawlers])
+
+  def handler(self, crawler: BiliCrawler):
+    async def handle(aid: int, _) -> CrawlResult:
+      proxy = None
+      if self.proxies:
+        # 等待空闲的代理；代理全部被淘汰时为None，直连
+        proxy = await self.proxies.acquire()
+      identity = HttpSession.identity(self.headers, proxy)
+      if proxy:
+        # 被风控时立即交还代理、换用其他代理重试，不在被封的代理上等待退避
+        crawler.breaker.rotate(self.platform, identity)
+      res, err = False, Err.FAILED
+      try:
+        if self.incremental:
+          res, err = await crawler.run_get_new_comments(aid, headers=self.headers, proxy=proxy)
+        else:
+          res, err = await crawler.run_get_comments(
+            aid, headers=self.headers, proxy=proxy, lookahead=self.lookahead,
+            expand_replies=self.expand_replies, checkpoint_every=self.checkpoint_every
+          )
+      finally:
+        if self.proxies:
+          self.proxies.release(proxy, res, latency=crawler.session.take_latency(identity), banned=err == Err.IP_BANNED)
+        if not res:
+          # 丢弃失败（或租约丢失被中止）的视频最后一个检查点之后缓存的评论，重试时从检查点继续
+          await crawler.discard()
+      return res, err
+    return handle
+
+  async def load(self, mids: list[int]) -> int:
+    """将指定用户未爬取完毕（增量模式下为已爬取完毕）的视频加入调度器，返回加入的数量"""
+    count = 0
+    cursor = self.db["BilibiliVideos"].find(
+      {"mid": {"$in": mids}, "finished": True if self.incremental else {"$ne": True}},
+      {"comments": 1}
+    )
+    async for video in cursor:
+      self.runner.push(self.platform, video["_id"], priority=video.get("comments", 0))
+      count += 1
+    return count
 
 
 if __name__ == "__main__":
   import asyncio
   import pathlib
-  from common.iptest import async_test as test_ip
 
   CACHE_PATH = pathlib.Path(__file__).parent.parent.parent.joinpath("cache")
-  PROXIES_PATH = pathlib.Path(__file__).parent.parent.parent.joinpath("proxies.txt")
   GENSHIN_AIDS_PATH = CACHE_PATH.joinpath("bili_genshin_aids.txt")
 
   with open(pathlib.Path(__file__).parent.joinpath("headers.json")) as f:
@@ -308,22 +624,6 @@ if __name__ == "__main__":
   logger = get_logger("BilibiliCrawlerController")
 
   proxies = asyncio.Queue()
-  # if PROXIES_PATH.exists():
-  #   with open(PROXIES_PATH, "r", encoding="utf-8") as f:
-  #     proxy_list = [line.strip() for line in f.readlines()]
-  # async def test_proxies():
-  #   async def _test_ip(ip):
-  #     # ok = await test_ip(ip, "http://api.bilibili.com/x/v2/reply/reply?oid=712909579&type=1&root=3762650428&ps=10&pn=1")
-  #     # ok = await test_ip(ip, "https://api.bilibili.com/x/web-interface/view?aid=113225672758114")
-  #     ok = False
-  #     if ok:
-  #       logger.info(f"测试代理可用性：{ip} - ok")
-  #       await proxies.put(ip)    
-  #     else:
-  #       logger.warning(f"测试代理可用性：{ip} - failed")
-  #   tests = [_test_ip(ip) for ip in proxy_list]
-  #   await asyncio.gather(*tests)
-  # asyncio.run(test_proxies())
 
   # 根据可用代理数决定爬虫数量
   crawlers = [BiliCrawler() for _ in range(5)]
@@ -350,7 +650,6 @@ if __name__ == "__main__":
         while not ok:
           proxy = None if proxies.empty() else (await proxies.get())
           ok = await crawler.run_get_comments(aid, headers=headers, proxy=proxy)
-          await random_sleep(0.3, 0.4)
           if proxy:
             await proxies.put(proxy)
       finally:
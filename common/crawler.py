@@ -1,7 +1,16 @@
+import os
+import json
+import time
+import heapq
+import socket
 import asyncio
+import logging
+import itertools
 from random import uniform
 from enum import Enum
-from typing import Any
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from .log import get_logger
 
 class Err(Enum):
   IP_BANNED = 1,
@@ -14,7 +23,384 @@ class Err(Enum):
 CrawlResult = tuple[bool, Any]
 
 
-class CrawlerRunner:...
+class Circuit:
+  """某个 (平台, 身份) 的熔断状态"""
+
+  def __init__(self) -> None:
+    self.failures = 0
+    self.open_until = 0.0
+    self.probing = False
+    self.probe_started = 0.0
+    # 每次交出探测权时加一，用于识别当前的探测者
+    self.probe_id = 0
+    self.changed = asyncio.Event()
+
+  def notify(self) -> None:
+    self.changed.set()
+    self.changed = asyncio.Event()
+
+
+class CircuitBreaker:
+  """
+  风控熔断器，按 (平台, 身份) 记录封禁信号。
+  触发风控后只挂起使用该身份的协程（异步等待，不阻塞事件循环），到期后由一个协程探测是否恢复：
+  探测成功则恢复所有等待者，失败则以指数退避延长等待时间。其他平台和身份不受影响。
+  """
+
+  def __init__(self,
+               base_delay: float = 60,
+               max_delay: float = 1020,
+               factor: float = 2,
+               max_retries: int = 6,
+               probe_timeout: float = 60) -> None:
+    """
+    Args:
+      base_delay(float): 首次触发风控后的等待时间（秒）
+      max_delay(float): 最长等待时间（秒）
+      factor(float): 每次探测失败后等待时间的倍数
+      max_retries(int): fetch_json连续遇到风控的最大重试次数
+      probe_timeout(float): 探测协程超过该时间未返回结果时，由其他协程接替探测
+    """
+    self.base_delay = base_delay
+    self.max_delay = max_delay
+    self.factor = factor
+    self.max_retries = max_retries
+    self.probe_timeout = probe_timeout
+    self.circuits: dict[tuple[str, str], Circuit] = {}
+    # 来自代理池的 (平台, 身份)：遇到风控时不在此等待重试，由调用方换用其他代理
+    self.rotating: set[tuple[str, str]] = set()
+
+  def is_open(self, platform: str, identity: str) -> bool:
+    circuit = self.circuits.get((platform, identity))
+    return circuit is not None and circuit.failures > 0
+
+  async def wait(self, platform: str, identity: str) -> Optional[int]:
+    """请求前调用：若该身份处于熔断状态，则等待到恢复或轮到自己探测，轮到自己探测时返回探测id"""
+    circuit = self.circuits.get((platform, identity))
+    while circuit is not None and circuit.failures > 0:
+      now = time.monotonic()
+      if now < circuit.open_until:
+        await asyncio.sleep(circuit.open_until - now)
+        continue
+      if not circuit.probing or now - circuit.probe_started > self.probe_timeout:
+        # 由当前协程探测
+        circuit.probing = True
+        circuit.probe_started = now
+        circuit.probe_id += 1
+        return circuit.probe_id
+      try:
+        await asyncio.wait_for(circuit.changed.wait(), self.probe_timeout)
+      except asyncio.TimeoutError:
+        pass
+    return None
+
+  def prober(self, circuit: Circuit, probe: Optional[int]) -> bool:
+    return probe is not None and circuit.probing and probe == circuit.probe_id
+
+  def report_ban(self, platform: str, identity: str, probe: Optional[int] = None) -> float:
+    """
+    报告风控信号，返回该身份需要等待的秒数。
+    只有熔断关闭时的首次风控和当前探测者的探测失败会延长等待时间；
+    触发风控时已经在途的其他请求随后也会失败，它们只沿用当前的等待时间，不会把一次风控计为多次探测失败
+    Args:
+      platform(str): 平台名
+      identity(str): 身份
+      probe(int | None): 请求前wait返回的探测id
+    """
+    circuit = self.circuits.setdefault((platform, identity), Circuit())
+    if circuit.failures > 0 and not self.prober(circuit, probe):
+      return max(0.0, circuit.open_until - time.monotonic())
+    delay = min(self.base_delay * self.factor ** circuit.failures, self.max_delay)
+    circuit.failures += 1
+    circuit.open_until = time.monotonic() + delay
+    circuit.probing = False
+    circuit.notify()
+    return delay
+
+  def release_probe(self, platform: str, identity: str, probe: Optional[int] = None) -> None:
+    """探测请求未得到结果（网络异常、被取消）时释放探测权，交给其他协程"""
+    circuit = self.circuits.get((platform, identity))
+    if circuit is not None and self.prober(circuit, probe):
+      circuit.probing = False
+      circuit.notify()
+
+  def rotate(self, platform: str, identity: str) -> None:
+    """
+    标记该身份来自代理池：fetch_json首次遇到风控即放弃（风控照常记录），
+    由调用方隔离该代理、换用其他代理，而不是在这里等待整个退避过程
+    """
+    self.rotating.add((platform, identity))
+
+  def report_success(self, platform: str, identity: str) -> None:
+    """报告请求正常，关闭熔断"""
+    circuit = self.circuits.get((platform, identity))
+    if circuit is not None and circuit.failures > 0:
+      circuit.failures = 0
+      circuit.probing = False
+      circuit.notify()
+
+  async def fetch_json(self,
+                       platform: str,
+                       identity: str,
+                       request: Callable[[], Awaitable[str]],
+                       logger: Optional[logging.Logger] = None,
+                       decode: Callable[[str], Any] = json.loads) -> Any:
+    """
+    在熔断器保护下发起请求并解析JSON。响应不是JSON时视为风控，挂起该身份后重试
+    Args:
+      platform(str): 平台名
+      identity(str): 身份（Cookie、代理）
+      request(Callable): 发起请求并返回响应文本的函数
+      logger(Logger | None): 日志
+      decode(Callable): 解码函数，响应不是JSON时需抛出JSONDecodeError，默认为json.loads
+    Raises:
+      json.decoder.JSONDecodeError: 连续max_retries次遇到风控；身份来自代理池时首次遇到风控即抛出
+    """
+    retries = 0
+    while True:
+      probe = await self.wait(platform, identity)
+      try:
+        res = await request()
+      except BaseException:
+        self.release_probe(platform, identity, probe)
+        raise
+      try:
+        data = decode(res)
+      except json.decoder.JSONDecodeError:
+        delay = self.report_ban(platform, identity, probe)
+        retries += 1
+        if retries > self.max_retries:
+          raise
+        if (platform, identity) in self.rotating:
+          if logger:
+            logger.warning("代理被风控，放弃该代理")
+          raise
+        if logger:
+          logger.error(f"非JSON格式数据：{res[:200]}") # 大概率风控
+          logger.warning(f"大概率风控，暂停该身份的请求{delay:.0f}秒后重试（第{retries}次）")
+        continue
+      self.report_success(platform, identity)
+      return data
+
+
+# 所有爬虫共享的熔断器
+circuit_breaker = CircuitBreaker()
+
+
+class TokenBucket:
+  """带自适应速率的令牌桶"""
+
+  def __init__(self, rate: float, burst: float, min_rate: float, max_rate: float) -> None:
+    self.rate = rate
+    self.burst = burst
+    self.min_rate = min_rate
+    self.max_rate = max_rate
+    self.tokens = burst
+    self.updated = time.monotonic()
+    self.clean = 0
+
+  def reserve(self) -> float:
+    """预约一个令牌，返回需要等待的秒数。令牌可以透支，透支部分按到达顺序排队"""
+    now = time.monotonic()
+    self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+    self.updated = now
+    self.tokens -= 1
+    return max(0.0, -self.tokens / self.rate)
+
+
+class RateLimiter:
+  """
+  按 (主机, 身份) 限速的异步令牌桶限速器，取代分散的random_sleep。
+  同一身份（Cookie、代理）的所有爬虫共享一个桶，总请求速率不随爬虫数量增长；
+  出错时乘性降速，连续正常响应后加性提速（AIMD）。
+  """
+
+  def __init__(self,
+               rates: Optional[dict[str, float]] = None,
+               default_rate: float = 2,
+               burst: float = 3,
+               jitter: float = 0.3,
+               min_rate: float = 0.2,
+               max_factor: float = 2,
+               decrease: float = 0.5,
+               increase: float = 0.2,
+               ramp_after: int = 20) -> None:
+    """
+    Args:
+      rates(dict[str, float] | None): 主机 -> 每秒请求数
+      default_rate(float): 未配置主机的每秒请求数
+      burst(float): 桶容量，即允许的突发请求数
+      jitter(float): 随机抖动，以单个请求间隔为单位
+      min_rate(float): 降速下限
+      max_factor(float): 提速上限为配置速率的倍数
+      decrease(float): 出错时速率乘以该系数
+      increase(float): 提速时每次增加的每秒请求数
+      ramp_after(int): 连续多少次正常响应后提速
+    """
+    self.rates = rates or {}
+    self.default_rate = default_rate
+    self.burst = burst
+    self.jitter = jitter
+    self.min_rate = min_rate
+    self.max_factor = max_factor
+    self.decrease = decrease
+    self.increase = increase
+    self.ramp_after = ramp_after
+    self.buckets: dict[tuple[str, str], TokenBucket] = {}
+
+  def bucket(self, host: str, identity: str) -> TokenBucket:
+    key = (host, identity)
+    if key not in self.buckets:
+      rate = self.rates.get(host, self.default_rate)
+      self.buckets[key] = TokenBucket(rate, self.burst, min(self.min_rate, rate), rate * self.max_factor)
+    return self.buckets[key]
+
+  async def acquire(self, host: str, identity: str) -> None:
+    """请求前调用，等待到可以发出请求"""
+    bucket = self.bucket(host, identity)
+    delay = bucket.reserve()
+    if self.jitter:
+      delay += uniform(0, self.jitter / bucket.rate)
+    if delay > 0:
+      await asyncio.sleep(delay)
+
+  def report(self, host: str, identity: str, ok: bool) -> None:
+    """报告请求结果，调整该桶的速率"""
+    bucket = self.bucket(host, identity)
+    if not ok:
+      bucket.rate = max(bucket.min_rate, bucket.rate * self.decrease)
+      bucket.clean = 0
+      return
+    bucket.clean += 1
+    if bucket.clean >= self.ramp_after:
+      bucket.rate = min(bucket.max_rate, bucket.rate + self.increase)
+      bucket.clean = 0
+
+
+# 所有爬虫共享的限速器（每个身份的每秒请求数）
+rate_limiter = RateLimiter({
+  "api.bilibili.com": 4,
+  "weibo.com": 1.5,
+})
+
+
+def instance_id(name: str, index: int) -> str:
+  """全局唯一的爬虫实例id（主机名-进程号-名称#序号），多进程、多主机运行时用于区分worker"""
+  return f"{socket.gethostname()}-{os.getpid()}-{name}#{index}"
+
+
+# 本机进程槽位的环境变量。同一主机同时运行多个爬虫进程时各进程的槽位必须不同，分片worker由run_shards设置
+SLOT_ENV = "CRAWLER_SLOT"
+
+
+def slot_id(name: str, index: int) -> str:
+  """
+  重启后不变的爬虫实例id（主机名-槽位-名称#序号），用于命名暂存缓存键：
+  进程崩溃后，同一槽位的新进程能找到并回收上次遗留的缓存
+  """
+  return f"{socket.gethostname()}-{os.environ.get(SLOT_ENV, '0')}-{name}#{index}"
+
+
+# 调度器的任务处理函数：接收 (条目id, 附加数据)，返回爬取结果
+Handler = Callable[[Hashable, Any], Awaitable[CrawlResult]]
+
+
+class CrawlerRunner:
+  """
+  全局优先级调度器。
+  所有平台、所有用户的待爬取条目放进同一个前沿队列（每个平台一个堆，按预期产出即评论数从高到低），
+  每个工作协程空闲时立即取走本平台优先级最高的条目，不会在用户之间的边界上等待最慢的协程。
+  条目失败（返回失败或抛出异常）时重新入队，超过最大尝试次数后放弃，工作协程本身不会退出。
+  """
+
+  def __init__(self, max_attempts: int = 3, name: str = "Runner") -> None:
+    """
+    Args:
+      max_attempts(int): 每个条目的最大尝试次数
+      name(str): logger名称
+    """
+    self.max_attempts = max_attempts
+    self.logger = get_logger(name)
+    self.frontier: dict[str, list] = {}
+    self.handlers: dict[str, list[Handler]] = {}
+    self.inflight: dict[str, int] = {}
+    self.attempts: dict[tuple[str, Hashable], int] = {}
+    self.failed: list[tuple[str, Hashable]] = []
+    self.seq = itertools.count()
+    self.changed = asyncio.Event()
+
+  def register(self, platform: str, handlers: list[Handler]) -> None:
+    """为平台注册工作协程，每个处理函数对应一个工作协程（通常是一个爬虫实例）"""
+    self.frontier.setdefault(platform, [])
+    self.inflight.setdefault(platform, 0)
+    self.handlers.setdefault(platform, []).extend(handlers)
+
+  def push(self, platform: str, key: Hashable, priority: float = 0, payload: Any = None) -> None:
+    """
+    加入待爬取条目
+    Args:
+      platform(str): 平台名
+      key(Hashable): 条目id（aid、博文id）
+      priority(float): 优先级，越大越先爬取
+      payload(Any): 交给处理函数的附加数据
+    """
+    heapq.heappush(self.frontier.setdefault(platform, []), (-priority, next(self.seq), key, payload))
+    self.notify()
+
+  def pending(self, platform: Optional[str] = None) -> int:
+    """待爬取条目数"""
+    if platform is not None:
+      return len(self.frontier.get(platform, []))
+    return sum(len(heap) for heap in self.frontier.values())
+
+  def notify(self) -> None:
+    self.changed.set()
+    self.changed = asyncio.Event()
+
+  def retry(self, platform: str, key: Hashable, priority: float, payload: Any, err: Any) -> None:
+    attempts = self.attempts.get((platform, key), 0) + 1
+    self.attempts[(platform, key)] = attempts
+    if err == Err.NOT_EXISTS or attempts >= self.max_attempts:
+      self.logger.error(f"[{platform}] 条目{key} 爬取失败（{err}），已尝试{attempts}次，放弃")
+      self.failed.append((platform, key))
+      return
+    self.logger.warning(f"[{platform}] 条目{key} 爬取失败（{err}），重新入队（第{attempts}次）")
+    self.push(platform, key, priority, payload)
+
+  async def worker(self, platform: str, handler: Handler) -> None:
+    heap = self.frontier[platform]
+    while True:
+      if not heap:
+        if self.inflight[platform] == 0:
+          return
+        # 其他协程的条目可能失败并重新入队
+        await self.changed.wait()
+        continue
+      priority, _, key, payload = heapq.heappop(heap)
+      self.inflight[platform] += 1
+      try:
+        res, err = await handler(key, payload)
+      except asyncio.CancelledError:
+        raise
+      except Exception as e:
+        self.logger.exception(e)
+        res, err = False, Err.FAILED
+      finally:
+        self.inflight[platform] -= 1
+      if not res:
+        self.retry(platform, key, -priority, payload, err)
+      self.notify()
+
+  async def run(self) -> None:
+    """运行所有平台的工作协程，直到前沿队列清空"""
+    for platform, heap in self.frontier.items():
+      self.logger.info(f"[{platform}] 待爬取{len(heap)}个条目，{len(self.handlers.get(platform, []))}个工作协程")
+    await asyncio.gather(*[
+      self.worker(platform, handler)
+      for platform, handlers in self.handlers.items()
+      for handler in handlers
+    ])
+    self.logger.info(f"调度结束，{len(self.failed)}个条目失败")
   
 
 async def random_sleep(lower: float, upper: float):
@@ -0,0 +1,73 @@
+import math
+from hashlib import blake2b
+from typing import Hashable, Sequence
+from .redis import Redis
+
+# 逐条判断是否所有位都已置1
+# KEYS: 位图  ARGV: 哈希函数个数, 各条目的位偏移（每条k个）
+CONTAINS = """
+local k = tonumber(ARGV[1])
+local result = {}
+for i = 2, #ARGV, k do
+  local seen = 1
+  for j = i, i + k - 1 do
+    if redis.call('GETBIT', KEYS[1], ARGV[j]) == 0 then
+      seen = 0
+      break
+    end
+  end
+  result[#result + 1] = seen
+end
+return result
+"""
+
+# KEYS: 位图  ARGV: 位偏移
+ADD = """
+for i = 1, #ARGV do
+  redis.call('SETBIT', KEYS[1], ARGV[i], 1)
+end
+return #ARGV
+"""
+
+
+class BloomFilter:
+  """
+  Redis位图上的布隆过滤器，多个进程、主机共用同一个Redis即可共享。
+  不会漏判已加入的条目，但有error_rate的概率把新条目误判为已存在
+  """
+
+  def __init__(self, redis: Redis, key: str, capacity: int = 10_000_000, error_rate: float = 0.001) -> None:
+    """
+    Args:
+      redis(Redis): redis连接对象
+      key(str): 位图键名
+      capacity(int): 预计条目数，超过后误判率上升
+      error_rate(float): 容量内的误判率
+    """
+    self.redis = redis
+    self.key = key
+    # 最优位数与哈希函数个数
+    self.bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+    self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+    self.contains_script = redis.client.register_script(CONTAINS)
+    self.add_script = redis.client.register_script(ADD)
+
+  def offsets(self, item: Hashable) -> list[int]:
+    """双重哈希得到k个位偏移"""
+    digest = blake2b(str(item).encode(), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+    return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+  async def contains(self, items: Sequence[Hashable]) -> list[bool]:
+    """批量判断条目是否（可能）已存在，一次网络往返"""
+    if not items:
+      return []
+    args = [self.hashes] + [offset for item in items for offset in self.offsets(item)]
+    return [bool(seen) for seen in await self.contains_script(keys=[self.key], args=args)]
+
+  async def add(self, items: Sequence[Hashable]) -> None:
+    """批量加入条目"""
+    if not items:
+      return
+    await self.add_script(keys=[self.key], args=[offset for item in items for offset in self.offsets(item)])
@@ -1,10 +1,64 @@
+import time
+import uuid
 import asyncio
 import logging
 import json
+from typing import Optional
 from motor.motor_asyncio import AsyncIOMotorCollection
 from .mongo import MongoDB
 from .redis import Redis
 
+# 从列表尾部（最早写入的一端）取出一批，转入在途批次列表，取出与登记是原子的
+# KEYS: 源列表, 在途批次集合  ARGV: 批大小, 批次键
+CLAIM = """
+local items = redis.call('RPOP', KEYS[1], ARGV[1])
+if not items then return false end
+local key = ARGV[2]
+redis.call('RPUSH', key, unpack(items))
+redis.call('SADD', KEYS[2], key)
+return {key, items}
+"""
+
+class TransferStats:
+  """一次转移的统计"""
+
+  def __init__(self) -> None:
+    self.batches = 0
+    self.documents = 0
+    self.write_seconds = 0.0
+    self.max_latency = 0.0
+    self.started = time.perf_counter()
+
+  @property
+  def seconds(self) -> float:
+    return time.perf_counter() - self.started
+
+  @property
+  def rate(self) -> float:
+    """条/秒"""
+    return self.documents / max(self.seconds, 1e-9)
+
+  def observe(self, count: int, write_seconds: float, latency: float) -> None:
+    self.batches += 1
+    self.documents += count
+    self.write_seconds += write_seconds
+    self.max_latency = max(self.max_latency, latency)
+
+
+async def write_batch(collection: AsyncIOMotorCollection, data: list[dict], upsert: bool) -> None:
+  """无序写入一批文档，重新投递导致的重复键错误视为已写入"""
+  if upsert:
+    await MongoDB.upsert_many(collection, data, ordered=False)
+  else:
+    await MongoDB.insert_new(collection, data)
+
+
+async def discard(redis: Redis, name: str) -> None:
+  """删除Redis列表及其未确认的在途批次"""
+  inflight = f"{name}:inflight"
+  keys = await redis.client.smembers(inflight)
+  await redis.client.delete(name, inflight, *keys)
+
 
 async def transfer(redis: Redis,
                    name: str,
@@ -12,35 +66,121 @@ async def transfer(redis: Redis,
                    upsert: bool = True,
                    batch_size: int = 1000,
                    logger: logging.Logger | None = None,
-                   delete: bool = True) -> None:
+                   delete: bool = True,
+                   concurrency: int = 2,
+                   queue_size: int = 4,
+                   follow: Optional[asyncio.Event] = None,
+                   poll_interval: float = 0.5) -> TransferStats:
   """
-  将数据从Redis列表中分块写入MongoDB
+  将数据从Redis列表中分批流式写入MongoDB。
+  读取与写入重叠进行：一个协程从Redis取批次放入有界队列，concurrency个协程无序批量写入MongoDB。
+  每批以原子操作从列表中取出并登记为在途批次，写入MongoDB后才确认删除；
+  中途崩溃时只有未确认的批次会在下一次转移同一列表时重新投递（至少一次，文档有_id时重复投递是幂等的）
   Args:
     redis(Redis): redis连接对象
     name(str): redis list名称
     collection(AsyncIOMotorCollection): 要写入的异步MongoDB集合
     upsert(bool): 是否优先更新而不是插入，默认为True
-    batch_size(int): 单次插入数量，默认为1000
+    batch_size(int): 单次写入数量，默认为1000
+    logger(Logger | None): 日志，逐批输出吞吐量与延迟
+    delete(bool): 是否从Redis中取走数据；为False时只复制，不删除列表
+    concurrency(int): 同时写入MongoDB的批次数
+    queue_size(int): 已读取、等待写入的最大批次数
+    follow(asyncio.Event | None): 持续模式：列表为空时不退出，继续等待爬虫写入，直到事件被设置后写完剩余数据
+    poll_interval(float): 持续模式下列表为空时的轮询间隔（秒）
   """
   if logger:
-    logger.info(f"准备从Redis缓存写入MongoDB")
-  length = await redis.client.llen(name)
+    logger.info(f"准备从Redis缓存写入MongoDB，块大小：{batch_size}")
+  stats = TransferStats()
+  inflight = f"{name}:inflight"
+  claim = redis.client.register_script(CLAIM)
+  # 已读取、未确认的批次数上限；批次经无界队列交给写入协程，生产者只在名额上等待
+  slots = asyncio.Semaphore(queue_size)
+  queue: asyncio.Queue = asyncio.Queue()
+  # 出错时通知所有协程停止。redis客户端可能吞掉CancelledError，因此不依赖取消任务
+  stopped = asyncio.Event()
+
+  def stop() -> None:
+    stopped.set()
+    for _ in range(queue_size):
+      slots.release()
+
+  async def produce() -> None:
+    try:
+      if delete:
+        # 上次转移中断时未确认的批次
+        for key in await redis.client.smembers(inflight):
+          await slots.acquire()
+          if stopped.is_set():
+            return
+          items = await redis.client.lrange(key, 0, -1)
+          if logger:
+            logger.warning(f"重新投递未确认的批次：{len(items)}条")
+          queue.put_nowait((key, items, time.perf_counter()))
+      start = 0
+      while True:
+        await slots.acquire()
+        if stopped.is_set():
+          return
+        if delete:
+          claimed = await claim(keys=[name, inflight], args=[batch_size, f"{name}:batch:{uuid.uuid4().hex}"])
+          key, items = claimed or (None, None)
+        else:
+          key, items = None, await redis.client.lrange(name, start, start + batch_size - 1)
+          start += len(items)
+        if items:
+          queue.put_nowait((key, items, time.perf_counter()))
+          continue
+        slots.release()
+        if not delete or follow is None or follow.is_set():
+          return
+        try:
+          await asyncio.wait_for(follow.wait(), poll_interval)
+        except asyncio.TimeoutError:
+          pass
+    finally:
+      for _ in range(concurrency):
+        queue.put_nowait(None)
+
+  async def consume() -> None:
+    try:
+      while not stopped.is_set():
+        batch = await queue.get()
+        if batch is None:
+          return
+        key, items, claimed = batch
+        data = [json.loads(x) for x in items]
+        start = time.perf_counter()
+        await write_batch(collection, data, upsert)
+        cost = time.perf_counter() - start
+        if key is not None:
+          async with redis.client.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.srem(inflight, key)
+            await pipe.execute()
+        slots.release()
+        latency = time.perf_counter() - claimed
+        stats.observe(len(data), cost, latency)
+        if logger:
+          logger.info(
+            f"第{stats.batches}批：{len(data)}条，写入{cost * 1000:.0f}ms（{len(data) / max(cost, 1e-9):.0f}条/s），"
+            f"取出到确认{latency * 1000:.0f}ms"
+          )
+    except BaseException:
+      stop()
+      raise
+
+  tasks = [asyncio.create_task(produce())] + [asyncio.create_task(consume()) for _ in range(concurrency)]
+  try:
+    await asyncio.gather(*tasks)
+  finally:
+    if not all(task.done() for task in tasks):
+      stop()
+      await asyncio.gather(*tasks, return_exceptions=True)
+
   if logger:
-    logger.info(f"总数量：{length}，块大小：{batch_size}")
-
-  for i in range(0, length, batch_size):
-    j = min(i + batch_size - 1, length - 1)
-    if logger:
-      logger.info(f"正在写入第{i + 1}-{j + 1}条数据")
-    r = await redis.client.lrange(name, i, j)
-    data = [json.loads(x) for x in r]
-    if not data:
-      break
-    if upsert:
-      await MongoDB.upsert_many(collection, data)
-    else:
-      await collection.insert_many(data)
-    
-  if delete:
-    await redis.client.delete(name)
-    
\ No newline at end of file
+    logger.info(
+      f"写入完毕：{stats.documents}条，{stats.batches}批，用时{stats.seconds:.2f}s（{stats.rate:.0f}条/s），"
+      f"最大批延迟{stats.max_latency * 1000:.0f}ms"
+    )
+  return stats
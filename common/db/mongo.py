@@ -2,6 +2,10 @@ from motor import motor_asyncio
 from motor.motor_asyncio import AsyncIOMotorCollection
 from typing import Optional, Sequence
 from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+# 重复键错误码
+DUPLICATE_KEY = 11000
 
 class MongoDB:
   
@@ -12,9 +16,21 @@ class MongoDB:
       self.client = motor_asyncio.AsyncIOMotorClient(f"mongodb://{username}:{password}@{host}:{port}")
 
   @staticmethod
-  async def upsert_many(collection: AsyncIOMotorCollection, documents: list[dict], session = None) -> None:
+  async def upsert_many(collection: AsyncIOMotorCollection, documents: list[dict], session = None, ordered: bool = True) -> None:
     upserts = MongoDB.make_upserts(documents)
-    return await collection.bulk_write(upserts, session=session)
+    return await collection.bulk_write(upserts, ordered=ordered, session=session)
+
+  @staticmethod
+  async def insert_new(collection: AsyncIOMotorCollection, documents: list[dict]) -> int:
+    """无序插入，跳过_id已存在的文档，返回新插入的数量"""
+    try:
+      result = await collection.insert_many(documents, ordered=False)
+      return len(result.inserted_ids)
+    except BulkWriteError as e:
+      errors = e.details.get("writeErrors", [])
+      if not errors or any(error.get("code") != DUPLICATE_KEY for error in errors):
+        raise
+      return e.details.get("nInserted", 0)
 
   @staticmethod
   def make_upserts(documents: list[dict]) -> list[UpdateOne]:
@@ -0,0 +1,54 @@
+"""
+MobileGameComments数据库的索引声明，启动时调用ensure_indexes创建。
+createIndexes对已存在的同名同定义索引不做任何操作，重复调用是幂等的
+"""
+import logging
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+DATABASE = "MobileGameComments"
+
+# 集合 -> 索引（_id索引由MongoDB自动创建）
+INDEXES: dict[str, list[IndexModel]] = {
+  # 加载待爬取视频：find({"mid": {"$in": mids}, "finished": ...})；前缀mid也覆盖按用户查询视频
+  "BilibiliVideos": [
+    IndexModel([("mid", ASCENDING), ("finished", ASCENDING)], name="mid_finished"),
+  ],
+  # 加载待爬取文章：find({"uid": {"$in": uids}, "finished": ...})
+  "WeiboArticles": [
+    IndexModel([("uid", ASCENDING), ("finished", ASCENDING)], name="uid_finished"),
+  ],
+  # 推算水位线：find_one({"aid": aid, "is_root": True}, sort=[("time", -1), ("rpid", -1)])，
+  # 等值字段在前、排序字段在后，只需读取一个索引项
+  "BilibiliComments": [
+    IndexModel([("aid", ASCENDING), ("is_root", ASCENDING), ("time", DESCENDING), ("rpid", DESCENDING)], name="aid_root_time_rpid"),
+  ],
+  # 删除/读取某篇文章的评论：delete_many({"blogid": id})、find({"blogid": id})
+  "WeiboComments": [
+    IndexModel([("blogid", ASCENDING)], name="blogid"),
+  ],
+  # 写入情绪结果：preprocessing.pipeline.write_results按(游戏, 月份)upsert，UpdateOne({"game": game, "time": time}, ..., upsert=True)；
+  # 可视化读取全部结果，不需要索引
+  "Result": [
+    IndexModel([("game", ASCENDING), ("time", ASCENDING)], name="game_time"),
+  ],
+  "BilibiliResult": [
+    IndexModel([("game", ASCENDING), ("time", ASCENDING)], name="game_time"),
+  ],
+  "WeiboResult": [
+    IndexModel([("game", ASCENDING), ("time", ASCENDING)], name="game_time"),
+  ],
+}
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase, logger: logging.Logger | None = None) -> None:
+  """
+  创建所有声明的索引，已存在的索引会被跳过
+  Args:
+    db(AsyncIOMotorDatabase): MobileGameComments数据库
+    logger(Logger | None): 日志
+  """
+  for name, indexes in INDEXES.items():
+    created = await db[name].create_indexes(indexes)
+    if logger:
+      logger.info(f"集合{name}的索引：{', '.join(created)}")
@@ -0,0 +1,109 @@
+import json
+import asyncio
+import logging
+from pathlib import Path
+from urllib.parse import quote, unquote
+from motor.motor_asyncio import AsyncIOMotorCollection
+from .bridge import write_batch
+
+SPILL_PATH = Path(__file__).parent.parent.parent.joinpath("cache").joinpath("spill")
+
+
+class SpillLog:
+  """
+  溢出日志：Redis缓存过大时，记录按顺序追加写入本地分段文件（每行一条记录），
+  之后按写入顺序逐段写入MongoDB，每段全部写入后才删除（至少一次）。
+  分段文件以名称命名，进程崩溃后以同一名称创建的溢出日志会接管遗留的分段
+  """
+
+  def __init__(self, name: str, directory: Path = SPILL_PATH, segment_size: int = 50000) -> None:
+    """
+    Args:
+      name(str): 名称，通常为对应的Redis列表名称
+      directory(Path): 分段文件所在目录
+      segment_size(int): 每个分段文件的最大记录数
+    """
+    self.name = name
+    # 可逆的文件名编码，由文件名可以还原出名称
+    self.prefix = quote(name, safe="").replace(".", "%2E")
+    self.directory = directory
+    self.segment_size = segment_size
+    # 上次运行遗留的分段，按序号排列
+    self.segments: list[Path] = sorted(directory.glob(f"{self.prefix}.*.seg"), key=lambda path: int(path.name.split(".")[1]))
+    # 下一个分段文件的序号，只增不减，部分写入后追加的分段不会与未删除的分段重名
+    self.index = int(self.segments[-1].name.split(".")[1]) + 1 if self.segments else 0
+    # 最后一个分段文件中的记录数，遗留的分段不再追加
+    self.tail = segment_size
+    self.records = sum(path.read_bytes().count(b"\n") for path in self.segments)
+
+  def __len__(self) -> int:
+    return self.records
+
+  @staticmethod
+  def names(directory: Path = SPILL_PATH) -> set[str]:
+    """目录下所有遗留分段所属的名称"""
+    return {unquote(path.name.split(".")[0]) for path in directory.glob("*.seg")}
+
+  def segment(self, index: int) -> Path:
+    return self.directory.joinpath(f"{self.prefix}.{index:06d}.seg")
+
+  def write(self, records: list[bytes | str]) -> None:
+    self.directory.mkdir(parents=True, exist_ok=True)
+    while records:
+      if not self.segments or self.tail >= self.segment_size:
+        self.segments.append(self.segment(self.index))
+        self.index += 1
+        self.tail = 0
+      chunk, records = records[:self.segment_size - self.tail], records[self.segment_size - self.tail:]
+      with open(self.segments[-1], "ab") as f:
+        f.write(b"".join((x.encode() if isinstance(x, str) else x) + b"\n" for x in chunk))
+      self.tail += len(chunk)
+      self.records += len(chunk)
+
+  async def append(self, records: list[bytes | str]) -> None:
+    """按顺序追加记录，文件写入在线程中进行，不阻塞事件循环"""
+    await asyncio.to_thread(self.write, records)
+
+  async def drain(self,
+                  collection: AsyncIOMotorCollection,
+                  upsert: bool = False,
+                  batch_size: int = 1000,
+                  logger: logging.Logger | None = None) -> int:
+    """
+    按写入顺序将所有记录写入MongoDB并删除分段文件，返回写入的数量
+    Args:
+      collection(AsyncIOMotorCollection): 要写入的异步MongoDB集合
+      upsert(bool): 是否以更新代替插入
+      batch_size(int): 单次写入数量
+      logger(Logger | None): 日志
+    """
+    count = 0
+    while self.segments:
+      path = self.segments[0]
+      lines = (await asyncio.to_thread(path.read_bytes)).splitlines()
+      records = []
+      for line in lines:
+        try:
+          records.append(json.loads(line))
+        except ValueError:
+          # 崩溃时写了一半的最后一行，对应的评论会在重新爬取时写入
+          if logger:
+            logger.warning(f"跳过溢出文件{path.name}中不完整的记录")
+      for i in range(0, len(records), batch_size):
+        await write_batch(collection, records[i:i + batch_size], upsert)
+      path.unlink()
+      self.segments.pop(0)
+      self.records -= len(lines)
+      count += len(records)
+      if logger:
+        logger.info(f"溢出文件{path.name}写入完毕：{len(records)}条")
+    self.clear()
+    return count
+
+  def clear(self) -> None:
+    """删除所有分段文件"""
+    for path in self.segments:
+      path.unlink(missing_ok=True)
+    self.segments = []
+    self.tail = 0
+    self.records = 0
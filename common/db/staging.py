@@ -0,0 +1,357 @@
+"""
+评论暂存后端。爬虫只通过统一的写入器接口暂存评论，不关心数据暂存在哪里：
+  add(records)  按顺序加入已序列化的记录
+  flush()       将缓冲区交给后端
+  commit()      将暂存的所有记录写入MongoDB，返回时已全部写入（提交检查点前调用）
+  discard()     丢弃尚未写入MongoDB的记录
+  close()       结束前调用，保证缓冲区不丢失
+后端：
+  Backend.Redis   记录暂存在Redis列表中，commit时由transfer转移到MongoDB，进程崩溃后数据仍在Redis中；
+                  列表长度或Redis内存超过高水位时按Overflow策略限流或溢出到本地文件
+  Backend.Memory  进程内有界队列 + 后台写回协程，记录只经过一次网络，适合单机运行；
+                  崩溃时丢失未提交的记录，重启后从检查点重新爬取
+"""
+import json
+import time
+import asyncio
+import logging
+import fnmatch
+from enum import Enum
+from pathlib import Path
+from typing import Optional, Sequence
+from motor.motor_asyncio import AsyncIOMotorCollection
+from .redis import Redis
+from .bridge import discard, transfer, write_batch
+from .spill import SPILL_PATH, SpillLog
+
+
+class Backend(Enum):
+  Redis = "redis"
+  Memory = "memory"
+
+
+class Overflow(Enum):
+  # 背压：先将本列表转移到MongoDB，Redis内存仍超过高水位时等待其他爬虫转移，爬取在此期间暂停
+  Wait = "wait"
+  # 溢出：之后的记录追加写入本地分段文件，commit时排在Redis列表之后按顺序写入MongoDB
+  Spill = "spill"
+
+
+class StagingWriter:
+  """
+  Redis缓存写入器：缓存待写入的记录，达到批大小或显式flush时，
+  以多值LPUSH在一个pipeline中一次写入，每批只需一次网络往返。
+  LPUSH key a b c 与依次 LPUSH a、b、c 的结果相同，写入顺序与逐条写入一致。
+  每次写入前检查列表长度（LPUSH的返回值）与Redis内存占用，超过高水位时按overflow策略处理
+  """
+
+  def __init__(self,
+               redis: Redis,
+               key: str,
+               batch_size: int = 1000,
+               chunk_size: int = 500,
+               collection: Optional[AsyncIOMotorCollection] = None,
+               upsert: bool = False,
+               logger: logging.Logger | None = None,
+               max_length: int = 200000,
+               max_memory: Optional[int] = None,
+               memory_ratio: float = 0.8,
+               overflow: Overflow = Overflow.Spill,
+               check_interval: float = 1.0,
+               max_wait: float = 60,
+               spill_directory: Path = SPILL_PATH) -> None:
+    """
+    Args:
+      redis(Redis): redis连接对象
+      key(str): redis list名称
+      batch_size(int): 缓存达到多少条时自动写入
+      chunk_size(int): 单条LPUSH命令最多携带的记录数，超出时在同一个pipeline中拆成多条命令
+      collection(AsyncIOMotorCollection | None): commit时写入的MongoDB集合
+      upsert(bool): commit时是否以更新代替插入
+      logger(Logger | None): 日志
+      max_length(int): 列表长度的高水位
+      max_memory(int | None): Redis内存上限（字节），为空时使用Redis的maxmemory配置；两者都为0时不检查内存
+      memory_ratio(float): 内存占用超过上限的多少比例视为超过高水位
+      overflow(Overflow): 超过高水位时的处理策略
+      check_interval(float): 查询Redis内存占用的最小间隔（秒），也是背压等待时的轮询间隔
+      max_wait(float): 背压时最多等待多少秒，超时后继续写入Redis
+      spill_directory(Path): 溢出文件所在目录
+    """
+    self.redis = redis
+    self.key = key
+    self.batch_size = batch_size
+    self.chunk_size = chunk_size
+    self.collection = collection
+    self.upsert = upsert
+    self.logger = logger
+    self.max_length = max_length
+    self.max_memory = max_memory
+    self.memory_ratio = memory_ratio
+    self.overflow = overflow
+    self.check_interval = check_interval
+    self.max_wait = max_wait
+    self.spill_directory = spill_directory
+    self.buffer: list[bytes | str] = []
+    self.written = 0
+    # 上次LPUSH后的列表长度，只有本写入器写入该列表
+    self.length = 0
+    self.memory_checked = 0.0
+    self.memory_high = False
+    # 溢出后直到commit之前的记录都写入溢出日志，保证顺序；同名列表上次运行遗留的溢出文件同样排在Redis列表之后
+    spill = SpillLog(key, spill_directory)
+    self.spill: Optional[SpillLog] = spill if spill.segments else None
+
+  def __len__(self) -> int:
+    return len(self.buffer)
+
+  async def add(self, records: Sequence[bytes | str]) -> None:
+    """按顺序加入已序列化的记录"""
+    self.buffer.extend(records)
+    if len(self.buffer) >= self.batch_size:
+      await self.flush()
+
+  async def flush(self) -> None:
+    """写入缓存的所有记录"""
+    if not self.buffer:
+      return
+    batch, self.buffer = self.buffer, []
+    if self.spill is None and await self.overflowing():
+      await self.relieve()
+    if self.spill is not None:
+      await self.spill.append(batch)
+    else:
+      async with self.redis.client.pipeline(transaction=False) as pipe:
+        for i in range(0, len(batch), self.chunk_size):
+          pipe.lpush(self.key, *batch[i:i + self.chunk_size])
+        self.length = (await pipe.execute())[-1]
+    self.written += len(batch)
+
+  async def overflowing(self) -> bool:
+    """列表长度或Redis内存占用是否超过高水位，内存占用每check_interval秒最多查询一次"""
+    if self.length >= self.max_length:
+      return True
+    now = time.monotonic()
+    if now - self.memory_checked >= self.check_interval:
+      self.memory_checked = now
+      info = await self.redis.client.info("memory")
+      limit = self.max_memory or info.get("maxmemory", 0)
+      self.memory_high = bool(limit) and info["used_memory"] >= limit * self.memory_ratio
+    return self.memory_high
+
+  async def relieve(self) -> None:
+    """超过高水位时按策略处理"""
+    if self.overflow == Overflow.Spill:
+      self.spill = SpillLog(self.key, self.spill_directory)
+      if self.logger:
+        self.logger.warning(f"Redis缓存超过高水位（列表长度{self.length}），之后的记录溢出到本地文件")
+      return
+    if self.logger:
+      self.logger.warning(f"Redis缓存超过高水位（列表长度{self.length}），暂停写入")
+    if self.collection is not None:
+      # 提前转移本列表；文档以评论id为_id，检查点之前写入是幂等的
+      await transfer(self.redis, self.key, self.collection, upsert=self.upsert, logger=self.logger)
+      self.length = 0
+    deadline = time.monotonic() + self.max_wait
+    while await self.overflowing() and time.monotonic() < deadline:
+      await asyncio.sleep(self.check_interval)
+      # 列表也可能由其他协程（如持续模式的transfer）转移
+      self.length = await self.redis.client.llen(self.key)
+      self.memory_checked = 0.0
+    if self.logger:
+      self.logger.info("恢复写入")
+
+  async def commit(self) -> None:
+    """将Redis列表中的所有记录转移到MongoDB，再按顺序写入溢出的记录"""
+    await self.flush()
+    await transfer(self.redis, self.key, self.collection, upsert=self.upsert, logger=self.logger)
+    self.length = 0
+    if self.spill is not None:
+      await self.spill.drain(self.collection, upsert=self.upsert, batch_size=self.batch_size, logger=self.logger)
+      self.spill = None
+
+  async def discard(self) -> None:
+    """丢弃缓存的记录、已写入Redis的记录、转移中未确认的批次和溢出的记录"""
+    self.buffer = []
+    await discard(self.redis, self.key)
+    self.length = 0
+    if self.spill is not None:
+      self.spill.clear()
+      self.spill = None
+
+  async def close(self) -> None:
+    """写入缓存的记录，留在Redis（或溢出文件）中等待下一次转移"""
+    await self.flush()
+
+
+class MemoryStagingWriter:
+  """
+  进程内写回（write-behind）写入器：缓存的记录达到批大小或停留超过max_delay秒时成批放入有界队列，
+  后台协程从队列中取出批次写入MongoDB。队列满时add等待，爬取速度受写入速度约束，内存占用有上限
+  """
+
+  def __init__(self,
+               collection: AsyncIOMotorCollection,
+               upsert: bool = False,
+               batch_size: int = 1000,
+               max_delay: float = 1.0,
+               max_batches: int = 4,
+               logger: logging.Logger | None = None) -> None:
+    """
+    Args:
+      collection(AsyncIOMotorCollection): 写入的MongoDB集合
+      upsert(bool): 是否以更新代替插入
+      batch_size(int): 单次写入数量
+      max_delay(float): 记录在缓冲区中最多停留多少秒即被写入
+      max_batches(int): 队列中等待写入的最大批次数
+      logger(Logger | None): 日志
+    """
+    self.collection = collection
+    self.upsert = upsert
+    self.batch_size = batch_size
+    self.max_delay = max_delay
+    self.logger = logger
+    self.buffer: list[bytes | str] = []
+    self.queue: asyncio.Queue[list[bytes | str]] = asyncio.Queue(maxsize=max_batches)
+    self.task: Optional[asyncio.Task] = None
+    # 后台写入出错时保存异常，由之后的flush/commit抛出，discard后清除
+    self.error: Optional[BaseException] = None
+    self.written = 0
+
+  def __len__(self) -> int:
+    return len(self.buffer)
+
+  def start(self) -> None:
+    """启动后台写回协程，之后不足一批的记录也会在max_delay秒内写入"""
+    if self.task is None:
+      self.task = asyncio.create_task(self.run())
+
+  async def add(self, records: Sequence[bytes | str]) -> None:
+    """按顺序加入已序列化的记录"""
+    self.start()
+    self.buffer.extend(records)
+    if len(self.buffer) >= self.batch_size:
+      await self.flush()
+
+  async def flush(self) -> None:
+    """将缓存的记录作为一批放入写入队列，队列满时等待"""
+    self.raise_error()
+    self.start()
+    while self.buffer:
+      batch, self.buffer = self.buffer[:self.batch_size], self.buffer[self.batch_size:]
+      await self.queue.put(batch)
+
+  async def run(self) -> None:
+    """后台写回协程"""
+    # 超时后不取消等待中的get，避免取消与取到批次同时发生时丢失批次
+    getter: Optional[asyncio.Future] = None
+    try:
+      while True:
+        getter = getter or asyncio.ensure_future(self.queue.get())
+        done, _ = await asyncio.wait({getter}, timeout=self.max_delay)
+        if not done:
+          # 时间阈值：写入在缓冲区中停留过久的记录
+          if self.buffer and not self.queue.full():
+            batch, self.buffer = self.buffer[:self.batch_size], self.buffer[self.batch_size:]
+            self.queue.put_nowait(batch)
+          continue
+        batch, getter = getter.result(), None
+        await self.write(batch)
+    finally:
+      if getter is not None:
+        getter.cancel()
+
+  async def write(self, batch: list[bytes | str]) -> None:
+    try:
+      if self.error is None:
+        await write_batch(self.collection, [json.loads(x) for x in batch], self.upsert)
+        self.written += len(batch)
+    except Exception as e:
+      # 出错后丢弃之后的批次，不再阻塞生产者
+      self.error = e
+      if self.logger:
+        self.logger.exception(e)
+    finally:
+      self.queue.task_done()
+
+  def raise_error(self) -> None:
+    """后台写入出错后，直到discard之前都会抛出该异常"""
+    if self.error is not None:
+      raise self.error
+
+  async def commit(self) -> None:
+    """写入所有缓存和排队的记录，返回时已全部写入MongoDB"""
+    await self.flush()
+    await self.queue.join()
+    self.raise_error()
+
+  async def discard(self) -> None:
+    """丢弃缓存和排队中尚未写入的记录，正在写入的批次不受影响"""
+    self.buffer = []
+    while not self.queue.empty():
+      self.queue.get_nowait()
+      self.queue.task_done()
+    self.error = None
+
+  async def close(self) -> None:
+    """写入剩余记录并停止后台协程"""
+    try:
+      await self.commit()
+    finally:
+      if self.task is not None:
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        self.task = None
+
+
+async def recover(redis: Redis,
+                  patterns: list[str],
+                  collection: AsyncIOMotorCollection,
+                  upsert: bool = False,
+                  logger: logging.Logger | None = None,
+                  spill_directory: Path = SPILL_PATH) -> int:
+  """
+  启动时调用：将上次运行遗留的暂存列表（包括未确认的在途批次）及其溢出文件按顺序写入MongoDB并删除，返回写入的记录数。
+  遗留的记录是最后一个检查点之后爬取的，重新爬取时会再次写入，文档以评论id为_id，重复写入是幂等的
+  Args:
+    redis(Redis): redis连接对象
+    patterns(list[str]): 暂存列表名称的匹配模式（SCAN MATCH语法）
+    collection(AsyncIOMotorCollection): 写入的MongoDB集合
+    upsert(bool): 是否以更新代替插入
+    logger(Logger | None): 日志
+    spill_directory(Path): 溢出文件所在目录
+  """
+  names = {name for name in SpillLog.names(spill_directory) if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)}
+  for pattern in patterns:
+    async for key in redis.client.scan_iter(match=pattern):
+      key = key.decode() if isinstance(key, bytes) else key
+      # 在途批次由所属列表的:inflight集合找到
+      if ":batch:" not in key:
+        names.add(key.removesuffix(":inflight"))
+  count = 0
+  for name in sorted(names):
+    if logger:
+      logger.warning(f"回收上次运行遗留的暂存列表：{name}")
+    stats = await transfer(redis, name, collection, upsert=upsert, logger=logger)
+    count += stats.documents + await SpillLog(name, spill_directory).drain(collection, upsert=upsert, logger=logger)
+  return count
+
+
+def create_staging(backend: Backend,
+                   redis: Redis,
+                   key: str,
+                   collection: AsyncIOMotorCollection,
+                   upsert: bool = False,
+                   logger: logging.Logger | None = None) -> StagingWriter | MemoryStagingWriter:
+  """
+  创建指定后端的写入器
+  Args:
+    backend(Backend): 暂存后端
+    redis(Redis): Redis后端使用的连接对象
+    key(str): Redis后端使用的列表名称
+    collection(AsyncIOMotorCollection): 最终写入的MongoDB集合
+    upsert(bool): 是否以更新代替插入
+    logger(Logger | None): 日志
+  """
+  if backend == Backend.Memory:
+    return MemoryStagingWriter(collection, upsert=upsert, logger=logger)
+  return StagingWriter(redis, key, collection=collection, upsert=upsert, logger=logger)
@@ -0,0 +1,287 @@
+import json
+import asyncio
+from typing import Any, Hashable, Optional
+from redis.exceptions import RedisError
+
+from .crawler import CrawlerRunner, Err, instance_id
+from .db.redis import Redis
+
+# 取出优先级最高的条目并租给worker
+# KEYS: pending, leases, owners, priority  ARGV: 租期（秒）, worker
+CLAIM = """
+local item = redis.call('ZPOPMAX', KEYS[1])
+if #item == 0 then return false end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+redis.call('ZADD', KEYS[2], now + tonumber(ARGV[1]), item[1])
+redis.call('HSET', KEYS[3], item[1], ARGV[2])
+redis.call('HSET', KEYS[4], item[1], item[2])
+return item[1]
+"""
+
+# 续租，只有租约持有者可以续租
+# KEYS: leases, owners  ARGV: 租期（秒）, worker, 条目
+EXTEND = """
+if redis.call('HGET', KEYS[2], ARGV[3]) ~= ARGV[2] then return 0 end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+redis.call('ZADD', KEYS[1], 'XX', now + tonumber(ARGV[1]), ARGV[3])
+return 1
+"""
+
+# 结束租约：ARGV[3]为1时放回待爬取队列，否则视为完成（成功或放弃），清除失败次数
+# KEYS: pending, leases, owners, priority, attempts  ARGV: worker, 条目, 是否放回
+RELEASE = """
+if redis.call('HGET', KEYS[3], ARGV[2]) ~= ARGV[1] then return 0 end
+redis.call('ZREM', KEYS[2], ARGV[2])
+redis.call('HDEL', KEYS[3], ARGV[2])
+local priority = redis.call('HGET', KEYS[4], ARGV[2])
+redis.call('HDEL', KEYS[4], ARGV[2])
+if ARGV[3] == '1' then
+  redis.call('ZADD', KEYS[1], priority or 0, ARGV[2])
+else
+  redis.call('HDEL', KEYS[5], ARGV[2])
+end
+return 1
+"""
+
+# 回收过期租约和心跳已消失的worker持有的租约
+# KEYS: pending, leases, owners, priority  ARGV: 心跳键前缀
+RECLAIM = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local items = redis.call('ZRANGE', KEYS[2], 0, -1, 'WITHSCORES')
+local count = 0
+for i = 1, #items, 2 do
+  local member = items[i]
+  local owner = redis.call('HGET', KEYS[3], member)
+  if tonumber(items[i + 1]) < now or (owner and redis.call('EXISTS', ARGV[1] .. owner) == 0) then
+    redis.call('ZREM', KEYS[2], member)
+    redis.call('HDEL', KEYS[3], member)
+    redis.call('ZADD', KEYS[1], redis.call('HGET', KEYS[4], member) or 0, member)
+    redis.call('HDEL', KEYS[4], member)
+    count = count + 1
+  end
+end
+return count
+"""
+
+
+class RedisFrontier:
+  """
+  Redis共享前沿队列，供多个进程、多台主机上的worker共同消费。
+  每个平台一个有序集合保存待爬取条目（分数为优先级）；worker取走条目时获得一个有租期的租约，
+  处理期间定时续租，完成后确认。worker崩溃后租约过期（或心跳消失），条目被回收给其他worker。
+  """
+
+  def __init__(self,
+               redis: Redis,
+               prefix: str = "frontier",
+               visibility_timeout: float = 300,
+               heartbeat_ttl: float = 30) -> None:
+    """
+    Args:
+      redis(Redis): 所有worker共用的Redis
+      prefix(str): 键前缀
+      visibility_timeout(float): 租期（秒），超过租期未续租的条目会被回收
+      heartbeat_ttl(float): worker心跳键的过期时间（秒）
+    """
+    self.redis = redis
+    self.prefix = prefix
+    self.visibility_timeout = visibility_timeout
+    self.heartbeat_ttl = heartbeat_ttl
+    client = redis.client
+    self.claim_script = client.register_script(CLAIM)
+    self.extend_script = client.register_script(EXTEND)
+    self.release_script = client.register_script(RELEASE)
+    self.reclaim_script = client.register_script(RECLAIM)
+
+  def keys(self, platform: str) -> list[str]:
+    """pending, leases, owners, priority, attempts"""
+    base = f"{self.prefix}:{platform}"
+    return [f"{base}:pending", f"{base}:leases", f"{base}:owners", f"{base}:priority", f"{base}:attempts"]
+
+  @property
+  def heartbeat_prefix(self) -> str:
+    return f"{self.prefix}:heartbeat:"
+
+  @staticmethod
+  def encode(key: Hashable, payload: Any) -> str:
+    return json.dumps([key, payload])
+
+  @staticmethod
+  def decode(member: bytes | str) -> tuple[Any, Any]:
+    key, payload = json.loads(member)
+    return key, payload
+
+  async def push(self, platform: str, items: list[tuple[Hashable, float, Any]]) -> int:
+    """
+    批量加入条目，已在队列中的条目保持原优先级
+    Args:
+      platform(str): 平台名
+      items(list): (条目id, 优先级, 附加数据)
+    """
+    if not items:
+      return 0
+    pending = self.keys(platform)[0]
+    mapping = {RedisFrontier.encode(key, payload): priority for key, priority, payload in items}
+    return await self.redis.client.zadd(pending, mapping, nx=True)
+
+  async def claim(self, platform: str, worker: str) -> Optional[tuple[str, Any, Any]]:
+    """取走优先级最高的条目，返回 (原始成员, 条目id, 附加数据)，队列为空时返回None"""
+    member = await self.claim_script(keys=self.keys(platform)[:4], args=[self.visibility_timeout, worker])
+    if not member:
+      return None
+    member = member.decode() if isinstance(member, bytes) else member
+    return (member, *RedisFrontier.decode(member))
+
+  async def extend(self, platform: str, worker: str, member: str) -> bool:
+    keys = self.keys(platform)
+    return bool(await self.extend_script(keys=keys[1:3], args=[self.visibility_timeout, worker, member]))
+
+  async def ack(self, platform: str, worker: str, member: str) -> bool:
+    return bool(await self.release_script(keys=self.keys(platform), args=[worker, member, 0]))
+
+  async def nack(self, platform: str, worker: str, member: str) -> bool:
+    return bool(await self.release_script(keys=self.keys(platform), args=[worker, member, 1]))
+
+  async def reclaim(self, platform: str) -> int:
+    return await self.reclaim_script(keys=self.keys(platform)[:4], args=[self.heartbeat_prefix])
+
+  async def heartbeat(self, worker: str) -> None:
+    await self.redis.client.set(f"{self.heartbeat_prefix}{worker}", 1, px=int(self.heartbeat_ttl * 1000))
+
+  async def size(self, platform: str) -> tuple[int, int]:
+    """(待爬取数, 租出数)"""
+    pending, leases, *_ = self.keys(platform)
+    return await self.redis.client.zcard(pending), await self.redis.client.zcard(leases)
+
+  async def attempt(self, platform: str, member: str) -> int:
+    """记录一次失败，返回累计失败次数"""
+    return await self.redis.client.hincrby(self.keys(platform)[4], member, 1)
+
+  async def fail(self, platform: str, member: str) -> None:
+    await self.redis.client.sadd(f"{self.prefix}:{platform}:failed", member)
+
+
+class ShardedRunner(CrawlerRunner):
+  """
+  分片调度器：与CrawlerRunner接口相同，但前沿队列保存在Redis中，
+  可以在多个进程、多台主机上同时运行，每个条目同一时间只会被一个worker处理。
+  """
+
+  def __init__(self,
+               frontier: RedisFrontier,
+               max_attempts: int = 3,
+               poll_interval: float = 5,
+               name: str = "ShardedRunner") -> None:
+    """
+    Args:
+      frontier(RedisFrontier): 共享前沿队列
+      max_attempts(int): 每个条目的最大尝试次数（所有worker累计）
+      poll_interval(float): 队列为空但仍有条目被租出时的轮询间隔（秒）
+      name(str): logger名称
+    """
+    super().__init__(max_attempts=max_attempts, name=name)
+    self.frontier_store = frontier
+    self.poll_interval = poll_interval
+    self.buffer: dict[str, list[tuple[Hashable, float, Any]]] = {}
+
+  def push(self, platform: str, key: Hashable, priority: float = 0, payload: Any = None) -> None:
+    """条目先缓存在本地，调用seed或run时批量写入Redis"""
+    self.buffer.setdefault(platform, []).append((key, priority, payload))
+
+  def pending(self, platform: Optional[str] = None) -> int:
+    if platform is not None:
+      return len(self.buffer.get(platform, []))
+    return sum(len(items) for items in self.buffer.values())
+
+  async def seed(self) -> int:
+    """将本地缓存的条目写入共享前沿队列"""
+    count = 0
+    for platform, items in self.buffer.items():
+      count += await self.frontier_store.push(platform, items)
+    self.buffer = {}
+    return count
+
+  async def heartbeat(self, worker: str, platform: str, member: str) -> None:
+    """处理期间定时续租，租约已被回收时返回；Redis暂时不可用时在下个周期重试"""
+    while True:
+      await asyncio.sleep(self.frontier_store.visibility_timeout / 3)
+      try:
+        if not await self.frontier_store.extend(platform, worker, member):
+          return
+      except RedisError as e:
+        self.logger.warning(f"[{platform}] 续租失败，稍后重试：{e}")
+
+  async def consume(self, platform: str, handler, worker: str) -> None:
+    """以worker的身份领取并处理共享队列中的条目，直到该平台没有待爬取和租出的条目"""
+    frontier = self.frontier_store
+    while True:
+      await frontier.heartbeat(worker)
+      claimed = await frontier.claim(platform, worker)
+      if claimed is None:
+        await frontier.reclaim(platform)
+        pending, leased = await frontier.size(platform)
+        if pending == 0 and leased == 0:
+          return
+        await asyncio.sleep(self.poll_interval)
+        continue
+      member, key, payload = claimed
+      handling = asyncio.create_task(handler(key, payload))
+      renew = asyncio.create_task(self.heartbeat(worker, platform, member))
+      try:
+        await asyncio.wait([handling, renew], return_when=asyncio.FIRST_COMPLETED)
+      except asyncio.CancelledError:
+        handling.cancel()
+        raise
+      finally:
+        renew.cancel()
+      if not handling.done():
+        # 租约过期已被回收，条目可能正由其他worker处理：中止处理，不再确认或放回
+        self.logger.warning(f"[{platform}] 条目{key} 的租约已丢失，中止处理")
+        handling.cancel()
+        await asyncio.gather(handling, return_exceptions=True)
+        continue
+      try:
+        res, err = handling.result()
+      except asyncio.CancelledError:
+        raise
+      except Exception as e:
+        self.logger.exception(e)
+        res, err = False, Err.FAILED
+      if res:
+        await frontier.ack(platform, worker, member)
+        continue
+      attempts = await frontier.attempt(platform, member)
+      if err == Err.NOT_EXISTS or attempts >= self.max_attempts:
+        self.logger.error(f"[{platform}] 条目{key} 爬取失败（{err}），已尝试{attempts}次，放弃")
+        await frontier.ack(platform, worker, member)
+        await frontier.fail(platform, member)
+        self.failed.append((platform, key))
+      else:
+        self.logger.warning(f"[{platform}] 条目{key} 爬取失败（{err}），放回共享队列（第{attempts}次）")
+        await frontier.nack(platform, worker, member)
+
+  async def keepalive(self, workers: list[str]) -> None:
+    """空闲等待期间也保持心跳，避免其他worker误判本worker已死亡"""
+    while True:
+      await asyncio.gather(*[self.frontier_store.heartbeat(worker) for worker in workers])
+      await asyncio.sleep(self.frontier_store.heartbeat_ttl / 3)
+
+  async def run(self) -> None:
+    """写入本地缓存的条目，然后消费共享前沿队列直到所有平台的条目都完成"""
+    count = await self.seed()
+    if count:
+      self.logger.info(f"写入共享队列{count}个条目")
+    jobs = [
+      (platform, handler, instance_id(f"{self.frontier_store.prefix}-{platform}", index))
+      for platform, handlers in self.handlers.items()
+      for index, handler in enumerate(handlers, 1)
+    ]
+    alive = asyncio.create_task(self.keepalive([worker for _, _, worker in jobs]))
+    try:
+      await asyncio.gather(*[self.consume(platform, handler, worker) for platform, handler, worker in jobs])
+    finally:
+      alive.cancel()
+    self.logger.info(f"本进程调度结束，{len(self.failed)}个条目失败")
@@ -1,26 +1,36 @@
+import time
 import httpx
 import asyncio
 import json
 from typing import Optional
 
-async def async_test(ip: Optional[str] = None, test_url: str = "https://www.baidu.com", timeout: Optional[int] = None) -> bool:
-  headers = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36 Edg/131.0.0.0",
-  }
-  proxies = {
-    "http://": ip,
-    "https://": ip
-  } if ip else None
+HEADERS = {
+  "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36 Edg/131.0.0.0",
+}
+
+async def async_probe(ip: Optional[str] = None, test_url: str = "https://www.baidu.com", timeout: float = 5) -> Optional[float]:
+  """
+  通过代理请求测试地址，响应为code=0的JSON时返回延迟（秒），否则返回None
+  Args:
+    ip(str | None): 代理地址，如 http://127.0.0.1:8080
+    test_url(str): 测试地址
+    timeout(float): 超时（秒）
+  """
   try:
-    async with httpx.AsyncClient(headers=headers, proxies=proxies, verify=False) as client:
+    async with httpx.AsyncClient(headers=HEADERS, proxy=ip, verify=False, timeout=timeout) as client:
+      start = time.perf_counter()
       response = await client.get(test_url)
+      latency = time.perf_counter() - start
       data = json.loads(response.text)
-      return response.status_code == 200 and data["code"] == 0
+      return latency if response.status_code == 200 and data["code"] == 0 else None
   except:
-    return False
+    return None
+
+async def async_test(ip: Optional[str] = None, test_url: str = "https://www.baidu.com", timeout: Optional[int] = None) -> bool:
+  return await async_probe(ip, test_url, timeout or 5) is not None
     
   
 
 if __name__ == "__main__":
   import asyncio
-  print(asyncio.run(async_test("http://47.122.62.83:8443", "http://api.bilibili.com/x/v2/reply/reply?oid=712909579&type=1&root=3762650428&ps=10&pn=1")))
\ No newline at end of file
+  print(asyncio.run(async_test("http://47.122.62.83:8443", "http://api.bilibili.com/x/v2/reply/reply?oid=712909579&type=1&root=3762650428&ps=10&pn=1")))
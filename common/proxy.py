@@ -0,0 +1,239 @@
+import math
+import time
+import asyncio
+from pathlib import Path
+from typing import Optional
+
+from .iptest import async_probe
+from .log import get_logger
+
+
+class ProxyStat:
+  """单个代理的健康状态"""
+
+  def __init__(self, url: str) -> None:
+    self.url = url
+    self.successes = 0
+    self.failures = 0
+    # 延迟的指数移动平均（秒）
+    self.latency: Optional[float] = None
+    self.strikes = 0
+    self.quarantined_until = 0.0
+    self.in_use = 0
+
+  @property
+  def success_rate(self) -> float:
+    # 拉普拉斯平滑，新代理不会因为样本少而得到极端分数
+    return (self.successes + 1) / (self.successes + self.failures + 2)
+
+  @property
+  def score(self) -> float:
+    latency = self.latency if self.latency is not None else 1.0
+    return self.success_rate / max(latency, 0.05) / (1 + self.in_use)
+
+  def observe(self, ok: bool, latency: Optional[float] = None, alpha: float = 0.3) -> None:
+    if ok:
+      self.successes += 1
+    else:
+      self.failures += 1
+    if latency is not None:
+      self.latency = latency if self.latency is None else (1 - alpha) * self.latency + alpha * latency
+
+
+class ProxyPool:
+  """
+  代理池：并发探测代理文件中的代理，按成功率和延迟打分，按分数分配给爬虫工作协程。
+  被风控的代理进入隔离期（每次被封时间加倍），隔离期满后须经reprobe重新探测才恢复分配，
+  多次被封或成功率过低的代理被淘汰；每个代理同时分配给的协程数有上限，请求速率则由会话池按 (主机, Cookie + 代理) 限速。
+  没有可分配的代理时acquire等待其他协程归还或隔离期满，只有全部代理都被淘汰后才返回None（直连）。
+  """
+
+  def __init__(self,
+               test_url: str,
+               timeout: float = 5,
+               concurrency: int = 50,
+               max_in_use: int = 1,
+               quarantine: float = 300,
+               max_strikes: int = 3,
+               min_success_rate: float = 0.3,
+               name: str = "ProxyPool") -> None:
+    """
+    Args:
+      test_url(str): 探测地址，需返回code=0的JSON
+      timeout(float): 探测超时（秒）
+      concurrency(int): 同时探测的代理数
+      max_in_use(int): 每个代理同时分配给的协程数上限
+      quarantine(float): 首次被封后的隔离时间（秒）
+      max_strikes(int): 被封多少次后淘汰
+      min_success_rate(float): 成功率低于该值（且样本足够）时淘汰
+      name(str): logger名称
+    """
+    self.test_url = test_url
+    self.timeout = timeout
+    self.concurrency = concurrency
+    self.max_in_use = max_in_use
+    self.quarantine = quarantine
+    self.max_strikes = max_strikes
+    self.min_success_rate = min_success_rate
+    self.logger = get_logger(name)
+    self.proxies: dict[str, ProxyStat] = {}
+    self.evicted: set[str] = set()
+    # 代理被归还、恢复或淘汰时置位，唤醒等待分配的协程
+    self.changed = asyncio.Event()
+
+  @staticmethod
+  def read(path: Path | str) -> list[str]:
+    """读取代理文件，每行一个代理，忽略空行和#开头的注释"""
+    with open(path, "r", encoding="utf-8") as f:
+      lines = [line.strip() for line in f]
+    return [line for line in lines if line and not line.startswith("#")]
+
+  async def probe(self, urls: list[str]) -> int:
+    """并发探测代理，可用的加入代理池，返回可用数量"""
+    semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def probe_one(url: str) -> bool:
+      async with semaphore:
+        latency = await async_probe(url, self.test_url, self.timeout)
+      stat = self.proxies.get(url) or ProxyStat(url)
+      stat.observe(latency is not None, latency)
+      if latency is None:
+        self.logger.warning(f"测试代理可用性：{url} - failed")
+        return False
+      self.logger.info(f"测试代理可用性：{url} - ok，延迟{latency * 1000:.0f}ms")
+      self.proxies[url] = stat
+      return True
+
+    results = await asyncio.gather(*[probe_one(url) for url in urls if url not in self.evicted])
+    return sum(results)
+
+  async def load(self, path: Path | str) -> int:
+    """探测代理文件中的所有代理"""
+    return await self.probe(ProxyPool.read(path))
+
+  def available(self) -> list[ProxyStat]:
+    return [
+      stat for stat in self.proxies.values()
+      if stat.quarantined_until == 0.0 and stat.in_use < self.max_in_use
+    ]
+
+  def try_acquire(self) -> Optional[str]:
+    """分配当前分数最高的可用代理，没有可用代理时不等待，返回None"""
+    candidates = self.available()
+    if not candidates:
+      return None
+    stat = max(candidates, key=lambda stat: stat.score)
+    stat.in_use += 1
+    return stat.url
+
+  async def acquire(self) -> Optional[str]:
+    """
+    分配当前分数最高的可用代理。所有代理都在使用或隔离中时等待其他协程归还，
+    或等到最早的隔离期满、重新探测后恢复；代理全部被淘汰时返回None
+    """
+    while self.proxies:
+      await self.reprobe()
+      url = self.try_acquire()
+      if url:
+        return url
+      self.changed.clear()
+      quarantined = [stat.quarantined_until for stat in self.proxies.values() if 0 < stat.quarantined_until < math.inf]
+      timeout = max(0.0, min(quarantined) - time.monotonic()) if quarantined else None
+      try:
+        await asyncio.wait_for(self.changed.wait(), timeout)
+      except asyncio.TimeoutError:
+        pass
+    return None
+
+  def release(self, url: Optional[str], ok: bool, latency: Optional[float] = None, banned: bool = False) -> None:
+    """
+    归还代理并报告使用结果
+    Args:
+      url(str | None): 代理地址，为None时忽略
+      ok(bool): 是否成功
+      latency(float | None): 本次延迟（秒）
+      banned(bool): 是否被风控
+    """
+    stat = self.proxies.get(url) if url else None
+    if stat is None:
+      return
+    stat.in_use = max(0, stat.in_use - 1)
+    stat.observe(ok, latency)
+    self.changed.set()
+    if banned:
+      if not self.strike(stat, "被风控"):
+        return
+    elif ok:
+      stat.strikes = 0
+    if stat.successes + stat.failures >= 10 and stat.success_rate < self.min_success_rate:
+      self.evict(url, f"成功率{stat.success_rate:.0%}")
+
+  def strike(self, stat: ProxyStat, reason: str) -> bool:
+    """记一次被封：隔离该代理，隔离时间每次加倍，达到上限时淘汰。返回代理是否仍在池中"""
+    stat.strikes += 1
+    if stat.strikes >= self.max_strikes:
+      self.evict(stat.url, f"{reason}，累计{stat.strikes}次")
+      return False
+    seconds = self.quarantine * 2 ** (stat.strikes - 1)
+    stat.quarantined_until = time.monotonic() + seconds
+    self.logger.warning(f"代理{stat.url}{reason}，隔离{seconds:.0f}秒")
+    return True
+
+  def evict(self, url: str, reason: str) -> None:
+    self.proxies.pop(url, None)
+    self.evicted.add(url)
+    self.logger.warning(f"淘汰代理{url}：{reason}")
+    if not self.proxies:
+      self.logger.warning("代理已全部被淘汰，之后的请求直连")
+    self.changed.set()
+
+  async def reprobe(self) -> int:
+    """重新探测隔离期已过的代理：可用的恢复分配，不可用的再记一次被封。返回恢复的数量"""
+    now = time.monotonic()
+    due = [stat for stat in self.proxies.values() if 0 < stat.quarantined_until <= now]
+    if not due:
+      return 0
+    for stat in due:
+      # 探测期间不分配，也不会被其他协程重复探测
+      stat.quarantined_until = math.inf
+    semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def probe_one(stat: ProxyStat) -> bool:
+      async with semaphore:
+        latency = await async_probe(stat.url, self.test_url, self.timeout)
+      stat.observe(latency is not None, latency)
+      # 探测结束后隔离期改变，等待中的协程重新计算等待时间
+      self.changed.set()
+      if latency is None:
+        self.strike(stat, "重新探测失败")
+        return False
+      stat.quarantined_until = 0.0
+      self.logger.info(f"代理{stat.url}恢复可用，延迟{latency * 1000:.0f}ms")
+      return True
+
+    results = await asyncio.gather(*[probe_one(stat) for stat in due])
+    return sum(results)
+
+  def __len__(self) -> int:
+    return len(self.proxies)
+
+
+if __name__ == "__main__":
+  import sys
+  sys.path.append(str(Path(__file__).parent.parent))
+  from benchmarks.stub import StubServer
+
+  # 本地桩服务器可以充当HTTP代理：代理请求的绝对路径同样会得到code=0的响应
+  async def main(stubs: list[StubServer]):
+    pool = ProxyPool("http://api.bilibili.com/x/v2/reply/reply?oid=1&type=1&root=1", timeout=1)
+    count = await pool.probe([stub.url for stub in stubs] + ["http://127.0.0.1:1"])
+    print(f"可用代理：{count}")
+    url = await pool.acquire()
+    print(f"分配：{url}")
+    pool.release(url, ok=False, banned=True)
+    print(f"被风控后分配：{pool.try_acquire()}")
+    pool.proxies[url].quarantined_until = time.monotonic()
+    print(f"隔离期满，重新探测恢复：{await pool.reprobe()}")
+
+  with StubServer() as a, StubServer() as b:
+    asyncio.run(main([a, b]))
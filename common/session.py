@@ -0,0 +1,151 @@
+import json
+import time
+import asyncio
+import importlib.util
+from hashlib import md5
+from typing import Optional
+from httpx import AsyncClient, Limits, Timeout, Request, Response
+
+from .log import get_logger
+from .crawler import RateLimiter
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class HttpSession:
+  """
+  长连接HTTP会话池。
+  按请求头 + 代理复用httpx.AsyncClient，同一客户端对同一主机的请求共享keep-alive连接池，
+  避免每个视频/文章都重新进行TCP+TLS握手。由爬虫持有，也可以在多个爬虫之间共享。
+  设置限速器后，通过会话池发出的每个请求都会先按 (主机, 身份) 获取令牌，并根据响应调整速率。
+  会话池还按身份记录响应延迟（发出请求到收到响应头），供代理池评分。
+  """
+
+  def __init__(self,
+               max_connections: int = 20,
+               max_keepalive_connections: int = 10,
+               keepalive_expiry: float = 30.0,
+               http2: bool = False,
+               timeout: float = 10.0,
+               verify: bool = False,
+               follow_redirects: bool = True,
+               limiter: Optional[RateLimiter] = None,
+               name: str = "Session") -> None:
+    """
+    Args:
+      max_connections(int): 每个身份的最大连接数
+      max_keepalive_connections(int): 每个身份保持的最大空闲连接数
+      keepalive_expiry(float): 空闲连接保持时间（秒）
+      http2(bool): 是否启用HTTP/2多路复用，需要安装h2，未安装时自动回退到HTTP/1.1
+      timeout(float): 默认请求超时（秒）
+      verify(bool): 是否校验证书
+      follow_redirects(bool): 是否跟随重定向
+      limiter(RateLimiter | None): 限速器，为空时不限速
+      name(str): logger名称
+    """
+    self.logger = get_logger(name)
+    if http2 and not HTTP2_AVAILABLE:
+      self.logger.warning("未安装h2，无法启用HTTP/2，回退到HTTP/1.1")
+      http2 = False
+    self.http2 = http2
+    self.limits = Limits(
+      max_connections=max_connections,
+      max_keepalive_connections=max_keepalive_connections,
+      keepalive_expiry=keepalive_expiry,
+    )
+    self.timeout = Timeout(timeout)
+    self.verify = verify
+    self.follow_redirects = follow_redirects
+    self.limiter = limiter
+    self.clients: dict[str, AsyncClient] = {}
+    self.identities: dict[AsyncClient, str] = {}
+    # 身份 -> [上次取出以来的响应延迟之和（秒）, 响应数]
+    self.latencies: dict[str, list[float]] = {}
+    self.closed = False
+
+  @staticmethod
+  def identity(headers: Optional[dict] = None, proxy: Optional[str] = None) -> str:
+    """由Cookie和代理计算身份键，用于限速和风控熔断"""
+    cookie = next((v for k, v in (headers or {}).items() if k.lower() == "cookie"), "")
+    return md5(json.dumps([cookie, proxy]).encode()).hexdigest()
+
+  @staticmethod
+  def key(headers: Optional[dict] = None, proxy: Optional[str] = None) -> str:
+    """由完整请求头和代理计算客户端缓存键"""
+    raw = json.dumps([headers or {}, proxy], sort_keys=True, ensure_ascii=False)
+    return md5(raw.encode()).hexdigest()
+
+  def hooks(self, identity: str) -> dict:
+    """限速与记录延迟用的httpx事件钩子"""
+    limiter = self.limiter
+    latencies = self.latencies
+
+    async def on_request(request: Request) -> None:
+      if limiter is not None:
+        await limiter.acquire(request.url.host, identity)
+      # 在获取令牌之后计时，排队等待的时间不计入延迟
+      request.extensions["started"] = time.monotonic()
+
+    async def on_response(response: Response) -> None:
+      started = response.request.extensions.get("started")
+      if started is not None:
+        total = latencies.setdefault(identity, [0.0, 0])
+        total[0] += time.monotonic() - started
+        total[1] += 1
+      if limiter is not None:
+        # 风控页面通常是非JSON的HTML
+        ok = response.status_code < 400 and "json" in response.headers.get("content-type", "")
+        limiter.report(response.request.url.host, identity, ok)
+
+    return {"request": [on_request], "response": [on_response]}
+
+  def client(self, headers: Optional[dict] = None, proxy: Optional[str] = None) -> AsyncClient:
+    """
+    获取指定身份的长连接客户端，不存在则创建
+    Args:
+      headers(dict | None): 请求头（含Cookie）
+      proxy(str | None): 代理地址，如 http://127.0.0.1:8080
+    """
+    if self.closed:
+      raise RuntimeError("会话池已关闭")
+    key = HttpSession.key(headers, proxy)
+    client = self.clients.get(key)
+    if client is None or client.is_closed:
+      identity = HttpSession.identity(headers, proxy)
+      client = AsyncClient(
+        headers=headers,
+        proxy=proxy,
+        verify=self.verify,
+        http2=self.http2,
+        limits=self.limits,
+        timeout=self.timeout,
+        follow_redirects=self.follow_redirects,
+        event_hooks=self.hooks(identity),
+      )
+      self.clients[key] = client
+      self.identities[client] = identity
+    return client
+
+  def identity_of(self, client: AsyncClient) -> str:
+    """获取客户端对应的身份键，非本会话池创建的客户端返回default"""
+    return self.identities.get(client, "default")
+
+  def take_latency(self, identity: str) -> Optional[float]:
+    """取出该身份自上次取出以来的平均响应延迟（秒），期间没有响应时返回None"""
+    total = self.latencies.pop(identity, None)
+    if not total or not total[1]:
+      return None
+    return total[0] / total[1]
+
+  async def close(self) -> None:
+    """关闭所有客户端，释放连接"""
+    self.closed = True
+    clients, self.clients = list(self.clients.values()), {}
+    self.identities = {}
+    await asyncio.gather(*[client.aclose() for client in clients], return_exceptions=True)
+
+  async def __aenter__(self) -> "HttpSession":
+    return self
+
+  async def __aexit__(self, *_) -> None:
+    await self.close()
@@ -0,0 +1,107 @@
+"""
+免分词的快速情绪打分：以停用词、程度副词、否定词和情绪词构建字典树，直接在清洗后的评论上
+从左到右做最长匹配，匹配到的词按与get_emotion相同的规则计分。
+结果与jieba分词后打分不完全一致（见benchmarks/bench_automaton.py），适合对时效要求高的场景
+"""
+import pickle
+import logging
+from pathlib import Path
+from typing import Optional
+from preprocessing.lexicon import ROOT, Lexicon
+from preprocessing.cache import words_version
+
+AUTOMATON_PATH = Path(__file__).parent.parent.joinpath("cache").joinpath("automaton.pickle")
+
+
+class Automaton:
+  """字典树，状态0为根"""
+
+  def __init__(self, lexicon: Lexicon, version: str = "") -> None:
+    """
+    Args:
+      lexicon(Lexicon): 词典
+      version(str): 词典版本号，用于判断序列化的字典树是否过期
+    """
+    self.version = version
+    # 状态 -> {字符: 下一状态}
+    self.children: list[dict[str, int]] = [{}]
+    # 状态 -> 以该状态结尾的词的得分，不是词尾时为None
+    self.values: list[Optional[int]] = [None]
+    # 先插入的优先：停用词在jieba分词后被去除，不计分；其余按get_emotion中判断的先后
+    for words, value in ((lexicon.stopwords, 0), (lexicon.advs, 0), (lexicon.nots, 0), (lexicon.bads, -1), (lexicon.goods, 1)):
+      for word in sorted(words):
+        if word and not any(c.isspace() for c in word):
+          self.insert(word, value)
+
+  def insert(self, word: str, value: int) -> None:
+    state = 0
+    for c in word:
+      child = self.children[state].get(c)
+      if child is None:
+        child = len(self.children)
+        self.children[state][c] = child
+        self.children.append({})
+        self.values.append(None)
+      state = child
+    if self.values[state] is None:
+      self.values[state] = value
+
+  def score(self, content: str) -> int:
+    """最长匹配：从每个位置找以它开头的最长的词，匹配到则跳到词尾，否则前进一个字"""
+    children = self.children
+    values = self.values
+    emo = 0
+    i = 0
+    n = len(content)
+    while i < n:
+      state = children[0].get(content[i])
+      if state is None:
+        i += 1
+        continue
+      j = i + 1
+      end = j if values[state] is not None else 0
+      value = values[state]
+      while j < n:
+        state = children[state].get(content[j])
+        if state is None:
+          break
+        j += 1
+        if values[state] is not None:
+          end = j
+          value = values[state]
+      if end:
+        emo += value
+        i = end
+      else:
+        i += 1
+    return emo
+
+  def __call__(self, contents: list[str]) -> list[int]:
+    """按顺序返回每条评论的情绪得分"""
+    return [self.score(content) for content in contents]
+
+  def save(self, path: Path = AUTOMATON_PATH) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+      pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+  @classmethod
+  def load(cls, root: Path = ROOT, path: Path = AUTOMATON_PATH, logger: logging.Logger | None = None) -> "Automaton":
+    """
+    读取序列化的字典树，不存在或词表已变化时重新构建并保存。未变化时不需要读取、解析词表
+    Args:
+      root(Path): 词表所在目录
+      path(Path): 序列化文件路径
+      logger(Logger | None): 日志
+    """
+    version = words_version(root)
+    if path.exists():
+      with open(path, "rb") as f:
+        automaton = pickle.load(f)
+      if automaton.version == version:
+        return automaton
+    if logger:
+      logger.info("构建字典树")
+    automaton = cls(Lexicon(root), version)
+    automaton.save(path)
+    return automaton
@@ -0,0 +1,110 @@
+"""
+跨运行的分词与打分缓存：以清洗后内容的哈希为键，保存分词结果（int32词id数组）与情绪得分，存储在本地SQLite文件中。
+词表或jieba词典变化后版本号改变，旧缓存整体失效；条目超过上限时淘汰最久未使用的条目
+"""
+import sqlite3
+from hashlib import blake2b
+from pathlib import Path
+from typing import Iterable, Optional
+import jieba
+import numpy as np
+from preprocessing.lexicon import Lexicon
+
+CACHE_PATH = Path(__file__).parent.parent.joinpath("cache").joinpath("preprocessing.sqlite3")
+# 单条SQL的最大参数数
+CHUNK = 500
+# 表结构版本，记录在user_version中，不一致时重建
+SCHEMA = 2
+
+
+def content_key(content: str) -> bytes:
+  return blake2b(content.encode(), digest_size=16).digest()
+
+
+def words_version(root: Path) -> str:
+  """目录下全部词表文件决定的版本号"""
+  digest = blake2b(digest_size=16)
+  for path in sorted(root.glob("*.txt")):
+    digest.update(path.name.encode())
+    digest.update(path.read_bytes())
+  return digest.hexdigest()
+
+
+def lexicon_version(lexicon: Lexicon) -> str:
+  """词表文件、jieba版本与jieba词典共同决定的版本号"""
+  digest = blake2b(words_version(lexicon.root).encode(), digest_size=16)
+  digest.update(jieba.__version__.encode())
+  with jieba.get_dict_file() as f:
+    digest.update(f.read())
+  return digest.hexdigest()
+
+
+class SegmentCache:
+  """内容哈希 -> (词id数组, 情绪得分)"""
+
+  def __init__(self, version: str, path: Path = CACHE_PATH, max_entries: int = 5000000) -> None:
+    """
+    Args:
+      version(str): 词典版本号，与缓存中记录的不一致时清空缓存
+      path(Path): SQLite文件路径
+      max_entries(int): 最大条目数，关闭时淘汰超出的最久未使用的条目
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    self.db = sqlite3.connect(path)
+    self.max_entries = max_entries
+    self.hits = 0
+    self.misses = 0
+    self.db.execute("PRAGMA journal_mode=WAL")
+    self.db.execute("PRAGMA synchronous=NORMAL")
+    if self.db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA:
+      self.db.execute("DROP TABLE IF EXISTS entries")
+      self.db.execute(f"PRAGMA user_version = {SCHEMA}")
+    self.db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+    self.db.execute("CREATE TABLE IF NOT EXISTS entries (key BLOB PRIMARY KEY, ids BLOB, emotion REAL, used INTEGER)")
+    self.db.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+    meta = dict(self.db.execute("SELECT name, value FROM meta").fetchall())
+    if meta.get("version") != version:
+      self.db.execute("DELETE FROM entries")
+    # 每次运行的序号，作为条目最近使用的时间
+    self.generation = int(meta.get("generation", 0)) + 1
+    self.db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", [("version", version), ("generation", str(self.generation))])
+    self.db.commit()
+
+  def __len__(self) -> int:
+    return self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+  def get_many(self, contents: list[str]) -> list[Optional[tuple[np.ndarray, float]]]:
+    """按顺序返回每条内容缓存的 (词id数组, 情绪得分)，未命中为None"""
+    keys = [content_key(content) for content in contents]
+    found: dict[bytes, tuple[np.ndarray, float]] = {}
+    for i in range(0, len(keys), CHUNK):
+      chunk = keys[i:i + CHUNK]
+      marks = ",".join("?" * len(chunk))
+      for key, ids, emotion in self.db.execute(f"SELECT key, ids, emotion FROM entries WHERE key IN ({marks})", chunk):
+        found[key] = (np.frombuffer(ids, dtype=np.int32), emotion)
+      self.db.execute(f"UPDATE entries SET used = ? WHERE used < ? AND key IN ({marks})", [self.generation, self.generation, *chunk])
+    self.db.commit()
+    self.hits += len(found)
+    self.misses += len(keys) - len(found)
+    return [found.get(key) for key in keys]
+
+  def put_many(self, items: Iterable[tuple[str, np.ndarray, float]]) -> None:
+    """写入 (内容, 词id数组, 情绪得分)"""
+    self.db.executemany(
+      "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+      [(content_key(content), ids.astype(np.int32).tobytes(), emotion, self.generation) for content, ids, emotion in items]
+    )
+    self.db.commit()
+
+  def evict(self) -> int:
+    """淘汰超出上限的最久未使用的条目，返回淘汰的数量"""
+    excess = len(self) - self.max_entries
+    if excess <= 0:
+      return 0
+    self.db.execute("DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY used LIMIT ?)", (excess,))
+    self.db.commit()
+    return excess
+
+  def close(self) -> None:
+    self.evict()
+    self.db.close()
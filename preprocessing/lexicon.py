@@ -0,0 +1,54 @@
+"""
+分词与情绪打分使用的词典，以及与preprocessing.ipynb一致的分词、打分规则
+"""
+from pathlib import Path
+from jieba import cut
+
+ROOT = Path(__file__).parent
+
+
+def load_words(path: Path) -> frozenset[str]:
+  """读取词表，每行一个词"""
+  with open(path, "r", encoding="utf-8") as f:
+    return frozenset(l.strip() for l in f)
+
+
+class Lexicon:
+  """停用词、程度副词、否定词、负面与正面情绪词"""
+
+  def __init__(self, root: Path = ROOT) -> None:
+    """
+    Args:
+      root(Path): 词表所在目录
+    """
+    self.root = root
+    self.stopwords = load_words(root.joinpath("stopwords.txt"))
+    self.advs = load_words(root.joinpath("程度副词.txt"))
+    self.nots = load_words(root.joinpath("否定词.txt"))
+    self.bads = load_words(root.joinpath("负面情绪词.txt"))
+    self.goods = load_words(root.joinpath("正面情绪词.txt"))
+
+  def cut_content(self, content: str) -> str:
+    """jieba分词并去除停用词，以空格连接"""
+    return " ".join(word for word in cut(content) if word not in self.stopwords)
+
+  def get_emotion(self, sentence: str) -> float:
+    """
+    情绪得分：正面情绪词+1，负面情绪词-1。
+    w在每个词开始时重置，程度副词与否定词只作用于自身、不影响后面的词，保持与原规则一致
+    """
+    words = sentence.split()
+    emo = 0
+    for word in words:
+      w = 1
+      if word in self.advs:
+        w *= 1.2
+      elif word in self.nots:
+        w *= -1
+      elif word in self.bads:
+        emo += w * -1
+        w = 0
+      elif word in self.goods:
+        emo += w
+        w = 0
+    return emo
@@ -0,0 +1,306 @@
+"""
+流式预处理流水线，取代preprocessing.ipynb中一次性读入全部评论的流程：
+  读取（按批、只取需要的字段）-> 清洗、去重 -> 分词 -> 情绪打分 -> 加权 -> 按(游戏, 月份)聚合
+每批评论处理完即丢弃，不再一次性读入全部评论；但去重需要记住已出现过的内容，
+内存占用仍随不重复评论数增长：每条内容的指纹（8字节哈希）保存在Python的set中，连同整数对象约占60~100字节，
+千万条不重复评论约需0.7~1GB。另外随数据增长的只有聚合结果
+运行：python -m preprocessing.pipeline [-batch 每批条数] [-workers 分词进程数] [-no-cache] [-fast] [-dry-run]
+  -workers 大于1时以多进程并行分词
+  -no-cache 不使用cache目录下的分词与打分缓存，默认只对缓存中没有的评论分词、打分
+  -fast 不分词，以字典树最长匹配直接打分，速度快但与分词后打分的结果有差异
+  -dry-run 只输出结果，不写入MongoDB
+"""
+import re
+import sys
+import time
+import logging
+from hashlib import blake2b
+from datetime import datetime
+from itertools import chain
+from pathlib import Path
+from typing import Iterator, NamedTuple, Optional
+import numpy as np
+from pymongo import MongoClient, UpdateOne
+from pymongo.database import Database
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from common.log import get_logger
+from common.db.schema import DATABASE
+from preprocessing.lexicon import Lexicon
+from preprocessing.segment import ParallelSegmenter
+from preprocessing.cache import SegmentCache, lexicon_version
+from preprocessing.scorer import VectorScorer
+from preprocessing.automaton import Automaton
+
+# 对应0-6级
+LEVEL_WEIGHTS = (0, 0.6, 0.6, 0.8, 0.9, 1.0, 1.1)
+BILIBILI_GAME_MAP = {"网易第五人格手游": "第五人格", "光遇手游": "光遇", "Phigros官方": "Phigros", "韵律源点Arcaea": "Arcaea"}
+WEIBO_GAME_MAP = {"明日方舟Arknights": "明日方舟", "网易第五人格": "第五人格", "光遇手游": "光遇"}
+BILIBILI_FIELDS = ("aid", "level", "time", "content", "like", "is_root")
+WEIBO_FIELDS = ("blogid", "time", "content", "likes")
+# 结果集合 -> 参与聚合的来源
+RESULTS = {
+  "BilibiliResult": ("Bilibili",),
+  "WeiboResult": ("Weibo",),
+  "Result": ("Bilibili", "Weibo"),
+}
+
+REPLY_PREFIX = re.compile(r"回复 @.*? :")
+EMOTE = re.compile(r"\[.*?\]")
+MENTION = re.compile(r"@.*?\s+")
+NON_CHINESE = re.compile(r"[^\u4e00-\u9fa5]+")
+
+
+def clean(content: str) -> Optional[str]:
+  """去除回复前缀、表情、@某人和非中文字符，清洗后为空时返回None"""
+  content = REPLY_PREFIX.sub("", content)
+  content = EMOTE.sub("", content)
+  content = MENTION.sub("", content)
+  content = NON_CHINESE.sub("", content)
+  content = content.strip()
+  return None if len(content) == 0 else content
+
+
+def weight_map(w: float) -> float:
+  if w < 50:
+    return 1
+  elif w < 200:
+    return 1.2
+  elif w < 500:
+    return 1.4
+  elif w < 1000:
+    return 1.6
+  return 1
+
+
+def to_timestamp(x: str) -> int:
+  """将微博的created_at转换为时间戳"""
+  return int(datetime.strptime(x, "%a %b %d %H:%M:%S %z %Y").timestamp())
+
+
+def to_month(x: int) -> int:
+  """时间戳所在月份第一天0点（本地时间）的时间戳"""
+  dt = datetime.fromtimestamp(x)
+  return int(datetime(dt.year, dt.month, 1).timestamp())
+
+
+def fingerprint(content: str) -> int:
+  """去重用的内容指纹"""
+  return int.from_bytes(blake2b(content.encode(), digest_size=8).digest(), "little")
+
+
+class Row(NamedTuple):
+  """清洗后的一条评论"""
+  source: str
+  game: str
+  time: int
+  weight: float
+  content: str
+
+
+class Aggregator:
+  """按(来源, 游戏, 月份)累加 情绪×权重 之和与评论数"""
+
+  def __init__(self) -> None:
+    self.groups: dict[tuple[str, str, int], list] = {}
+
+  def add(self, rows: list[Row], emotions: list[float]) -> None:
+    for row, emotion in zip(rows, emotions):
+      group = self.groups.setdefault((row.source, row.game, row.time), [0.0, 0])
+      group[0] += emotion * row.weight
+      group[1] += 1
+
+  def results(self) -> dict[str, list[dict]]:
+    """结果集合 -> [{"game", "time", "emotion"}]，emotion为 sum(情绪×权重) / 评论数"""
+    results = {}
+    for name, sources in RESULTS.items():
+      merged: dict[tuple[str, int], list] = {}
+      for (source, game, month), (total, count) in self.groups.items():
+        if source in sources:
+          group = merged.setdefault((game, month), [0.0, 0])
+          group[0] += total
+          group[1] += count
+      results[name] = [
+        {"game": game, "time": month, "emotion": total / count}
+        for (game, month), (total, count) in sorted(merged.items())
+      ]
+    return results
+
+
+class Pipeline:
+  """
+  流式预处理流水线。
+  读取阶段逐批产出清洗后的评论，分词、打分阶段以整批为单位处理，便于替换为并行或向量化的实现
+  """
+
+  def __init__(self,
+               db: Database,
+               lexicon: Optional[Lexicon] = None,
+               batch_size: int = 5000,
+               workers: int = 1,
+               cache: Optional[SegmentCache] = None,
+               automaton: Optional[Automaton] = None,
+               logger: logging.Logger | None = None) -> None:
+    """
+    Args:
+      db(Database): MobileGameComments数据库（同步客户端）
+      lexicon(Lexicon | None): 词典，为空时读取preprocessing目录下的词表
+      batch_size(int): 每批处理的评论数，也是从MongoDB读取的批大小
+      workers(int): 分词进程数，大于1时每批评论分块并行分词，结果顺序不变
+      cache(SegmentCache | None): 分词与打分缓存，命中的评论跳过分词与打分
+      automaton(Automaton | None): 不为空时不分词，以字典树直接打分，此时不使用分词进程与缓存
+      logger(Logger | None): 日志
+    """
+    self.db = db
+    self.lexicon = lexicon or Lexicon()
+    self.scorer = VectorScorer(self.lexicon)
+    self.batch_size = batch_size
+    self.workers = workers
+    self.cache = cache
+    self.automaton = automaton
+    self.logger = logger
+    self.skipped = 0
+    self.segmenter: Optional[ParallelSegmenter] = None
+
+  def read(self, name: str, fields: tuple[str, ...]) -> Iterator[dict]:
+    """按批读取集合中字段齐全的评论，只取需要的字段"""
+    cursor = self.db[name].find({}, {"_id": 0, **{field: 1 for field in fields}}, batch_size=self.batch_size)
+    for document in cursor:
+      if all(document.get(field) is not None for field in fields):
+        yield document
+
+  def authors(self, name: str) -> dict[int, str]:
+    """视频/文章id -> 作者"""
+    return {document["_id"]: document["author"] for document in self.db[name].find({}, {"author": 1})}
+
+  def bilibili_rows(self) -> Iterator[Row]:
+    authors = self.authors("BilibiliVideos")
+    seen: set[int] = set()
+    for document in self.read("BilibiliComments", BILIBILI_FIELDS):
+      content = clean(document["content"])
+      if content is None:
+        continue
+      if document["aid"] not in authors:
+        self.skipped += 1
+        continue
+      key = fingerprint(content)
+      if key in seen:
+        continue
+      seen.add(key)
+      author = authors[document["aid"]]
+      weight = weight_map(document["like"] * LEVEL_WEIGHTS[document["level"]]) * (1 if document["is_root"] else 0.5)
+      yield Row("Bilibili", BILIBILI_GAME_MAP.get(author, author), to_month(document["time"]), weight, content)
+
+  def weibo_rows(self) -> Iterator[Row]:
+    authors = self.authors("WeiboArticles")
+    seen: set[int] = set()
+    for document in self.read("WeiboComments", WEIBO_FIELDS):
+      content = clean(document["content"])
+      if content is None:
+        continue
+      if document["blogid"] not in authors:
+        self.skipped += 1
+        continue
+      key = fingerprint(content)
+      if key in seen:
+        continue
+      seen.add(key)
+      author = authors[document["blogid"]]
+      yield Row("Weibo", WEIBO_GAME_MAP.get(author, author), to_month(to_timestamp(document["time"])), weight_map(document["likes"]), content)
+
+  def batches(self) -> Iterator[list[Row]]:
+    batch = []
+    for row in chain(self.bilibili_rows(), self.weibo_rows()):
+      batch.append(row)
+      if len(batch) >= self.batch_size:
+        yield batch
+        batch = []
+    if batch:
+      yield batch
+
+  def segment(self, contents: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """分词阶段：所有评论的词id首尾相接的int32数组，以及每条评论的词数"""
+    if self.segmenter is not None:
+      return self.segmenter.encode(contents)
+    return self.scorer.cut(contents)
+
+  def score(self, ids: np.ndarray, lengths: np.ndarray) -> list[float]:
+    """打分阶段：每条评论的情绪得分，与逐条调用Lexicon.get_emotion的结果一致"""
+    return self.scorer.score_ids(ids, lengths).tolist()
+
+  def analyze(self, contents: list[str]) -> list[float]:
+    """分词并打分，有缓存时只处理缓存中没有的评论"""
+    if self.automaton is not None:
+      return self.automaton(contents)
+    if self.cache is None:
+      return self.score(*self.segment(contents))
+    cached = self.cache.get_many(contents)
+    missing = [content for content, hit in zip(contents, cached) if hit is None]
+    computed = iter([])
+    if missing:
+      ids, lengths = self.segment(missing)
+      emotions = self.score(ids, lengths)
+      self.cache.put_many(zip(missing, np.split(ids, np.cumsum(lengths)[:-1]), emotions))
+      computed = iter(emotions)
+    return [next(computed) if hit is None else hit[1] for hit in cached]
+
+  def run(self) -> dict[str, list[dict]]:
+    """运行流水线，返回每个结果集合的聚合结果"""
+    aggregator = Aggregator()
+    count = 0
+    start = time.perf_counter()
+    if self.workers > 1 and self.automaton is None:
+      self.segmenter = ParallelSegmenter(self.workers, root=self.lexicon.root)
+    try:
+      for batch in self.batches():
+        aggregator.add(batch, self.analyze([row.content for row in batch]))
+        count += len(batch)
+        if self.logger:
+          self.logger.info(f"已处理{count}条评论（{count / (time.perf_counter() - start):.0f}条/s）")
+    finally:
+      if self.segmenter is not None:
+        self.segmenter.close()
+        self.segmenter = None
+    if self.logger and self.cache is not None and self.automaton is None:
+      self.logger.info(f"缓存命中{self.cache.hits}条，未命中{self.cache.misses}条")
+    if self.logger and self.skipped:
+      self.logger.warning(f"{self.skipped}条评论找不到所属的视频/文章，已跳过")
+    return aggregator.results()
+
+
+def write_results(db: Database, results: dict[str, list[dict]]) -> None:
+  """按(游戏, 月份)写入结果，重复运行会覆盖上次的结果"""
+  for name, documents in results.items():
+    if documents:
+      db[name].bulk_write([
+        UpdateOne({"game": document["game"], "time": document["time"]}, {"$set": document}, upsert=True)
+        for document in documents
+      ], ordered=False)
+
+
+def main() -> None:
+  logger = get_logger("Preprocessing")
+  batch_size = int(sys.argv[sys.argv.index("-batch") + 1]) if "-batch" in sys.argv else 5000
+  workers = int(sys.argv[sys.argv.index("-workers") + 1]) if "-workers" in sys.argv else 1
+  db = MongoClient("mongodb://localhost:27017/")[DATABASE]
+  lexicon = Lexicon()
+  automaton = Automaton.load(lexicon.root, logger=logger) if "-fast" in sys.argv else None
+  cache = None if "-no-cache" in sys.argv or automaton is not None else SegmentCache(lexicon_version(lexicon))
+  try:
+    results = Pipeline(db, lexicon, batch_size=batch_size, workers=workers, cache=cache, automaton=automaton, logger=logger).run()
+  finally:
+    if cache is not None:
+      cache.close()
+  if "-dry-run" in sys.argv:
+    for name, documents in results.items():
+      print(f"[{name}]")
+      for document in documents:
+        print(f"  {document['game']} {datetime.fromtimestamp(document['time']):%Y-%m} {document['emotion']:.4f}")
+    return
+  write_results(db, results)
+  logger.info("结果写入完毕：" + "，".join(f"{name} {len(documents)}条" for name, documents in results.items()))
+
+
+if __name__ == "__main__":
+  main()
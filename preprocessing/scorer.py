@@ -0,0 +1,99 @@
+"""
+向量化的情绪打分：把程度副词、否定词与情绪词编入同一个词汇表，分词时直接把结果编码为int32的词id数组，
+以NumPy按批计算得分，结果与Lexicon.get_emotion完全一致
+"""
+from itertools import chain, repeat
+import numpy as np
+from jieba import cut
+from preprocessing.lexicon import Lexicon
+
+# 词的类别，同一个词出现在多个词表中时按get_emotion中判断的先后取第一个
+OTHER = 0
+ADV = 1
+NOT = 2
+BAD = 3
+GOOD = 4
+
+
+def regular(text: str, count: int) -> bool:
+  """
+  以换行连接的count条分词结果中，每条的词之间是否恰好一个空格、且没有其他空白字符，
+  此时每条的词数为空格数+1（空串为0）
+  """
+  return (text.count("\n") == count - 1
+          and text.replace("\n", " ").isprintable()
+          and "  " not in text and " \n" not in text and "\n " not in text
+          and not text.startswith(" ") and not text.endswith(" "))
+
+
+class VectorScorer:
+  """词汇表与按词id索引的类别、权重数组"""
+
+  def __init__(self, lexicon: Lexicon) -> None:
+    """
+    Args:
+      lexicon(Lexicon): 词典
+    """
+    self.lexicon = lexicon
+    # id 0 为词汇表外的词
+    self.vocabulary: dict[str, int] = {}
+    categories = [OTHER]
+    for category, words in ((ADV, lexicon.advs), (NOT, lexicon.nots), (BAD, lexicon.bads), (GOOD, lexicon.goods)):
+      for word in sorted(words):
+        if word and word not in self.vocabulary:
+          self.vocabulary[word] = len(categories)
+          categories.append(category)
+    self.categories = np.array(categories, dtype=np.int8)
+    # 每个词开始时 w = 1，程度副词(×1.2)与否定词(×-1)只改变自身的w、不计入得分，
+    # 因此情绪词的贡献恒为 ±1，其余词为0
+    self.weights = np.select([self.categories == BAD, self.categories == GOOD], [-1, 1], 0).astype(np.int64)
+
+  def cut(self, contents: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    jieba分词、去除停用词并直接编码为词id数组，不经过以空格连接的字符串，
+    与 encode([lexicon.cut_content(content) for content in contents]) 的结果一致
+    Returns:
+      (ids, lengths): 同encode
+    """
+    get = self.vocabulary.get
+    stopwords = self.lexicon.stopwords
+    ids: list[int] = []
+    lengths = np.empty(len(contents), dtype=np.int64)
+    for i, content in enumerate(contents):
+      start = len(ids)
+      if content.isprintable() and " " not in content:
+        # 没有空白字符时每个词就是一个以空格分隔的词
+        ids.extend(get(word, OTHER) for word in cut(content) if word not in stopwords)
+      else:
+        ids.extend(get(word, OTHER) for word in self.lexicon.cut_content(content).split())
+      lengths[i] = len(ids) - start
+    return np.array(ids, dtype=np.int32), lengths
+
+  def encode(self, words: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    把分词结果（以空格连接）编码为词id数组
+    Returns:
+      (ids, lengths): 所有评论的词id首尾相接的int32数组，以及每条评论的词数
+    """
+    text = "\n".join(words)
+    if regular(text, len(words)):
+      # 词之间恰好一个空格时，整批只需切分一次，词数为空格数+1
+      lengths = np.fromiter(map(str.count, words, repeat(" ")), dtype=np.int64, count=len(words))
+      lengths += np.fromiter(map(bool, words), dtype=np.int64, count=len(words))
+      tokens = text.split()
+    else:
+      split = [sentence.split() for sentence in words]
+      lengths = np.fromiter(map(len, split), dtype=np.int64, count=len(split))
+      tokens = chain.from_iterable(split)
+    # map逐词查表，避免Python层的循环
+    ids = np.fromiter(map(self.vocabulary.get, tokens, repeat(OTHER)), dtype=np.int32, count=int(lengths.sum()))
+    return ids, lengths
+
+  def score_ids(self, ids: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """按批计算每条评论的情绪得分"""
+    owners = np.repeat(np.arange(len(lengths)), lengths)
+    return np.bincount(owners, weights=self.weights[ids], minlength=len(lengths)).astype(np.int64)
+
+  def __call__(self, words: list[str]) -> list[int]:
+    """按顺序返回每条评论的情绪得分"""
+    return self.score_ids(*self.encode(words)).tolist()
@@ -0,0 +1,74 @@
+"""
+多进程并行分词：评论按块分发到进程池，每个工作进程只在启动时加载一次jieba词典与停用词，
+结果按提交顺序拼接，与逐条串行分词的结果完全一致。
+分词结果可以是以空格连接的字符串，也可以直接是打分使用的int32词id数组
+"""
+import multiprocessing
+from itertools import chain
+from pathlib import Path
+from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+import jieba
+import numpy as np
+from preprocessing.lexicon import ROOT, Lexicon
+from preprocessing.scorer import VectorScorer
+
+# 工作进程内的词典与词汇表，由init_worker加载
+worker_lexicon: Optional[Lexicon] = None
+worker_scorer: Optional[VectorScorer] = None
+
+
+def init_worker(root: Path) -> None:
+  global worker_lexicon, worker_scorer
+  worker_lexicon = Lexicon(root)
+  worker_scorer = VectorScorer(worker_lexicon)
+  jieba.initialize()
+
+
+def cut_chunk(contents: list[str]) -> list[str]:
+  return [worker_lexicon.cut_content(content) for content in contents]
+
+
+def encode_chunk(contents: list[str]) -> tuple[np.ndarray, np.ndarray]:
+  return worker_scorer.cut(contents)
+
+
+class ParallelSegmenter:
+  """进程池分词器，可以用作上下文管理器"""
+
+  def __init__(self, workers: int, chunk_size: int = 1000, root: Path = ROOT) -> None:
+    """
+    Args:
+      workers(int): 工作进程数
+      chunk_size(int): 每次发给工作进程的最大评论数，过小时进程间通信开销占比变大
+      root(Path): 词表所在目录
+    """
+    self.workers = workers
+    self.chunk_size = chunk_size
+    # spawn在各平台上行为一致，不会复制主进程中已加载的大对象
+    self.executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"), initializer=init_worker, initargs=(root,))
+
+  def chunks(self, contents: list[str]) -> list[list[str]]:
+    # 每个进程至少分到一块，块不超过chunk_size
+    size = max(1, min(self.chunk_size, -(-len(contents) // self.workers)))
+    return [contents[i:i + size] for i in range(0, len(contents), size)]
+
+  def __call__(self, contents: list[str]) -> list[str]:
+    """按顺序返回每条评论的分词结果（以空格连接）"""
+    return list(chain.from_iterable(self.executor.map(cut_chunk, self.chunks(contents))))
+
+  def encode(self, contents: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """分词并编码为词id数组，返回值同VectorScorer.cut"""
+    results = list(self.executor.map(encode_chunk, self.chunks(contents)))
+    if not results:
+      return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64)
+    return np.concatenate([ids for ids, _ in results]), np.concatenate([lengths for _, lengths in results])
+
+  def close(self) -> None:
+    self.executor.shutdown()
+
+  def __enter__(self) -> "ParallelSegmenter":
+    return self
+
+  def __exit__(self, *_) -> None:
+    self.close()
@@ -1,20 +1,45 @@
 import sys
 import asyncio
 import json
+import os
+import multiprocessing
 from pathlib import Path
-from bili.crawler.crawler import BiliCrawler
-from weibo.crawler import WeiboCrawler
+from bili.crawler.crawler import BiliCrawler, BiliCrawlerRunner
+from weibo.crawler import WeiboCrawler, WeiboCrawlerRunner
+from common.crawler import CrawlerRunner, SLOT_ENV
+from common.frontier import RedisFrontier, ShardedRunner
+from common.proxy import ProxyPool
 from common.log import get_logger
 from common.db.bridge import transfer
 from common.db.mongo import MongoDB
-from common.crawler import random_sleep
+from common.db.schema import DATABASE, ensure_indexes
+from common.db.redis import Redis
+from common.db.bloom import BloomFilter
+from common.db.staging import Backend
 
 BILIBILI_ROOT = Path(__file__).parent.joinpath("bili")
 BILIBILI_MAX_PAGES = 100
+# 单个视频同时在途的评论页请求数
+BILIBILI_LOOKAHEAD = 3
+# 是否展开回复未完整展示的评论楼层
+BILIBILI_EXPAND_REPLIES = True
+# 每爬取多少页提交一次检查点，中断后从检查点继续
+BILIBILI_CHECKPOINT_EVERY = 10
 WEIBO_ROOT = Path(__file__).parent.joinpath("weibo")
 WEIBO_MAX_PAGES = 1
+WEIBO_CHECKPOINT_EVERY = 5
+# 是否展开有回复的主评论，爬取其全部回复
+WEIBO_EXPAND_REPLIES = True
+# 并发爬取文章的微博爬虫数量
+WEIBO_CRAWLERS = 3
+# 代理文件，每行一个代理；不存在时直连
+PROXIES_PATH = Path(__file__).parent.joinpath("proxies.txt")
+PROXY_TEST_URL = "http://api.bilibili.com/x/v2/reply/reply?oid=712909579&type=1&root=3762650428&ps=10&pn=1"
+# 分片模式的共享前沿队列，所有主机需连接同一个Redis
+FRONTIER_REDIS = {"host": "localhost", "port": 6379, "db": 0}
+# 已入库评论的布隆过滤器，所有爬虫（包括其他主机）共用，跳过已爬取过的评论
+SEEN_REDIS = {"host": "localhost", "port": 6379, "db": 0}
 
-loop = asyncio.new_event_loop()
 logger = get_logger("App")
 # 原神、明日方舟、王者荣耀、第五人格、光遇、Phigros、Arcaea
 bilibili_mids = [401742377, 161775300, 57863910, 211005705, 211700578, 414149787, 404145357]
@@ -22,7 +47,10 @@ bilibili_mids = [401742377, 161775300, 57863910, 211005705, 211700578, 414149787
 bilibili_hot = {
   57863910: 1000,
 }
-bilibili_crawlers = [BiliCrawler() for _ in range(5)]
+# 评论暂存后端：-staging redis（默认）或 -staging memory（单机运行时在进程内写回MongoDB）
+staging_backend = Backend(sys.argv[sys.argv.index("-staging") + 1]) if "-staging" in sys.argv else Backend.Redis
+bilibili_seen = BloomFilter(Redis(**SEEN_REDIS), "seen:bilibili:comments")
+bilibili_crawlers = [BiliCrawler(seen=bilibili_seen, backend=staging_backend) for _ in range(5)]
 # 原神、明日方舟、王者荣耀、第五人格、光遇
 weibo_uids = [6593199887, 6279793937, 5698023579, 6140485374, 6355968578]
 # 针对微博文章：文章评论大于多少才爬取？
@@ -33,15 +61,21 @@ weibo_hot = {
   6140485374: 1000,
   6355968578: 300,
 }
-weibo_crawler = WeiboCrawler()
+weibo_seen = BloomFilter(Redis(**SEEN_REDIS), "seen:weibo:comments")
+weibo_crawlers = [WeiboCrawler(seen=weibo_seen, backend=staging_backend) for _ in range(WEIBO_CRAWLERS)]
 fetch_bilibili_videos = "-bilibili-init" in sys.argv
 fetch_weibo_articles = "-weibo-init" in sys.argv
+# 分片模式：-shards N 在本机启动N个worker进程；其他主机使用 -worker 加入同一个共享队列
+shards = int(sys.argv[sys.argv.index("-shards") + 1]) if "-shards" in sys.argv else 0
+shard_worker = "-worker" in sys.argv
+# 增量模式：只刷新已爬取完毕的视频/文章，爬取比水位线新的评论
+incremental = "-incremental" in sys.argv
 with open(BILIBILI_ROOT.joinpath("headers.json"), "r", encoding="utf-8") as f:
   bilibili_headers = json.load(f)
 with open(WEIBO_ROOT.joinpath("headers.json"), "r", encoding="utf-8") as f:
   weibo_headers = json.load(f)
 
-mongo = MongoDB().client["MobileGameComments"]
+mongo = MongoDB().client[DATABASE]
 
 async def bili_fetch_all_user_videos(mids) -> bool:
   def hot_filter(video):
@@ -53,7 +87,6 @@ async def bili_fetch_all_user_videos(mids) -> bool:
       ok = await bilibili_crawlers[0].run_get_video_info(aid, filter=hot_filter, headers=bilibili_headers)
       if not ok:
         return False
-    await random_sleep(0.5, 0.7)
   return True
 
 async def weibo_fetch_all_user_blogs(uids):
@@ -62,54 +95,44 @@ async def weibo_fetch_all_user_blogs(uids):
     return blog["uid"] in weibo_uids and blog["comments"] > weibo_hot.get(blog["uid"], 0)
 
   for uid in uids:
-    ok, _ = await weibo_crawler.run_fetch_all_user_blogs(uid, filter=hot_filter, headers=weibo_headers)
+    ok, _ = await weibo_crawlers[0].run_fetch_all_user_blogs(uid, filter=hot_filter, headers=weibo_headers)
     if not ok:
       return False
     await transfer(
-      weibo_crawler.redis, "blogs", mongo["WeiboArticles"], logger=logger
+      weibo_crawlers[0].redis, weibo_crawlers[0].blogs_key, mongo["WeiboArticles"], logger=logger
     )
   return True
 
-async def bilibili_run_crawler(crawlers: list[BiliCrawler], mids: list[int]):
-  for mid in mids:
-    logger.info(f"正在爬取 用户{mid}的视频评论")
-    cursor = mongo["BilibiliVideos"].find({"mid": mid})
-    aids = asyncio.Queue()
-    async for video in cursor:
-      aids.put_nowait(video["_id"])
-    logger.info(f"用户{mid} 共有 {aids.qsize()}条视频")
-
-    async def task(crawler: BiliCrawler):
-      while not aids.empty():
-        aid = await aids.get()
-        ok, _ = await crawler.run_get_comments(aid, headers=bilibili_headers)
-        if not ok:
-          return False
-        await random_sleep(0.3, 0.5)
-
-    tasks = [task(crawler) for crawler in crawlers]
-    await asyncio.gather(*tasks)
-
-async def weibo_run_crawler(crawler: WeiboCrawler, uids: list[int], max_pages: int = 10):
-  for uid in uids:
-    cursor = mongo["WeiboArticles"].find({"uid": uid})
-    async for article in cursor:
-      id = article["_id"]
-      if article["finished"]:
-        logger.info(f"文章{id}已爬取完毕，跳过")
-        continue
-      # 删除已存在的评论，防止重复
-      await mongo["WeiboComments"].delete_many({"blogid": id})
-      ok, _ = await crawler.run_fetch_blog_comments(uid, id, headers=weibo_headers, max_pages=max_pages)
-      if ok:
-        await transfer(crawler.redis, "comments", mongo["WeiboComments"], upsert=False, logger=logger)
-      else:
-        logger.error("爬取评论失败")
-        return False
-      logger.info(f"文章{id} 已爬取完毕")
-      await mongo["WeiboArticles"].update_one({"_id": id}, {"$set": {"finished": True}})
-
-async def main():
+async def main(worker: bool = shard_worker):
+  """
+  Args:
+    worker(bool): 是否作为分片worker运行：只消费共享队列，不初始化、不加载条目
+  """
+  proxies = None
+  if PROXIES_PATH.exists():
+    proxies = ProxyPool(PROXY_TEST_URL)
+    count = await proxies.load(PROXIES_PATH)
+    logger.info(f"可用代理：{count}个")
+  # 幂等地创建查询所需的索引
+  await ensure_indexes(mongo, logger)
+
+  # spawn启动的worker进程会重新执行本模块，sys.argv与父进程相同，shards仍不为0，
+  # 因此worker只能由worker参数判断，不能再播种、启动worker
+  sharded = shards and not worker
+  if sharded or worker:
+    runner = ShardedRunner(RedisFrontier(Redis(**FRONTIER_REDIS)))
+  else:
+    runner = CrawlerRunner()
+  bilibili_runner = BiliCrawlerRunner(
+    runner, bilibili_crawlers, headers=bilibili_headers,
+    lookahead=BILIBILI_LOOKAHEAD, expand_replies=BILIBILI_EXPAND_REPLIES,
+    checkpoint_every=BILIBILI_CHECKPOINT_EVERY, incremental=incremental, proxies=proxies
+  )
+  weibo_runner = WeiboCrawlerRunner(
+    runner, weibo_crawlers, headers=weibo_headers,
+    max_pages=WEIBO_MAX_PAGES, checkpoint_every=WEIBO_CHECKPOINT_EVERY,
+    expand_replies=WEIBO_EXPAND_REPLIES, incremental=incremental, proxies=proxies
+  )
 
   async def bilibili_task():
     if fetch_bilibili_videos:
@@ -117,7 +140,8 @@ async def main():
       if not ok:
         logger.error("获取视频失败")
         return
-    await bilibili_run_crawler(bilibili_crawlers, bilibili_mids)
+    count = await bilibili_runner.load(bilibili_mids)
+    logger.info(f"B站共有{count}条视频待爬取")
 
   async def weibo_task():
     if fetch_weibo_articles:
@@ -125,14 +149,53 @@ async def main():
       if not ok:
         logger.error("获取文章失败")
         return
-    await weibo_run_crawler(weibo_crawler, weibo_uids, WEIBO_MAX_PAGES)
-
-  # 运行多个平台的爬虫
-  await asyncio.gather(bilibili_task(), weibo_task())
-  # 单独运行某个平台爬虫
-  # await weibo_task()
-  # await bilibili_task()
+    count = await weibo_runner.load(weibo_uids)
+    logger.info(f"微博共有{count}篇文章待爬取")
+
+  try:
+    if not worker:
+      # 所有平台的条目进入同一个调度器
+      await asyncio.gather(bilibili_task(), weibo_task())
+      # 单独运行某个平台爬虫：只加载该平台的条目
+      # await weibo_task()
+      # await bilibili_task()
+    if sharded:
+      count = await runner.seed()
+      logger.info(f"写入共享队列{count}个条目，启动{shards}个worker进程")
+      await run_shards(shards)
+    else:
+      # 回收本槽位上次运行崩溃时遗留的暂存评论
+      await asyncio.gather(*[crawler.recover() for crawler in bilibili_crawlers + weibo_crawlers])
+      await runner.run()
+  finally:
+    # 关闭所有长连接
+    await asyncio.gather(*[crawler.close() for crawler in bilibili_crawlers + weibo_crawlers])
+
+
+def shard_main():
+  asyncio.run(main(worker=True))
+
+
+async def run_shards(count: int):
+  """启动count个worker进程并等待全部结束"""
+  context = multiprocessing.get_context("spawn")
+  processes = [context.Process(target=shard_main, name=f"shard-{i}") for i in range(count)]
+  # 每个worker使用固定的槽位1..count（主进程为0），重启后能回收同一槽位遗留的暂存缓存
+  slot = os.environ.get(SLOT_ENV)
+  try:
+    for i, process in enumerate(processes):
+      os.environ[SLOT_ENV] = str(i + 1)
+      process.start()
+  finally:
+    if slot is None:
+      os.environ.pop(SLOT_ENV, None)
+    else:
+      os.environ[SLOT_ENV] = slot
+  for process in processes:
+    await asyncio.to_thread(process.join)
+    if process.exitcode != 0:
+      logger.warning(f"worker进程{process.name}异常退出，代码：{process.exitcode}，其租约将被其他worker回收")
 
 
 if __name__ == "__main__":
-  asyncio.run(main())
\ No newline at end of file
+  asyncio.run(main())
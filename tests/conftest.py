@@ -0,0 +1,73 @@
+"""
+测试共用的夹具：
+  redis       本地redis-server（localhost:6379）的第15号库，测试前后清空；连不上时跳过依赖Redis的测试
+  Collection  内存中的MongoDB集合替身，只实现暂存与转移用到的insert_many与bulk_write
+"""
+import sys
+from pathlib import Path
+from typing import Optional
+
+import pytest
+import redis as redis_sync
+from pymongo.errors import BulkWriteError
+from pymongo.results import BulkWriteResult, InsertManyResult
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from common.db.mongo import DUPLICATE_KEY
+from common.db.redis import Redis
+
+REDIS_DB = 15
+
+
+class Collection:
+  """按_id保存文档；插入已存在的_id时与MongoDB一样抛出重复键的BulkWriteError"""
+
+  def __init__(self, fail_at: Optional[int] = None) -> None:
+    """
+    Args:
+      fail_at(int | None): 第几次写入时抛出异常，模拟写入中途MongoDB不可用
+    """
+    self.documents: dict = {}
+    self.writes = 0
+    self.fail_at = fail_at
+
+  def write(self) -> None:
+    self.writes += 1
+    if self.writes == self.fail_at:
+      raise ConnectionError("MongoDB不可用")
+
+  async def insert_many(self, documents: list[dict], ordered: bool = True) -> InsertManyResult:
+    self.write()
+    inserted, errors = [], []
+    for i, document in enumerate(documents):
+      if document["_id"] in self.documents:
+        errors.append({"index": i, "code": DUPLICATE_KEY})
+        if ordered:
+          break
+        continue
+      self.documents[document["_id"]] = document
+      inserted.append(document["_id"])
+    if errors:
+      raise BulkWriteError({"writeErrors": errors, "nInserted": len(inserted)})
+    return InsertManyResult(inserted, True)
+
+  async def bulk_write(self, requests: list, ordered: bool = True, session=None) -> BulkWriteResult:
+    self.write()
+    for request in requests:
+      _id = request._filter["_id"]
+      self.documents[_id] = {**self.documents.get(_id, {}), **request._doc["$set"]}
+    return BulkWriteResult({"nUpserted": len(requests)}, True)
+
+
+@pytest.fixture
+def redis():
+  client = redis_sync.Redis(db=REDIS_DB)
+  try:
+    client.ping()
+  except redis_sync.ConnectionError:
+    pytest.skip("需要本地redis-server")
+  client.flushdb()
+  yield Redis(db=REDIS_DB)
+  client.flushdb()
+  client.close()
@@ -0,0 +1,44 @@
+from preprocessing.automaton import Automaton
+from preprocessing.lexicon import Lexicon
+
+
+def write_lexicon(root, stopwords, advs, nots, bads, goods) -> Lexicon:
+  for name, words in (("stopwords", stopwords), ("程度副词", advs), ("否定词", nots), ("负面情绪词", bads), ("正面情绪词", goods)):
+    root.joinpath(f"{name}.txt").write_text("\n".join(words) + "\n", encoding="utf-8")
+  return Lexicon(root)
+
+
+def test_scores_like_get_emotion_on_separable_text(tmp_path):
+  lexicon = write_lexicon(tmp_path, ["的"], ["很"], ["不"], ["差"], ["好", "好玩"])
+  automaton = Automaton(lexicon)
+  # 每个词只有一种切分方式时与分词后打分一致
+  for content, words in (("很好玩的游戏", "很 好玩 游戏"), ("不差", "不 差"), ("好差好", "好 差 好"), ("游戏", "游戏"), ("", "")):
+    assert automaton.score(content) == lexicon.get_emotion(words)
+
+
+def test_longest_match_and_precedence(tmp_path):
+  lexicon = write_lexicon(tmp_path, ["的确"], ["很"], ["不"], ["不好", "差"], ["好", "的", "很", "差"])
+  automaton = Automaton(lexicon)
+  # 最长匹配：不好是一个负面词，而不是否定词+正面词
+  assert automaton.score("不好") == -1
+  # 停用词不计分，且先于其他词表
+  assert automaton.score("的确") == 0
+  # 同一个词在多个词表中时按get_emotion的先后：程度副词 > 负面词 > 正面词
+  assert automaton.score("很") == 0
+  assert automaton.score("差") == -1
+  assert automaton(["好好", "不好好"]) == [2, 0]
+
+
+def test_load_rebuilds_when_word_lists_change(tmp_path):
+  words = tmp_path / "words"
+  words.mkdir()
+  path = tmp_path / "automaton.pickle"
+  write_lexicon(words, [], [], [], ["差"], ["好"])
+  automaton = Automaton.load(words, path)
+  assert path.exists()
+  assert automaton.score("好") == 1
+  assert Automaton.load(words, path).version == automaton.version
+  write_lexicon(words, [], [], [], ["差", "好"], [])
+  rebuilt = Automaton.load(words, path)
+  assert rebuilt.version != automaton.version
+  assert rebuilt.score("好") == -1
@@ -0,0 +1,33 @@
+import asyncio
+
+from common.db.bloom import BloomFilter
+
+
+def test_added_items_are_always_found(redis):
+  async def main():
+    bloom = BloomFilter(redis, "seen:test", capacity=5000, error_rate=0.01)
+    assert await bloom.contains([]) == []
+    assert await bloom.contains([1, 2, 3]) == [False, False, False]
+    await bloom.add(list(range(5000)))
+    assert all(await bloom.contains(list(range(5000))))
+
+  asyncio.run(main())
+
+
+def test_false_positive_rate_within_capacity(redis):
+  async def main():
+    bloom = BloomFilter(redis, "seen:test", capacity=5000, error_rate=0.01)
+    await bloom.add(list(range(5000)))
+    seen = await bloom.contains(list(range(5000, 25000)))
+    assert sum(seen) / len(seen) < 0.02
+
+  asyncio.run(main())
+
+
+def test_shared_between_instances(redis):
+  async def main():
+    await BloomFilter(redis, "seen:test", capacity=1000).add(["a", 42])
+    other = BloomFilter(redis, "seen:test", capacity=1000)
+    assert await other.contains(["a", 42, "b"]) == [True, True, False]
+
+  asyncio.run(main())
@@ -0,0 +1,91 @@
+import json
+import asyncio
+
+import pytest
+
+from common.db.bridge import discard, transfer
+from conftest import Collection
+
+KEY = "comments:test"
+
+
+async def stage(redis, ids) -> None:
+  await redis.client.lpush(KEY, *[json.dumps({"_id": i}) for i in ids])
+
+
+async def staged(redis) -> set:
+  """列表与在途批次中剩余的所有记录"""
+  items = await redis.client.lrange(KEY, 0, -1)
+  for key in await redis.client.smembers(f"{KEY}:inflight"):
+    items += await redis.client.lrange(key, 0, -1)
+  return {json.loads(item)["_id"] for item in items}
+
+
+def test_transfer_moves_everything(redis):
+  async def main():
+    await stage(redis, range(2500))
+    collection = Collection()
+    stats = await transfer(redis, KEY, collection, upsert=False, batch_size=300)
+    assert stats.documents == 2500
+    assert set(collection.documents) == set(range(2500))
+    assert await redis.client.keys("*") == []
+
+  asyncio.run(main())
+
+
+def test_crash_redelivers_unacknowledged_batches(redis):
+  async def main():
+    await stage(redis, range(3000))
+    collection = Collection(fail_at=3)
+    with pytest.raises(ConnectionError):
+      await transfer(redis, KEY, collection, upsert=False, batch_size=500, concurrency=1)
+    # 写入失败的批次仍登记为在途，已确认的批次不会留在Redis中
+    written = set(collection.documents)
+    assert written and written.isdisjoint(await staged(redis))
+    assert written | await staged(redis) == set(range(3000))
+    assert await redis.client.scard(f"{KEY}:inflight") >= 1
+
+    collection.fail_at = None
+    stats = await transfer(redis, KEY, collection, upsert=False, batch_size=500)
+    assert set(collection.documents) == set(range(3000))
+    assert stats.documents == 3000 - len(written)
+    assert await redis.client.keys("*") == []
+
+  asyncio.run(main())
+
+
+def test_redelivery_is_idempotent(redis):
+  async def main():
+    await stage(redis, range(100))
+    collection = Collection()
+    # 模拟写入MongoDB之后、确认之前崩溃：批次已写入但仍在途
+    await redis.client.rpush(f"{KEY}:batch:x", *[json.dumps({"_id": i}) for i in range(10)])
+    await redis.client.sadd(f"{KEY}:inflight", f"{KEY}:batch:x")
+    await collection.insert_many([{"_id": i} for i in range(10)])
+    await transfer(redis, KEY, collection, upsert=False, batch_size=30)
+    assert set(collection.documents) == set(range(100))
+    assert await redis.client.keys("*") == []
+
+  asyncio.run(main())
+
+
+def test_copy_without_delete(redis):
+  async def main():
+    await stage(redis, range(50))
+    collection = Collection()
+    await transfer(redis, KEY, collection, batch_size=20, delete=False)
+    assert set(collection.documents) == set(range(50))
+    assert await redis.client.llen(KEY) == 50
+
+  asyncio.run(main())
+
+
+def test_discard_drops_list_and_inflight(redis):
+  async def main():
+    await stage(redis, range(10))
+    await redis.client.rpush(f"{KEY}:batch:x", "{}")
+    await redis.client.sadd(f"{KEY}:inflight", f"{KEY}:batch:x")
+    await discard(redis, KEY)
+    assert await redis.client.keys("*") == []
+
+  asyncio.run(main())
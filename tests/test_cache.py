@@ -0,0 +1,71 @@
+import sqlite3
+
+import numpy as np
+
+from preprocessing.cache import SegmentCache, words_version
+
+
+def ids(*values) -> np.ndarray:
+  return np.array(values, dtype=np.int32)
+
+
+def test_round_trip_in_order(tmp_path):
+  cache = SegmentCache("v1", tmp_path / "cache.sqlite3")
+  cache.put_many([("好玩", ids(3, 4), 1.0), ("难受", ids(), -1.0)])
+  hits = cache.get_many(["难受", "没有", "好玩"])
+  assert hits[1] is None
+  assert np.array_equal(hits[0][0], ids()) and hits[0][1] == -1.0
+  assert hits[2][0].dtype == np.int32
+  assert np.array_equal(hits[2][0], ids(3, 4)) and hits[2][1] == 1.0
+  assert (cache.hits, cache.misses) == (2, 1)
+  cache.close()
+
+
+def test_persists_across_runs_until_version_changes(tmp_path):
+  path = tmp_path / "cache.sqlite3"
+  cache = SegmentCache("v1", path)
+  cache.put_many([("好玩", ids(3), 1.0)])
+  cache.close()
+  cache = SegmentCache("v1", path)
+  assert cache.get_many(["好玩"])[0] is not None
+  cache.close()
+  cache = SegmentCache("v2", path)
+  assert len(cache) == 0
+  cache.close()
+
+
+def test_rebuilds_table_of_older_schema(tmp_path):
+  path = tmp_path / "cache.sqlite3"
+  db = sqlite3.connect(path)
+  db.execute("CREATE TABLE entries (key BLOB PRIMARY KEY, words TEXT, emotion REAL, used INTEGER)")
+  db.execute("INSERT INTO entries VALUES (x'00', '好玩', 1.0, 1)")
+  db.commit()
+  db.close()
+  cache = SegmentCache("v1", path)
+  assert len(cache) == 0
+  cache.put_many([("好玩", ids(3), 1.0)])
+  assert np.array_equal(cache.get_many(["好玩"])[0][0], ids(3))
+  cache.close()
+
+
+def test_evicts_least_recently_used(tmp_path):
+  path = tmp_path / "cache.sqlite3"
+  cache = SegmentCache("v1", path, max_entries=2)
+  cache.put_many([("一", ids(1), 0.0), ("二", ids(2), 0.0)])
+  cache.close()
+  cache = SegmentCache("v1", path, max_entries=2)
+  cache.get_many(["一"])
+  cache.put_many([("三", ids(3), 0.0)])
+  # 关闭时淘汰上次运行之后没有用到的条目
+  cache.close()
+  cache = SegmentCache("v1", path, max_entries=2)
+  assert [hit is not None for hit in cache.get_many(["一", "二", "三"])] == [True, False, True]
+  cache.close()
+
+
+def test_words_version_follows_word_lists(tmp_path):
+  (tmp_path / "正面情绪词.txt").write_text("好\n", encoding="utf-8")
+  before = words_version(tmp_path)
+  assert words_version(tmp_path) == before
+  (tmp_path / "正面情绪词.txt").write_text("好\n棒\n", encoding="utf-8")
+  assert words_version(tmp_path) != before
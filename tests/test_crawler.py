@@ -0,0 +1,129 @@
+import json
+import time
+import asyncio
+
+import pytest
+
+from common.crawler import CircuitBreaker
+
+PLATFORM = "bilibili"
+
+
+def test_in_flight_bans_count_once():
+  breaker = CircuitBreaker(base_delay=60)
+  first = breaker.report_ban(PLATFORM, "a")
+  # 触发风控时已经在途的请求随后也失败，只沿用当前的等待时间
+  later = [breaker.report_ban(PLATFORM, "a") for _ in range(5)]
+  assert first == 60
+  assert all(delay <= 60 for delay in later)
+  assert breaker.circuits[(PLATFORM, "a")].failures == 1
+  assert not breaker.is_open(PLATFORM, "b")
+
+
+def test_only_prober_escalates():
+  async def main():
+    breaker = CircuitBreaker(base_delay=0.05, factor=2)
+    breaker.report_ban(PLATFORM, "a")
+    probe = await breaker.wait(PLATFORM, "a")
+    assert probe is not None
+    # 非探测者的失败与释放不影响探测
+    breaker.release_probe(PLATFORM, "a")
+    assert breaker.circuits[(PLATFORM, "a")].probing
+    assert breaker.report_ban(PLATFORM, "a") <= 0.05
+    assert breaker.circuits[(PLATFORM, "a")].failures == 1
+    assert breaker.report_ban(PLATFORM, "a", probe) == pytest.approx(0.1)
+    assert breaker.circuits[(PLATFORM, "a")].failures == 2
+
+  asyncio.run(main())
+
+
+def test_one_prober_and_success_releases_waiters():
+  async def main():
+    breaker = CircuitBreaker(base_delay=0.05)
+    breaker.report_ban(PLATFORM, "a")
+    probes = []
+
+    async def request():
+      probe = await breaker.wait(PLATFORM, "a")
+      probes.append(probe)
+      if probe is not None:
+        await asyncio.sleep(0.05)
+        breaker.report_success(PLATFORM, "a")
+
+    start = time.monotonic()
+    await asyncio.gather(*[request() for _ in range(5)])
+    assert time.monotonic() - start >= 0.05
+    assert sum(probe is not None for probe in probes) == 1
+    assert not breaker.is_open(PLATFORM, "a")
+
+  asyncio.run(main())
+
+
+def test_released_probe_is_taken_over():
+  async def main():
+    breaker = CircuitBreaker(base_delay=0.01)
+    breaker.report_ban(PLATFORM, "a")
+    probe = await breaker.wait(PLATFORM, "a")
+    waiter = asyncio.create_task(breaker.wait(PLATFORM, "a"))
+    await asyncio.sleep(0.02)
+    assert not waiter.done()
+    # 探测请求未得到结果，交给其他协程探测
+    breaker.release_probe(PLATFORM, "a", probe)
+    assert await asyncio.wait_for(waiter, 1) == probe + 1
+
+  asyncio.run(main())
+
+
+def test_fetch_json_retries_after_ban():
+  async def main():
+    breaker = CircuitBreaker(base_delay=0.01, max_retries=3)
+    responses = iter(["<html>", "<html>", '{"code": 0}'])
+
+    async def request():
+      return next(responses)
+
+    assert await breaker.fetch_json(PLATFORM, "a", request) == {"code": 0}
+    assert not breaker.is_open(PLATFORM, "a")
+
+  asyncio.run(main())
+
+
+def test_fetch_json_gives_up_after_max_retries():
+  async def main():
+    breaker = CircuitBreaker(base_delay=0.01, max_retries=2)
+    calls = 0
+
+    async def request():
+      nonlocal calls
+      calls += 1
+      return "<html>"
+
+    with pytest.raises(json.JSONDecodeError):
+      await breaker.fetch_json(PLATFORM, "a", request)
+    assert calls == 3
+    assert breaker.circuits[(PLATFORM, "a")].failures == 3
+
+  asyncio.run(main())
+
+
+def test_pooled_identity_gives_up_on_first_ban():
+  async def main():
+    breaker = CircuitBreaker(base_delay=60, max_retries=6)
+    breaker.rotate(PLATFORM, "proxy")
+    calls = 0
+
+    async def request():
+      nonlocal calls
+      calls += 1
+      return "<html>"
+
+    start = time.monotonic()
+    with pytest.raises(json.JSONDecodeError):
+      await breaker.fetch_json(PLATFORM, "proxy", request)
+    # 不等待退避，风控照常记录
+    assert time.monotonic() - start < 1
+    assert calls == 1
+    assert breaker.is_open(PLATFORM, "proxy")
+    assert not breaker.is_open(PLATFORM, "direct")
+
+  asyncio.run(main())
@@ -0,0 +1,208 @@
+import json
+import time
+import asyncio
+
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from common.crawler import Err
+from common.db.staging import recover
+from common.db.spill import SpillLog
+from common.frontier import RedisFrontier, ShardedRunner
+from conftest import Collection
+
+
+def test_claim_is_exclusive_and_by_priority(redis):
+  async def main():
+    frontier = RedisFrontier(redis)
+    await frontier.push("bilibili", [(1, 10, None), (2, 30, "a"), (3, 20, None)])
+    claims = [await frontier.claim("bilibili", f"w{i}") for i in range(4)]
+    assert [claim[1] for claim in claims[:3]] == [2, 3, 1]
+    assert claims[0][2] == "a"
+    assert claims[3] is None
+    assert await frontier.size("bilibili") == (0, 3)
+
+  asyncio.run(main())
+
+
+def test_only_owner_can_extend_or_release(redis):
+  async def main():
+    frontier = RedisFrontier(redis)
+    await frontier.push("weibo", [(1, 5, 100)])
+    member, *_ = await frontier.claim("weibo", "a")
+    assert not await frontier.extend("weibo", "b", member)
+    assert not await frontier.ack("weibo", "b", member)
+    assert await frontier.extend("weibo", "a", member)
+    assert await frontier.nack("weibo", "a", member)
+    # 放回时保持原优先级
+    assert await redis.client.zscore(frontier.keys("weibo")[0], member) == 5
+    member, *_ = await frontier.claim("weibo", "b")
+    assert await frontier.ack("weibo", "b", member)
+    assert await frontier.size("weibo") == (0, 0)
+
+  asyncio.run(main())
+
+
+def test_attempts_are_cleared_when_done(redis):
+  async def main():
+    frontier = RedisFrontier(redis)
+    attempts = frontier.keys("bilibili")[4]
+    await frontier.push("bilibili", [(1, 0, None)])
+    member, *_ = await frontier.claim("bilibili", "a")
+    assert await frontier.attempt("bilibili", member) == 1
+    # 放回队列时保留失败次数，完成（成功或放弃）时清除
+    assert await frontier.nack("bilibili", "a", member)
+    assert await redis.client.hget(attempts, member) == b"1"
+    member, *_ = await frontier.claim("bilibili", "a")
+    assert await frontier.ack("bilibili", "a", member)
+    assert not await redis.client.exists(attempts)
+
+  asyncio.run(main())
+
+
+def test_expired_lease_is_reclaimed(redis):
+  async def main():
+    frontier = RedisFrontier(redis, visibility_timeout=0.1)
+    await frontier.push("bilibili", [(1, 7, None)])
+    await frontier.heartbeat("a")
+    member, *_ = await frontier.claim("bilibili", "a")
+    assert await frontier.reclaim("bilibili") == 0
+    await asyncio.sleep(0.2)
+    assert await frontier.reclaim("bilibili") == 1
+    assert await redis.client.zscore(frontier.keys("bilibili")[0], member) == 7
+    # 租约被回收后，原持有者不能再确认
+    assert not await frontier.ack("bilibili", "a", member)
+
+  asyncio.run(main())
+
+
+def test_lease_of_dead_worker_is_reclaimed(redis):
+  async def main():
+    frontier = RedisFrontier(redis, visibility_timeout=300, heartbeat_ttl=0.1)
+    await frontier.push("bilibili", [(1, 0, None)])
+    await frontier.heartbeat("a")
+    await frontier.claim("bilibili", "a")
+    assert await frontier.reclaim("bilibili") == 0
+    await asyncio.sleep(0.2)
+    assert await frontier.reclaim("bilibili") == 1
+
+  asyncio.run(main())
+
+
+def test_sharded_runners_process_each_item_once(redis):
+  async def main():
+    handled = []
+    attempts = {}
+
+    def handler(name):
+      async def handle(key, _):
+        await asyncio.sleep(0.001)
+        handled.append((name, key))
+        if key == 0:
+          attempts[name] = attempts.get(name, 0) + 1
+          return False, Err.FAILED
+        return True, None
+      return handle
+
+    runners = []
+    for name in ("a", "b"):
+      runner = ShardedRunner(RedisFrontier(redis), max_attempts=3, poll_interval=0.05)
+      runner.register("bilibili", [handler(name), handler(name)])
+      runners.append(runner)
+    for key in range(20):
+      runners[0].push("bilibili", key, priority=key)
+    await runners[0].seed()
+    await asyncio.gather(*[runner.run() for runner in runners])
+
+    keys = [key for _, key in handled if key != 0]
+    assert sorted(keys) == list(range(1, 20))
+    # 失败的条目在所有worker间累计重试max_attempts次后放弃
+    assert sum(attempts.values()) == 3
+    assert [failed for runner in runners for failed in runner.failed] == [("bilibili", 0)]
+    assert not await redis.client.exists(runners[0].frontier_store.keys("bilibili")[4])
+
+  asyncio.run(main())
+
+
+def test_lost_lease_cancels_the_handler(redis):
+  async def main():
+    frontier = RedisFrontier(redis, visibility_timeout=0.06)
+    await frontier.push("bilibili", [(1, 0, None)])
+    started, cancelled = asyncio.Event(), asyncio.Event()
+
+    async def handle(key, _):
+      started.set()
+      try:
+        await asyncio.sleep(10)
+      except asyncio.CancelledError:
+        cancelled.set()
+        raise
+      return True, None
+
+    runner = ShardedRunner(frontier, poll_interval=0.05)
+    consume = asyncio.create_task(runner.consume("bilibili", handle, "a"))
+    await started.wait()
+    # 租约被回收并由其他worker领取
+    _, leases, owners, *_ = frontier.keys("bilibili")
+    member = (await redis.client.hkeys(owners))[0]
+    await redis.client.hset(owners, member, "b")
+    await redis.client.zadd(leases, {member: time.time() + 60})
+    await frontier.heartbeat("b")
+    await asyncio.wait_for(cancelled.wait(), 1)
+    await asyncio.sleep(0.05)
+    # 不确认、不放回，租约仍属于新的持有者
+    assert await frontier.size("bilibili") == (0, 1)
+    assert await redis.client.hget(owners, member) == b"b"
+    # 新的持有者完成后，原worker照常结束
+    await frontier.ack("bilibili", "b", member)
+    await asyncio.wait_for(consume, 1)
+
+  asyncio.run(main())
+
+
+def test_heartbeat_survives_redis_errors(redis):
+  async def main():
+    frontier = RedisFrontier(redis, visibility_timeout=0.06)
+    await frontier.push("bilibili", [(1, 0, None)])
+    extend = frontier.extend
+    failures = 2
+
+    async def flaky_extend(*args):
+      nonlocal failures
+      if failures:
+        failures -= 1
+        raise RedisConnectionError("连接中断")
+      return await extend(*args)
+
+    frontier.extend = flaky_extend
+
+    async def handle(key, _):
+      await asyncio.sleep(0.1)
+      return True, None
+
+    runner = ShardedRunner(frontier, poll_interval=0.05)
+    await asyncio.wait_for(runner.consume("bilibili", handle, "a"), 1)
+    assert failures == 0
+    assert await frontier.size("bilibili") == (0, 0)
+
+  asyncio.run(main())
+
+
+def test_recover_only_takes_own_slot(redis, tmp_path):
+  async def main():
+    own, other = "comments:host-1-Weibo#1", "comments:host-1-Weibo#10"
+    await redis.client.lpush(f"{own}:5", *[json.dumps({"_id": i}) for i in range(10)])
+    # 崩溃时在途的批次
+    await redis.client.rpush(f"{own}:6:batch:x", json.dumps({"_id": 10}))
+    await redis.client.sadd(f"{own}:6:inflight", f"{own}:6:batch:x")
+    await redis.client.lpush(f"{other}:5", json.dumps({"_id": -1}))
+    SpillLog(f"{own}:7", tmp_path).write([json.dumps({"_id": 11})])
+    SpillLog(f"{other}:7", tmp_path).write([json.dumps({"_id": -2})])
+
+    collection = Collection()
+    count = await recover(redis, [own, f"{own}:*"], collection, spill_directory=tmp_path)
+    assert count == 12
+    assert set(collection.documents) == set(range(12))
+    assert sorted(await redis.client.keys("*")) == [f"{other}:5".encode()]
+    assert SpillLog.names(tmp_path) == {f"{other}:7"}
+
+  asyncio.run(main())
@@ -0,0 +1,167 @@
+import random
+from collections import defaultdict
+
+import pytest
+
+from preprocessing.automaton import Automaton
+from preprocessing.cache import SegmentCache
+from preprocessing.lexicon import Lexicon
+from preprocessing.pipeline import (
+  BILIBILI_GAME_MAP, LEVEL_WEIGHTS, WEIBO_GAME_MAP, Pipeline, clean, to_month, to_timestamp, weight_map
+)
+
+MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+
+class Collection:
+  """只实现流水线用到的find：空查询条件，投影为包含或排除字段"""
+
+  def __init__(self, documents: list[dict]) -> None:
+    self.documents = documents
+
+  def find(self, query: dict, projection: dict, batch_size: int = 0):
+    for document in self.documents:
+      keep = {field for field, include in projection.items() if include}
+      if projection.get("_id", 1):
+        keep.add("_id")
+      yield {field: value for field, value in document.items() if field in keep}
+
+
+@pytest.fixture(scope="module")
+def lexicon() -> Lexicon:
+  return Lexicon()
+
+
+@pytest.fixture(scope="module")
+def db(lexicon) -> dict[str, Collection]:
+  """带有来源内与跨来源重复、缺字段、清洗后为空的评论的合成数据库"""
+  rng = random.Random(0)
+  words = sorted(lexicon.goods)[:200] + sorted(lexicon.bads)[:200] + sorted(lexicon.advs) + sorted(lexicon.nots) + ["游戏", "角色", "版本", "活动"]
+
+  def text() -> str:
+    content = "".join(rng.choice(words) for _ in range(rng.randint(1, 10)))
+    decoration = rng.random()
+    if decoration < 0.1:
+      return "回复 @某人 :" + content
+    if decoration < 0.2:
+      return content + "[doge]"
+    if decoration < 0.25:
+      return "@abc " + content + "hello123"
+    if decoration < 0.3:
+      return "[doge]123"
+    return content
+
+  # 同一来源内与跨来源重复的内容
+  copies = [text() for _ in range(40)]
+  videos = [{"_id": aid, "author": rng.choice(list(BILIBILI_GAME_MAP) + ["原神"])} for aid in range(15)]
+  articles = [{"_id": blogid, "author": rng.choice(list(WEIBO_GAME_MAP) + ["原神"])} for blogid in range(8)]
+  bilibili = []
+  for i in range(1500):
+    comment = {
+      "_id": i, "aid": rng.randrange(15), "level": rng.randint(0, 6), "time": 1600000000 + rng.randrange(3 * 10 ** 7),
+      "content": rng.choice(copies) if rng.random() < 0.2 else text(), "like": rng.choice([0, 10, 100, 300, 800, 2000]),
+      "is_root": rng.random() < 0.5,
+    }
+    if rng.random() < 0.02:
+      del comment["level"]
+    bilibili.append(comment)
+  weibo = []
+  for i in range(800):
+    weibo.append({
+      "_id": 10 ** 6 + i, "blogid": rng.randrange(8),
+      "time": f"Sat {rng.choice(MONTHS)} {rng.randint(10, 28)} 10:00:00 +0800 {rng.choice([2022, 2023])}",
+      "likes": rng.choice([0, 60, 300, 700, 5000]), "content": rng.choice(copies) if rng.random() < 0.2 else text(),
+    })
+  return {
+    "BilibiliVideos": Collection(videos),
+    "WeiboArticles": Collection(articles),
+    "BilibiliComments": Collection(bilibili),
+    "WeiboComments": Collection(weibo),
+  }
+
+
+def reference(db: dict[str, Collection], lexicon: Lexicon) -> dict[str, dict]:
+  """preprocessing.ipynb的流程：去掉缺字段的评论 -> 清洗 -> 每个来源内按内容去重 -> 合并 -> 分词打分 -> 按(游戏, 月份)平均"""
+  videos = {video["_id"]: video["author"] for video in db["BilibiliVideos"].documents}
+  articles = {article["_id"]: article["author"] for article in db["WeiboArticles"].documents}
+  rows = []
+  seen = set()
+  for comment in db["BilibiliComments"].documents:
+    if "level" not in comment:
+      continue
+    content = clean(comment["content"])
+    if content is None or content in seen:
+      continue
+    seen.add(content)
+    weight = weight_map(comment["like"] * LEVEL_WEIGHTS[comment["level"]]) * (1 if comment["is_root"] else 0.5)
+    author = videos[comment["aid"]]
+    rows.append(("Bilibili", BILIBILI_GAME_MAP.get(author, author), to_month(comment["time"]), weight, content))
+  seen = set()
+  for comment in db["WeiboComments"].documents:
+    content = clean(comment["content"])
+    if content is None or content in seen:
+      continue
+    seen.add(content)
+    author = articles[comment["blogid"]]
+    rows.append(("Weibo", WEIBO_GAME_MAP.get(author, author), to_month(to_timestamp(comment["time"])), weight_map(comment["likes"]), content))
+
+  results = {}
+  for name, sources in (("BilibiliResult", ("Bilibili",)), ("WeiboResult", ("Weibo",)), ("Result", ("Bilibili", "Weibo"))):
+    groups = defaultdict(list)
+    for source, game, month, weight, content in rows:
+      if source in sources:
+        groups[(game, month)].append(lexicon.get_emotion(lexicon.cut_content(content)) * weight)
+    results[name] = {key: sum(values) / len(values) for key, values in groups.items()}
+  return results
+
+
+def as_dict(results: dict[str, list[dict]]) -> dict[str, dict]:
+  return {name: {(row["game"], row["time"]): row["emotion"] for row in rows} for name, rows in results.items()}
+
+
+def assert_same(results: dict[str, list[dict]], expected: dict[str, dict]) -> None:
+  results = as_dict(results)
+  assert results.keys() == expected.keys()
+  for name in expected:
+    assert results[name].keys() == expected[name].keys()
+    for key, emotion in expected[name].items():
+      assert results[name][key] == pytest.approx(emotion, abs=1e-12)
+
+
+@pytest.fixture(scope="module")
+def expected(db, lexicon) -> dict[str, dict]:
+  return reference(db, lexicon)
+
+
+@pytest.mark.parametrize("batch_size", [1, 97, 5000])
+def test_matches_notebook(db, lexicon, expected, batch_size):
+  pipeline = Pipeline(db, lexicon, batch_size=batch_size)
+  assert_same(pipeline.run(), expected)
+
+
+def test_skips_comments_of_unknown_items(db, lexicon, expected):
+  orphan = {"_id": -1, "aid": 999, "level": 3, "time": 1600000000, "content": "独一无二的内容", "like": 0, "is_root": True}
+  patched = {**db, "BilibiliComments": Collection(db["BilibiliComments"].documents + [orphan])}
+  pipeline = Pipeline(patched, lexicon, batch_size=500)
+  assert_same(pipeline.run(), expected)
+  assert pipeline.skipped == 1
+
+
+def test_parallel_segmentation(db, lexicon, expected):
+  assert_same(Pipeline(db, lexicon, batch_size=700, workers=2).run(), expected)
+
+
+def test_cached_runs(db, lexicon, expected, tmp_path):
+  cache = SegmentCache("v1", tmp_path / "cache.sqlite3")
+  assert_same(Pipeline(db, lexicon, batch_size=300, cache=cache).run(), expected)
+  misses = cache.misses
+  assert_same(Pipeline(db, lexicon, batch_size=300, cache=cache).run(), expected)
+  # 第二次运行全部命中
+  assert cache.misses == misses
+  cache.close()
+
+
+def test_fast_mode_aggregates_the_same_groups(db, lexicon, expected):
+  results = as_dict(Pipeline(db, lexicon, batch_size=300, automaton=Automaton(lexicon)).run())
+  # 不分词时得分与分词后打分有差异，但参与聚合的评论相同
+  assert {name: rows.keys() for name, rows in results.items()} == {name: rows.keys() for name, rows in expected.items()}
@@ -0,0 +1,140 @@
+import time
+import asyncio
+
+import pytest
+
+from benchmarks.stub import StubServer
+from common.proxy import ProxyPool, ProxyStat
+from common.session import HttpSession
+
+# 本地桩服务器可以充当HTTP代理：代理请求的绝对路径同样会得到code=0的响应
+TEST_URL = "http://api.bilibili.com/x/v2/reply/reply?oid=1&type=1&root=1"
+DEAD = "http://127.0.0.1:1"
+
+
+@pytest.fixture(scope="module")
+def stubs():
+  with StubServer() as a, StubServer() as b:
+    yield [a.url, b.url]
+
+
+def expire(pool: ProxyPool, url: str) -> None:
+  pool.proxies[url].quarantined_until = time.monotonic()
+
+
+def test_probe_keeps_working_proxies(stubs):
+  pool = ProxyPool(TEST_URL, timeout=1)
+  assert asyncio.run(pool.probe(stubs + [DEAD])) == 2
+  assert set(pool.proxies) == set(stubs)
+  assert all(stat.latency is not None for stat in pool.proxies.values())
+
+
+def test_latency_feeds_the_score():
+  stat = ProxyStat("a")
+  stat.observe(True, 1.0)
+  before = stat.score
+  for _ in range(5):
+    stat.observe(True, 0.1)
+  assert stat.latency < 0.3
+  assert stat.score > before
+
+
+def test_in_use_limit(stubs):
+  pool = ProxyPool(TEST_URL, timeout=1, max_in_use=1)
+  asyncio.run(pool.probe(stubs))
+  assert {pool.try_acquire(), pool.try_acquire()} == set(stubs)
+  assert pool.try_acquire() is None
+  pool.release(stubs[0], ok=True, latency=0.01)
+  assert pool.try_acquire() == stubs[0]
+
+
+def test_acquire_waits_for_release(stubs):
+  async def main():
+    pool = ProxyPool(TEST_URL, timeout=1, max_in_use=1)
+    await pool.probe(stubs[:1])
+    url = await pool.acquire()
+    waiter = asyncio.create_task(pool.acquire())
+    await asyncio.sleep(0.02)
+    # 代理数少于爬虫数时等待，不退回直连
+    assert not waiter.done()
+    pool.release(url, ok=True)
+    assert await asyncio.wait_for(waiter, 1) == url
+
+  asyncio.run(main())
+
+
+def test_acquire_waits_out_quarantine(stubs):
+  async def main():
+    pool = ProxyPool(TEST_URL, timeout=1, quarantine=0.05)
+    await pool.probe(stubs[:1])
+    url = await pool.acquire()
+    pool.release(url, ok=False, banned=True)
+    # 隔离期满后重新探测，恢复分配
+    assert await asyncio.wait_for(pool.acquire(), 2) == url
+
+  asyncio.run(main())
+
+
+def test_acquire_returns_none_once_all_evicted(stubs):
+  async def main():
+    pool = ProxyPool(TEST_URL, timeout=1, max_strikes=1)
+    await pool.probe(stubs[:1])
+    url = await pool.acquire()
+    waiter = asyncio.create_task(pool.acquire())
+    await asyncio.sleep(0.02)
+    pool.release(url, ok=False, banned=True)
+    assert await asyncio.wait_for(waiter, 1) is None
+    assert await pool.acquire() is None
+
+  asyncio.run(main())
+
+
+def test_banned_proxy_returns_only_after_reprobe(stubs):
+  async def main():
+    pool = ProxyPool(TEST_URL, timeout=1, quarantine=300)
+    await pool.probe(stubs[:1])
+    url = pool.try_acquire()
+    pool.release(url, ok=False, banned=True)
+    assert pool.try_acquire() is None
+    # 隔离期满后也要先重新探测
+    expire(pool, url)
+    assert pool.try_acquire() is None
+    assert await pool.reprobe() == 1
+    assert pool.try_acquire() == url
+    assert await pool.reprobe() == 0
+
+  asyncio.run(main())
+
+
+def test_failed_reprobe_strikes_until_evicted():
+  async def main():
+    pool = ProxyPool(TEST_URL, timeout=0.5, quarantine=300, max_strikes=3)
+    pool.proxies[DEAD] = ProxyStat(DEAD)
+    pool.release(pool.try_acquire(), ok=False, banned=True)
+    for strikes in (2, 3):
+      expire(pool, DEAD)
+      assert await pool.reprobe() == 0
+      if strikes < 3:
+        assert pool.proxies[DEAD].strikes == strikes
+        assert pool.proxies[DEAD].quarantined_until > time.monotonic() + 300
+    assert DEAD not in pool.proxies and DEAD in pool.evicted
+    # 淘汰的代理不会被重新加入
+    assert await pool.probe([DEAD]) == 0
+
+  asyncio.run(main())
+
+
+def test_session_measures_response_latency(stubs):
+  async def main():
+    async with HttpSession() as session:
+      client = session.client(proxy=stubs[0])
+      identity = session.identity_of(client)
+      assert session.take_latency(identity) is None
+      for _ in range(3):
+        await client.get(TEST_URL)
+      latency = session.take_latency(identity)
+      assert latency is not None and 0 < latency < 1
+      # 取出后清空
+      assert session.take_latency(identity) is None
+
+  asyncio.run(main())
@@ -0,0 +1,62 @@
+import random
+
+import numpy as np
+import pytest
+
+from preprocessing.lexicon import Lexicon
+from preprocessing.scorer import VectorScorer
+
+
+@pytest.fixture(scope="module")
+def lexicon() -> Lexicon:
+  return Lexicon()
+
+
+@pytest.fixture(scope="module")
+def scorer(lexicon) -> VectorScorer:
+  return VectorScorer(lexicon)
+
+
+def write_lexicon(root, stopwords, advs, nots, bads, goods) -> Lexicon:
+  for name, words in (("stopwords", stopwords), ("程度副词", advs), ("否定词", nots), ("负面情绪词", bads), ("正面情绪词", goods)):
+    root.joinpath(f"{name}.txt").write_text("\n".join(words) + "\n", encoding="utf-8")
+  return Lexicon(root)
+
+
+def test_same_scores_as_get_emotion(lexicon, scorer):
+  rng = random.Random(2)
+  words = sorted(lexicon.goods)[:300] + sorted(lexicon.bads)[:300] + sorted(lexicon.advs) + sorted(lexicon.nots) + ["游戏", "角色"]
+  separators = [" "] * 20 + ["  ", "\t", " 　 "]
+  sentences = ["", " ", "好 ", " 好", "好\n坏"]
+  for _ in range(3000):
+    tokens = [rng.choice(words) for _ in range(rng.randint(0, 15))]
+    sentences.append("".join(token + rng.choice(separators) for token in tokens).rstrip(" ") if tokens else "")
+  expected = [lexicon.get_emotion(sentence) for sentence in sentences]
+  assert scorer(sentences) == expected
+  # 整批都是规范的分词结果时走快速路径
+  regular = [" ".join(sentence.split()) for sentence in sentences]
+  assert scorer(regular) == expected
+
+
+def test_cut_encodes_like_segmented_strings(lexicon, scorer):
+  contents = ["今天的活动真好玩", "太难受了不好", "", "好 玩", "abc好玩123", "好\t玩", "好\x00玩"]
+  ids, lengths = scorer.cut(contents)
+  expected_ids, expected_lengths = scorer.encode([lexicon.cut_content(content) for content in contents])
+  assert ids.dtype == np.int32
+  assert np.array_equal(ids, expected_ids)
+  assert np.array_equal(lengths, expected_lengths)
+  assert scorer.score_ids(ids, lengths).tolist() == [lexicon.get_emotion(lexicon.cut_content(content)) for content in contents]
+
+
+def test_words_in_several_lists_follow_get_emotion(tmp_path):
+  lexicon = write_lexicon(tmp_path, ["的"], ["很"], ["不"], ["差", "不"], ["好", "差", "很"])
+  scorer = VectorScorer(lexicon)
+  sentences = ["很 好", "不 差", "差 差 好", "很", "不", "的 好", ""]
+  assert scorer(sentences) == [lexicon.get_emotion(sentence) for sentence in sentences]
+
+
+def test_empty_batch(scorer):
+  assert scorer([]) == []
+  ids, lengths = scorer.cut([])
+  assert len(ids) == 0 and len(lengths) == 0
+  assert scorer.score_ids(ids, lengths).tolist() == []
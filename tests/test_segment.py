@@ -0,0 +1,51 @@
+import random
+
+import numpy as np
+import pytest
+
+from preprocessing.lexicon import Lexicon
+from preprocessing.scorer import VectorScorer
+from preprocessing.segment import ParallelSegmenter
+
+
+@pytest.fixture(scope="module")
+def lexicon() -> Lexicon:
+  return Lexicon()
+
+
+@pytest.fixture(scope="module")
+def contents(lexicon) -> list[str]:
+  rng = random.Random(1)
+  words = sorted(lexicon.goods)[:100] + sorted(lexicon.bads)[:100] + sorted(lexicon.nots) + ["游戏", "今天", "我们"]
+  return ["".join(rng.choice(words) for _ in range(rng.randint(1, 12))) for _ in range(2500)]
+
+
+@pytest.fixture(scope="module")
+def segmenter(lexicon):
+  with ParallelSegmenter(2, chunk_size=300, root=lexicon.root) as segmenter:
+    yield segmenter
+
+
+def test_same_words_in_same_order(segmenter, lexicon, contents):
+  assert segmenter(contents) == [lexicon.cut_content(content) for content in contents]
+
+
+def test_same_ids_as_serial_encoding(segmenter, lexicon, contents):
+  ids, lengths = segmenter.encode(contents)
+  expected_ids, expected_lengths = VectorScorer(lexicon).cut(contents)
+  assert ids.dtype == np.int32
+  assert np.array_equal(ids, expected_ids)
+  assert np.array_equal(lengths, expected_lengths)
+
+
+def test_empty_batch(segmenter):
+  assert segmenter([]) == []
+  ids, lengths = segmenter.encode([])
+  assert len(ids) == 0 and len(lengths) == 0
+
+
+def test_chunks_cover_input_in_order(segmenter, contents):
+  chunks = segmenter.chunks(contents)
+  assert len(chunks) >= 2
+  assert all(len(chunk) <= 300 for chunk in chunks)
+  assert [content for chunk in chunks for content in chunk] == contents
@@ -0,0 +1,120 @@
+import json
+import asyncio
+
+from common.db.spill import SpillLog
+from common.db.staging import Overflow, StagingWriter
+from conftest import Collection
+
+KEY = "comments:host-0-Bilibili#1"
+
+
+def records(ids) -> list[str]:
+  return [json.dumps({"_id": i}) for i in ids]
+
+
+def test_segments_roll_over_and_drain_in_order(tmp_path):
+  async def main():
+    spill = SpillLog(KEY, tmp_path, segment_size=4)
+    await spill.append(records(range(10)))
+    await spill.append(records(range(10, 13)))
+    assert len(spill.segments) == 4
+    assert len(spill) == 13
+    collection = Collection()
+    assert await spill.drain(collection, batch_size=3) == 13
+    assert list(collection.documents) == list(range(13))
+    assert list(tmp_path.iterdir()) == []
+
+  asyncio.run(main())
+
+
+def test_names_survive_file_name_encoding(tmp_path):
+  names = {KEY, "comments:123:456", "a.b/c d"}
+  for name in names:
+    SpillLog(name, tmp_path).write(records([0]))
+  assert SpillLog.names(tmp_path) == names
+
+
+def test_new_log_adopts_leftover_segments(tmp_path):
+  async def main():
+    SpillLog(KEY, tmp_path, segment_size=4).write(records(range(6)))
+    # 进程崩溃后以同一名称重新创建
+    spill = SpillLog(KEY, tmp_path, segment_size=4)
+    assert len(spill) == 6
+    await spill.append(records(range(6, 8)))
+    # 遗留的分段不再追加，新记录写入新的分段
+    assert len(spill.segments) == 3
+    collection = Collection()
+    assert await spill.drain(collection) == 8
+    assert list(collection.documents) == list(range(8))
+
+  asyncio.run(main())
+
+
+def test_drain_skips_torn_last_line(tmp_path):
+  async def main():
+    spill = SpillLog(KEY, tmp_path)
+    spill.write(records(range(3)))
+    with open(spill.segments[-1], "ab") as f:
+      f.write(b'{"_id": 3')
+    collection = Collection()
+    assert await SpillLog(KEY, tmp_path).drain(collection) == 3
+    assert list(collection.documents) == [0, 1, 2]
+
+  asyncio.run(main())
+
+
+def test_writer_spills_after_high_water_mark(redis, tmp_path):
+  async def main():
+    collection = Collection()
+    writer = StagingWriter(redis, KEY, batch_size=10, collection=collection, max_length=25, max_memory=0, spill_directory=tmp_path)
+    for page in range(6):
+      await writer.add(records(range(page * 10, page * 10 + 10)))
+    assert writer.spill is not None
+    assert await redis.client.llen(KEY) == 30
+    assert len(writer.spill) == 30
+    await writer.commit()
+    # Redis列表中的记录先于溢出的记录写入
+    order = list(collection.documents)
+    assert set(order[:30]) == set(range(30))
+    assert order[30:] == list(range(30, 60))
+    assert writer.spill is None
+    assert list(tmp_path.iterdir()) == []
+
+  asyncio.run(main())
+
+
+def test_writer_resumes_spill_left_by_crashed_process(redis, tmp_path):
+  async def main():
+    writer = StagingWriter(redis, KEY, batch_size=10, max_length=5, max_memory=0, spill_directory=tmp_path)
+    for page in range(2):
+      await writer.add(records(range(page * 10, page * 10 + 10)))
+    assert len(writer.spill) == 10
+    # 崩溃：写入器丢失，Redis列表与溢出文件遗留
+    collection = Collection()
+    writer = StagingWriter(redis, KEY, batch_size=10, collection=collection, max_length=5, max_memory=0, spill_directory=tmp_path)
+    assert writer.spill is not None
+    await writer.add(records(range(20, 30)))
+    await writer.commit()
+    order = list(collection.documents)
+    assert set(order[:10]) == set(range(10))
+    assert order[10:] == list(range(10, 30))
+
+  asyncio.run(main())
+
+
+def test_wait_transfers_early_instead_of_spilling(redis, tmp_path):
+  async def main():
+    collection = Collection()
+    writer = StagingWriter(
+      redis, KEY, batch_size=10, collection=collection, max_length=15, max_memory=0,
+      overflow=Overflow.Wait, check_interval=0.01, max_wait=0.1, spill_directory=tmp_path
+    )
+    for page in range(3):
+      await writer.add(records(range(page * 10, page * 10 + 10)))
+    assert writer.spill is None
+    assert set(collection.documents) == set(range(20))
+    await writer.commit()
+    assert set(collection.documents) == set(range(30))
+    assert list(tmp_path.iterdir()) == []
+
+  asyncio.run(main())
@@ -0,0 +1,132 @@
+import json
+import asyncio
+
+import pytest
+
+from common.db.staging import Backend, MemoryStagingWriter, StagingWriter, create_staging
+from conftest import Collection
+
+KEY = "comments:test"
+
+
+def records(ids) -> list[str]:
+  return [json.dumps({"_id": i}) for i in ids]
+
+
+class SlowCollection(Collection):
+  """每次写入前等待，用于观察写入慢于爬取时的背压"""
+
+  def __init__(self, delay: float) -> None:
+    super().__init__()
+    self.delay = delay
+
+  async def insert_many(self, documents: list[dict], ordered: bool = True):
+    await asyncio.sleep(self.delay)
+    return await super().insert_many(documents, ordered)
+
+
+@pytest.mark.parametrize("backend", list(Backend))
+def test_backends_commit_the_same_documents(redis, backend):
+  async def main():
+    collection = Collection()
+    writer = create_staging(backend, redis, KEY, collection)
+    for page in range(5):
+      await writer.add(records(range(page * 300, page * 300 + 300)))
+    await writer.commit()
+    assert set(collection.documents) == set(range(1500))
+    await writer.add(records([1500]))
+    await writer.close()
+    if backend == Backend.Memory:
+      assert 1500 in collection.documents
+    else:
+      # Redis后端关闭时只写入Redis，等待下一次转移
+      assert await redis.client.llen(KEY) == 1
+
+  asyncio.run(main())
+
+
+def test_redis_writer_keeps_order(redis):
+  async def main():
+    writer = StagingWriter(redis, KEY, batch_size=100, chunk_size=7)
+    await writer.add(records(range(250)))
+    await writer.flush()
+    # transfer从列表尾部取出，最早写入的记录在尾部
+    items = await redis.client.lrange(KEY, 0, -1)
+    assert [json.loads(item)["_id"] for item in reversed(items)] == list(range(250))
+    assert writer.written == 250
+
+  asyncio.run(main())
+
+
+def test_redis_writer_discard(redis):
+  async def main():
+    writer = StagingWriter(redis, KEY, collection=Collection())
+    await writer.add(records(range(10)))
+    await writer.flush()
+    await writer.add(records(range(10, 20)))
+    await writer.discard()
+    await writer.commit()
+    assert writer.collection.documents == {}
+    assert await redis.client.keys("*") == []
+
+  asyncio.run(main())
+
+
+def test_memory_writer_writes_partial_batch_after_max_delay():
+  async def main():
+    collection = Collection()
+    writer = MemoryStagingWriter(collection, batch_size=1000, max_delay=0.05)
+    await writer.add(records(range(3)))
+    await asyncio.sleep(0.2)
+    assert set(collection.documents) == {0, 1, 2}
+    await writer.close()
+    assert writer.task is None
+
+  asyncio.run(main())
+
+
+def test_memory_writer_bounds_queued_batches():
+  async def main():
+    collection = SlowCollection(0.01)
+    writer = MemoryStagingWriter(collection, batch_size=10, max_batches=2)
+    longest = 0
+    for page in range(30):
+      await writer.add(records(range(page * 10, page * 10 + 10)))
+      longest = max(longest, writer.queue.qsize())
+    assert longest <= 2
+    await writer.commit()
+    assert set(collection.documents) == set(range(300))
+    await writer.close()
+
+  asyncio.run(main())
+
+
+def test_memory_writer_error_until_discard():
+  async def main():
+    collection = Collection(fail_at=1)
+    writer = MemoryStagingWriter(collection, batch_size=10)
+    await writer.add(records(range(10)))
+    with pytest.raises(ConnectionError):
+      await writer.commit()
+    with pytest.raises(ConnectionError):
+      await writer.flush()
+    await writer.discard()
+    await writer.add(records(range(10, 15)))
+    await writer.commit()
+    assert set(collection.documents) == set(range(10, 15))
+    await writer.close()
+
+  asyncio.run(main())
+
+
+def test_memory_writer_discard_drops_unwritten():
+  async def main():
+    collection = Collection()
+    writer = MemoryStagingWriter(collection, batch_size=100, max_delay=10)
+    await writer.add(records(range(50)))
+    await writer.discard()
+    await writer.commit()
+    assert collection.documents == {}
+    await writer.close()
+
+  asyncio.run(main())
@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+from common.crawler import Err
+from common.db.staging import MemoryStagingWriter
+from conftest import Collection
+from weibo import schema
+from weibo.crawler import WeiboCrawler
+
+BLOG = 1
+
+
+def replies(root: int) -> list[schema.Comment]:
+  return [schema.Comment(id=root * 10 + i, blogid=BLOG, time="", likes=0, content="", is_root=False) for i in range(3)]
+
+
+@pytest.mark.parametrize("errors, expected", [
+  ({2: Err.FAILED}, Err.FAILED),
+  ({2: Err.FAILED, 3: Err.IP_BANNED}, Err.IP_BANNED),
+])
+def test_failed_thread_fails_the_article(errors, expected):
+  async def main():
+    crawler = WeiboCrawler()
+    collection = Collection()
+    crawler.staging = MemoryStagingWriter(collection)
+
+    async def fetch_reply_thread(client, uid, id, root):
+      return (False, errors[root]) if root in errors else (True, replies(root))
+
+    crawler.fetch_reply_thread = fetch_reply_thread
+    # 任一楼层失败都不能提交检查点，否则该楼层的回复不会再被爬取
+    assert await crawler.expand_reply_threads(None, 0, BLOG, [1, 2, 3, 4]) == (False, expected)
+    # 成功展开的楼层照常缓存
+    await crawler.staging.commit()
+    assert set(collection.documents) == {reply.id for root in (1, 2, 3, 4) if root not in errors for reply in replies(root)}
+    await crawler.staging.close()
+    await crawler.session.close()
+
+  asyncio.run(main())
@@ -34,6 +34,7 @@ class get_comments(AsyncAPI):
                  count: int = 20,
                  is_show_bulletin: int = 1,
                  is_mix: int = 0,
+                 fetch_level: int = 0,
                  max_id: Optional[int | str] = None,
                  return_url: bool = False) -> str | tuple[str, str]:
     """
@@ -47,9 +48,10 @@ class get_comments(AsyncAPI):
       count(int): 每页评论数
       is_show_bulletin(int): 当查看主评论时，为1；查看回复时，为2
       is_mix(int): 当查看主评论时，为0；查看回复时，为1
+      fetch_level(int): 当查看主评论时，为0；查看回复时，为1
       max_id(int | None): 爬取第一页时非必要，其余必要，由上一页响应得到
     """
-    url = f"https://weibo.com/ajax/statuses/buildComments?is_reload=1&id={id}&is_show_bulletin={is_show_bulletin}&is_mix={is_mix}&count={count}&uid={uid}&fetch_level=0&locale=zh-CN"
+    url = f"https://weibo.com/ajax/statuses/buildComments?is_reload=1&id={id}&is_show_bulletin={is_show_bulletin}&is_mix={is_mix}&count={count}&uid={uid}&fetch_level={fetch_level}&locale=zh-CN"
     if is_asc is not None:
       url += f"&is_asc={is_asc}"
     if flow is not None:
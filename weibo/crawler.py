@@ -4,28 +4,114 @@ import asyncio
 import httpx
 from redis import asyncio as aioredis
 from pathlib import Path
+from datetime import datetime
 from typing import Optional, Callable
-from time import sleep
 
 import_path = Path(__file__).parent.parent.parent
 sys.path.append(str(import_path))
 
-from common.crawler import random_sleep, Err, CrawlResult
+from common.crawler import Err, CrawlResult, CrawlerRunner, slot_id, CircuitBreaker, circuit_breaker, RateLimiter, rate_limiter
 from common.log import get_logger
 from common.db.mongo import MongoDB
 from common.db.redis import Redis
+from common.db.staging import StagingWriter, Backend, create_staging, recover
+from common.db.bloom import BloomFilter
+from common.session import HttpSession
+from common.proxy import ProxyPool
 from .api import *
+from . import schema
+
+
+# 由已写入的评论推算水位线时评论id未知，同一秒内的评论都视为已爬取
+UNKNOWN_ID = 2 ** 63 - 1
+
+
+def created_at_timestamp(created_at: str) -> int:
+  """将微博的created_at（如 Sat Oct 12 10:00:00 +0800 2024）转换为时间戳"""
+  return int(datetime.strptime(created_at, "%a %b %d %H:%M:%S %z %Y").timestamp())
 
 
 class WeiboCrawler:
 
   crawler_count = 0
 
-  def __init__(self) -> None:
+  def __init__(self,
+               session: Optional[HttpSession] = None,
+               breaker: Optional[CircuitBreaker] = None,
+               limiter: Optional[RateLimiter] = None,
+               seen: Optional[BloomFilter] = None,
+               backend: Backend = Backend.Redis) -> None:
+    """
+    Args:
+      session(HttpSession | None): 长连接会话池，可在多个爬虫之间共享；为空时创建爬虫自己的会话池
+      breaker(CircuitBreaker | None): 风控熔断器，为空时使用所有爬虫共享的熔断器
+      limiter(RateLimiter | None): 自建会话池使用的限速器，为空时使用所有爬虫共享的限速器
+      seen(BloomFilter | None): 已写入评论的id过滤器，缓存前跳过已写入的评论，应在所有爬虫之间共享；为空时不过滤
+      backend(Backend): 评论暂存后端（文章列表总是缓存在Redis中）
+    """
     WeiboCrawler.crawler_count += 1
     self.id = WeiboCrawler.crawler_count
     self.logger = get_logger(f"Weibo#{self.id}")
+    self.db = MongoDB().client["MobileGameComments"]
     self.redis = Redis(db=self.id)
+    # 缓存键在主机、进程槽位之间唯一且重启后不变，崩溃遗留的缓存由recover回收
+    self.uid = slot_id("Weibo", self.id)
+    self.comments_key = f"comments:{self.uid}"
+    self.blogs_key = f"blogs:{self.uid}"
+    # 每篇文章的评论缓存在独立的列表中，见begin
+    self.backend = backend
+    self.staging = create_staging(backend, self.redis, self.comments_key, self.db["WeiboComments"], logger=self.logger)
+    self.blogs = StagingWriter(self.redis, self.blogs_key)
+    self.seen = seen
+    # 已缓存、尚未提交的评论id，提交后加入过滤器
+    self.pending: set[int] = set()
+    self.own_session = session is None
+    self.session = session or HttpSession(name=f"Weibo#{self.id}", limiter=limiter or rate_limiter)
+    self.breaker = breaker or circuit_breaker
+
+  async def begin(self, id: int) -> None:
+    """
+    开始爬取一篇文章：之后的评论缓存到该文章独立的Redis列表 comments:<实例id>:<文章id>，
+    多个爬虫并发爬取不同文章时互不交错，失败时只丢弃该文章的缓存
+    """
+    await self.staging.close()
+    self.comments_key = f"comments:{self.uid}:{id}"
+    self.staging = create_staging(self.backend, self.redis, self.comments_key, self.db["WeiboComments"], logger=self.logger)
+    self.pending = set()
+
+  async def stage(self, comments: list[schema.Comment]) -> int:
+    """跳过已写入（过滤器判定）或已缓存的评论，其余按顺序加入Redis缓存写入器，返回加入的数量"""
+    flags = await self.seen.contains([comment.id for comment in comments]) if self.seen else [False] * len(comments)
+    fresh = []
+    for comment, seen in zip(comments, flags):
+      if not seen and comment.id not in self.pending:
+        self.pending.add(comment.id)
+        fresh.append(schema.encode(comment))
+    await self.staging.add(fresh)
+    return len(fresh)
+
+  async def mark_seen(self) -> None:
+    """评论写入MongoDB后调用，将待提交的评论加入过滤器"""
+    if self.seen and self.pending:
+      await self.seen.add(list(self.pending))
+    self.pending = set()
+
+  async def recover(self) -> int:
+    """开始爬取前调用，将上次运行崩溃时遗留的各文章暂存评论写入MongoDB"""
+    key = f"comments:{self.uid}"
+    return await recover(self.redis, [key, f"{key}:*"], self.db["WeiboComments"], logger=self.logger)
+
+  async def discard(self) -> None:
+    """丢弃缓存中尚未提交的评论"""
+    self.pending = set()
+    await self.staging.discard()
+
+  async def close(self) -> None:
+    """写入尚未写入的缓存，关闭爬虫持有的会话池（共享的会话池由创建者负责关闭）"""
+    await self.staging.close()
+    await self.blogs.flush()
+    if self.own_session:
+      await self.session.close()
 
   async def run_fetch_all_user_blogs(self, uid: int, filter: Callable | None = None, **httpx_params) -> CrawlResult:
     """运行爬虫，获取指定uid用户的所有文章，并存储每个文章的数据"""
@@ -34,92 +120,388 @@ class WeiboCrawler:
 
     page = 1
     since_id: Optional[str] = None
-    res = ""
-    async with httpx.AsyncClient(**httpx_params) as client:
-      while True:
-        try:
-          res = await get_user_blogs.call(client, uid, page, since_id)
-          data = json.loads(res)["data"]
-          since_id = data["since_id"]
-          blogs = data["list"]
-          for blog in blogs:
-            id = blog["id"]
-            if id not in st: # 防止进入环
-              st.add(id)
-              blog_info = {
-                "_id": id,
-                "uid": int(blog["user"]["id"]),
-                "author": blog["user"]["screen_name"],
-                "text": blog["text_raw"],
-                "reposts": blog["reposts_count"],
-                "comments": blog["comments_count"],
-                "likes": blog["attitudes_count"],
-                "time": blog["created_at"],
-                "finished": False
-              }
-              if filter is None or filter(blog_info):
-                await self.redis.client.lpush(f"blogs", json.dumps(blog_info))
-              else:
-                self.logger.info(f"文章{id}被过滤")
-          await random_sleep(0.5, 0.7)
-          self.logger.info(f"第{page}页爬取完毕")
-          if not since_id:
-            self.logger.info(f"最后一页，退出")
-            break
-          page += 1
-        except KeyError as e:
-          self.logger.error(f"响应信息中没有键：{e}")
-          return False, Err.FAILED
-        except json.decoder.JSONDecodeError as e:
-          self.logger.error(f"非JSON格式数据：{res}")
-          return False, Err.FAILED
-        except Exception as e:
-          self.logger.exception(e)
-          return False, Err.FAILED
+    client = self.session.client(headers=httpx_params.get("headers"), proxy=httpx_params.get("proxy"))
+    while True:
+      try:
+        data = (await self.breaker.fetch_json(
+          "weibo", self.session.identity_of(client),
+          lambda: get_user_blogs.call(client, uid, page, since_id),
+          logger=self.logger
+        ))["data"]
+        since_id = data["since_id"]
+        blogs = data["list"]
+        records = []
+        for blog in blogs:
+          id = blog["id"]
+          if id not in st: # 防止进入环
+            st.add(id)
+            blog_info = {
+              "_id": id,
+              "uid": int(blog["user"]["id"]),
+              "author": blog["user"]["screen_name"],
+              "text": blog["text_raw"],
+              "reposts": blog["reposts_count"],
+              "comments": blog["comments_count"],
+              "likes": blog["attitudes_count"],
+              "time": blog["created_at"],
+              "finished": False
+            }
+            if filter is None or filter(blog_info):
+              records.append(json.dumps(blog_info))
+            else:
+              self.logger.info(f"文章{id}被过滤")
+        # 每页一次写入
+        await self.blogs.add(records)
+        await self.blogs.flush()
+        self.logger.info(f"第{page}页爬取完毕")
+        if not since_id:
+          self.logger.info(f"最后一页，退出")
+          break
+        page += 1
+      except KeyError as e:
+        self.logger.error(f"响应信息中没有键：{e}")
+        return False, Err.FAILED
+      except json.decoder.JSONDecodeError as e:
+        self.logger.error(f"多次重试后依然风控，放弃")
+        return False, Err.IP_BANNED
+      except Exception as e:
+        self.logger.exception(e)
+        return False, Err.FAILED
     return True, None
   
-  async def run_fetch_blog_comments(self, uid: int, id: int, max_pages: int = 10, **httpx_params):
-    self.logger.info(f"正在爬取 用户{uid} 文章{id} 的评论")
-
-    async with AsyncClient(**httpx_params) as client:
-      max_id = None
-      for page in range(1, max_pages + 1):
-        try:
-          self.logger.info(f"正在爬取 文章{id} 第{page}页")
-          # 热度排序
-          res, url = await get_comments.call(client, uid, id, flow=0, max_id=max_id, return_url=True)
-          data = json.loads(res)
-          comments_data = data["data"]
-          for info in comments_data:
-            comment = {
-              "blogid": id,
-              "time": info["created_at"],
-              "likes": info["like_counts"],
-              "content": info["text_raw"],
-            }
-            await self.redis.client.lpush("comments", json.dumps(comment))
-          max_id = data["max_id"]
-          if not max_id:
-            self.logger.info("最后一页，退出")
+  async def get_checkpoint(self, id: int) -> tuple[int, Optional[int]]:
+    """获取文章的检查点：(已写入的最后一页, 下一页的max_id)，没有检查点时为 (0, None)"""
+    article = await self.db["WeiboArticles"].find_one({"_id": id}, {"page": 1, "max_id": 1})
+    if not article:
+      return 0, None
+    return article.get("page", 0), article.get("max_id")
+
+  async def get_watermark(self, id: int, derive: bool = False) -> Optional[tuple[int, int]]:
+    """
+    获取文章的水位线 (最新评论的时间戳, 评论id)
+    Args:
+      id(int): 文章id
+      derive(bool): 没有记录时是否由已写入的评论推算
+    """
+    article = await self.db["WeiboArticles"].find_one({"_id": id}, {"watermark": 1})
+    if article and article.get("watermark"):
+      return tuple(article["watermark"])
+    if not derive:
+      return None
+    # created_at为字符串，无法在MongoDB中排序；回复不参与水位线，旧版本写入的评论没有is_root字段
+    times = [
+      created_at_timestamp(comment["time"])
+      async for comment in self.db["WeiboComments"].find({"blogid": id, "is_root": {"$ne": False}}, {"time": 1})
+    ]
+    return (max(times), UNKNOWN_ID) if times else None
+
+  async def fetch_reply_thread(self, client: httpx.Client, uid: int, id: int, root: int, max_pages: int = 50) -> CrawlResult:
+    """
+    逐页爬取某条主评论下的所有回复（热度排序），成功时返回回复列表
+    Args:
+      client(AsyncClient): httpx会话
+      uid(int): 作者uid
+      id(int): 文章id
+      root(int): 主评论id
+      max_pages(int): 最大页数
+    """
+    replies = []
+    max_id = 0
+    try:
+      for _ in range(max_pages):
+        data = await self.breaker.fetch_json(
+          "weibo", self.session.identity_of(client),
+          lambda: get_comments.call(client, uid, root, flow=0, is_show_bulletin=2, is_mix=1, fetch_level=1, max_id=max_id),
+          logger=self.logger,
+          decode=schema.decode_comments
+        )
+        replies.extend(schema.Comment.of(raw, id, is_root=False) for raw in data.data)
+        max_id = data.max_id
+        if not max_id:
+          break
+    except KeyError as e:
+      self.logger.warning(f"响应信息中没有键：{e}")
+      return False, Err.FAILED
+    except json.decoder.JSONDecodeError as e:
+      self.logger.error(f"多次重试后依然风控，放弃")
+      return False, Err.IP_BANNED
+    except Exception as e:
+      self.logger.exception(e)
+      return False, Err.FAILED
+    return True, replies
+
+  async def expand_reply_threads(self, client: httpx.Client, uid: int, id: int, roots: list[int], concurrency: int = 4) -> CrawlResult:
+    """
+    展开回复楼层：以有限并发爬取多条主评论的全部回复，按主评论的顺序批量加入缓存。
+    所有请求经过同一个会话池，与评论页共享限速器和熔断器。
+    任一楼层展开失败时返回失败，不提交检查点，重试时从上一个检查点重新爬取
+    Args:
+      client(AsyncClient): httpx会话
+      uid(int): 作者uid
+      id(int): 文章id
+      roots(list[int]): 有回复的主评论id
+      concurrency(int): 同时展开的楼层数
+    """
+    if not roots:
+      return True, None
+    self.logger.info(f"正在展开文章{id}的{len(roots)}个回复楼层")
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def expand(root: int) -> CrawlResult:
+      async with semaphore:
+        return await self.fetch_reply_thread(client, uid, id, root)
+
+    results = await asyncio.gather(*[expand(root) for root in roots])
+    count = await self.stage([reply for res, replies in results if res for reply in replies])
+    failed = [err for res, err in results if not res]
+    if failed:
+      self.logger.warning(f"文章{id}有{len(failed)}个回复楼层展开失败")
+      return False, Err.IP_BANNED if Err.IP_BANNED in failed else Err.FAILED
+    self.logger.info(f"文章{id}回复楼层展开完毕，共缓存{count}条回复")
+    return True, None
+
+  async def commit(self,
+                   id: int,
+                   page: int,
+                   max_id: Optional[int],
+                   finished: bool = False,
+                   watermark: Optional[tuple[int, int]] = None) -> None:
+    """
+    提交检查点：先将缓存的评论写入MongoDB，再记录已写入的最后一页和下一页的max_id。
+    两步之间中断时，重启后会重新爬取上一个检查点之后的页
+    Args:
+      id(int): 文章id
+      page(int): 已完整写入的最后一页
+      max_id(int | None): 下一页的游标
+      finished(bool): 是否已爬取完毕
+      watermark(tuple[int, int] | None): 已写入评论中最新的 (时间戳, 评论id)
+    """
+    await self.staging.commit()
+    await self.mark_seen()
+    checkpoint = {"page": page, "max_id": max_id}
+    if finished:
+      checkpoint["finished"] = True
+    if watermark is not None:
+      checkpoint["watermark"] = list(watermark)
+    await self.db["WeiboArticles"].update_one({"_id": id}, {"$set": checkpoint})
+    self.logger.info(f"文章{id} 检查点：第{page}页")
+
+  async def run_fetch_blog_comments(self,
+                                    uid: int,
+                                    id: int,
+                                    max_pages: int = 10,
+                                    checkpoint_every: int = 5,
+                                    expand_replies: bool = False,
+                                    reply_concurrency: int = 4,
+                                    **httpx_params) -> CrawlResult:
+    """
+    运行爬虫，爬取一篇文章的评论，从上次的检查点继续，爬取完毕后标记文章为已完成
+    Args:
+      uid(int): 作者uid
+      id(int): 文章id
+      max_pages(int): 最多爬取的页数（含检查点之前已爬取的页）
+      checkpoint_every(int): 每爬取多少页提交一次检查点，为0时只在爬取完毕后提交
+      expand_replies(bool): 是否展开有回复的主评论，爬取其全部回复
+      reply_concurrency(int): 同时展开的楼层数
+    """
+    await self.begin(id)
+    page, max_id = await self.get_checkpoint(id)
+    if page == 0:
+      # 从头爬取：评论以id为_id，重复写入是幂等的；只需删除旧版本以自动生成的ObjectId写入的评论
+      await self.db["WeiboComments"].delete_many({"blogid": id, "_id": {"$type": "objectId"}})
+      self.logger.info(f"正在爬取 用户{uid} 文章{id} 的评论")
+    else:
+      self.logger.info(f"正在爬取 用户{uid} 文章{id} 的评论，从检查点继续：第{page + 1}页")
+
+    watermark = await self.get_watermark(id)
+    client = self.session.client(headers=httpx_params.get("headers"), proxy=httpx_params.get("proxy"))
+    # 本检查点内有回复的主评论，提交前展开
+    roots: list[int] = []
+    while page < max_pages:
+      page += 1
+      try:
+        self.logger.info(f"正在爬取 文章{id} 第{page}页")
+        # 热度排序
+        data = await self.breaker.fetch_json(
+          "weibo", self.session.identity_of(client),
+          lambda: get_comments.call(client, uid, id, flow=0, max_id=max_id),
+          logger=self.logger,
+          decode=schema.decode_comments
+        )
+        await self.stage([schema.Comment.of(raw, id) for raw in data.data])
+        for raw in data.data:
+          key = (created_at_timestamp(raw.created_at), raw.id)
+          watermark = key if watermark is None else max(watermark, key)
+        roots.extend(raw.id for raw in data.data if raw.total_number > 0)
+        max_id = data.max_id
+        if not max_id:
+          self.logger.info("最后一页，退出")
+          break
+        if checkpoint_every > 0 and page % checkpoint_every == 0 and page < max_pages:
+          # 楼层在提交前展开，检查点之前的数据都已完整写入
+          if expand_replies:
+            ok, err = await self.expand_reply_threads(client, uid, id, roots, concurrency=reply_concurrency)
+            if not ok:
+              return ok, err
+          roots = []
+          await self.commit(id, page, max_id, watermark=watermark)
+
+      except KeyError as e:
+        self.logger.error(f"响应信息中没有键：{e}")
+        return False, Err.FAILED
+      except json.decoder.JSONDecodeError as e:
+        self.logger.error(f"多次重试后依然风控，放弃")
+        return False, Err.IP_BANNED
+      except Exception as e:
+        self.logger.exception(e)
+        return False, Err.FAILED
+
+    if expand_replies:
+      ok, err = await self.expand_reply_threads(client, uid, id, roots, concurrency=reply_concurrency)
+      if not ok:
+        return ok, err
+    await self.commit(id, page, max_id, finished=True, watermark=watermark)
+    self.logger.info(f"文章{id} 已爬取完毕")
+    return True, None
+
+  async def run_fetch_new_blog_comments(self, uid: int, id: int, max_pages: int = 10, **httpx_params) -> CrawlResult:
+    """
+    增量模式：按时间倒序爬取已爬取完毕的文章中比水位线新的评论，遇到第一条不比水位线新的评论时停止，
+    写入MongoDB后更新水位线
+    Args:
+      uid(int): 作者uid
+      id(int): 文章id
+      max_pages(int): 最多爬取的页数
+    """
+    self.logger.info(f"正在爬取 用户{uid} 文章{id} 的新评论")
+    await self.begin(id)
+    watermark = await self.get_watermark(id, derive=True)
+    latest = watermark
+    count = 0
+
+    client = self.session.client(headers=httpx_params.get("headers"), proxy=httpx_params.get("proxy"))
+    max_id = None
+    for page in range(1, max_pages + 1):
+      try:
+        self.logger.info(f"正在爬取 文章{id} 第{page}页新评论")
+        # 时间倒序
+        data = await self.breaker.fetch_json(
+          "weibo", self.session.identity_of(client),
+          lambda: get_comments.call(client, uid, id, is_asc=0, flow=1, max_id=max_id),
+          logger=self.logger,
+          decode=schema.decode_comments
+        )
+        reached = False
+        fresh = []
+        for raw in data.data:
+          key = (created_at_timestamp(raw.created_at), raw.id)
+          if watermark is not None and key <= watermark:
+            reached = True
             break
-          await random_sleep(0.5, 0.7)
-
-        except KeyError as e:
-          self.logger.error(f"响应信息中没有键：{e}")
-          return False, Err.FAILED
-        except json.decoder.JSONDecodeError as e:
-          self.logger.error(f"非JSON格式数据：{res}")
-          self.logger.info(f"可以尝试访问{url}")
-          return False, Err.FAILED
-        except Exception as e:
-          self.logger.exception(e)
-          return False, Err.FAILED
-      
+          fresh.append(schema.Comment.of(raw, id))
+          latest = key if latest is None else max(latest, key)
+        count += await self.stage(fresh)
+        max_id = data.max_id
+        if reached or not max_id:
+          break
+
+      except KeyError as e:
+        self.logger.error(f"响应信息中没有键：{e}")
+        return False, Err.FAILED
+      except json.decoder.JSONDecodeError as e:
+        self.logger.error(f"多次重试后依然风控，放弃")
+        return False, Err.IP_BANNED
+      except Exception as e:
+        self.logger.exception(e)
+        return False, Err.FAILED
+
+    await self.staging.commit()
+    await self.mark_seen()
+    if latest is not None:
+      await self.db["WeiboArticles"].update_one({"_id": id}, {"$set": {"watermark": list(latest)}})
+    self.logger.info(f"文章{id} 共有{count}条新评论")
     return True, None
 
 
-    
-      
+class WeiboCrawlerRunner:
+  """
+  将微博爬虫接入全局调度器：每个爬虫实例是一个工作协程，多个爬虫并发爬取不同用户的文章，
+  文章按评论数优先爬取；请求速率由共享的限速器按身份控制，不随爬虫数量增长
+  """
+
+  platform = "weibo"
+
+  def __init__(self,
+               runner: CrawlerRunner,
+               crawlers: list[WeiboCrawler],
+               headers: Optional[dict] = None,
+               max_pages: int = 10,
+               checkpoint_every: int = 5,
+               expand_replies: bool = False,
+               incremental: bool = False,
+               proxies: Optional[ProxyPool] = None) -> None:
+    """
+    Args:
+      runner(CrawlerRunner): 全局调度器
+      crawlers(list[WeiboCrawler]): 爬虫实例
+      headers(dict | None): 请求头
+      max_pages(int): 每篇文章最多爬取的页数
+      checkpoint_every(int): 每爬取多少页提交一次检查点
+      expand_replies(bool): 是否展开回复楼层
+      incremental(bool): 增量模式：只刷新已爬取完毕的文章，爬取比水位线新的评论
+      proxies(ProxyPool | None): 代理池，每篇文章分配一个分数最高的代理，没有空闲的代理时等待，代理全部被淘汰后直连
+    """
+    self.runner = runner
+    self.headers = headers
+    self.proxies = proxies
+    self.max_pages = max_pages
+    self.checkpoint_every = checkpoint_every
+    self.expand_replies = expand_replies
+    self.incremental = incremental
+    self.db = MongoDB().client["MobileGameComments"]
+    runner.register(self.platform, [self.handler(crawler) for crawler in crawlers])
+
+  def handler(self, crawler: WeiboCrawler):
+    async def handle(id: int, uid: int) -> CrawlResult:
+      proxy = None
+      if self.proxies:
+        # 等待空闲的代理；代理全部被淘汰时为None，直连
+        proxy = await self.proxies.acquire()
+      identity = HttpSession.identity(self.headers, proxy)
+      if proxy:
+        # 被风控时立即交还代理、换用其他代理重试，不在被封的代理上等待退避
+        crawler.breaker.rotate(self.platform, identity)
+      ok, err = False, Err.FAILED
+      try:
+        if self.incremental:
+          ok, err = await crawler.run_fetch_new_blog_comments(uid, id, headers=self.headers, proxy=proxy, max_pages=self.max_pages)
+        else:
+          ok, err = await crawler.run_fetch_blog_comments(
+            uid, id, headers=self.headers, proxy=proxy,
+            max_pages=self.max_pages, checkpoint_every=self.checkpoint_every, expand_replies=self.expand_replies
+          )
+      finally:
+        if self.proxies:
+          self.proxies.release(proxy, ok, latency=crawler.session.take_latency(identity), banned=err == Err.IP_BANNED)
+        if not ok:
+          # 丢弃失败（或租约丢失被中止）的文章最后一个检查点之后缓存的评论，重试时从检查点继续
+          await crawler.discard()
+      return ok, err
+    return handle
+
+  async def load(self, uids: list[int]) -> int:
+    """将指定用户未爬取完毕（增量模式下为已爬取完毕）的文章加入调度器，返回加入的数量"""
+    count = 0
+    cursor = self.db["WeiboArticles"].find(
+      {"uid": {"$in": uids}, "finished": True if self.incremental else {"$ne": True}},
+      {"uid": 1, "comments": 1}
+    )
+    async for article in cursor:
+      self.runner.push(self.platform, article["_id"], priority=article.get("comments", 0), payload=article["uid"])
+      count += 1
+    return count
+
+
 
 if __name__ == "__main__":
   import asyncio
@@ -144,7 +526,7 @@ if __name__ == "__main__":
       else:
         # TODO: 存入MongoDB
         run(transfer(
-          crawler.redis, "blogs", mongo["WeiboArticles"], logger=logger
+          crawler.redis, crawler.blogs_key, mongo["WeiboArticles"], logger=logger
         ))
   
   async def main():
@@ -155,15 +537,9 @@ if __name__ == "__main__":
         if article["finished"]:
           logger.info(f"文章{id}已爬取完毕，跳过")
           continue
-        # 删除已存在的评论，防止重复
-        await mongo["WeiboComments"].delete_many({"blogid": id})
         ok, _ = await crawler.run_fetch_blog_comments(uid, id, headers=headers)
-        if ok:
-          await transfer(crawler.redis, "comments", mongo["WeiboComments"], upsert=False, logger=logger)
-        else:
+        if not ok:
           logger.error("爬取评论失败")
           break
-        logger.info(f"文章{id} 已爬取完毕")
-        await mongo["WeiboArticles"].update_one({"_id": id}, {"$set": {"finished": True}})
 
   run(main())
@@ -0,0 +1,60 @@
+"""
+buildComments接口响应的类型化解码。
+只声明需要存储的字段，解码时跳过用户资料、图片、徽章等其余字段，直接得到紧凑的结构体；
+评论记录可以直接序列化为Redis缓存格式（JSON对象）
+"""
+import json
+import msgspec
+
+
+class RawComment(msgspec.Struct):
+  id: int
+  created_at: str
+  like_counts: int = 0
+  text_raw: str = ""
+  # 回复数
+  total_number: int = 0
+
+
+class CommentsResponse(msgspec.Struct):
+  """/ajax/statuses/buildComments 的响应"""
+  data: list[RawComment]
+  max_id: int | str = 0
+
+
+class Comment(msgspec.Struct):
+  """存储的评论记录，字段与WeiboComments集合一致，以评论id作为_id，重复写入同一条评论是幂等的"""
+  id: int = msgspec.field(name="_id")
+  blogid: int
+  time: str
+  likes: int
+  content: str
+  is_root: bool = True
+
+  @staticmethod
+  def of(raw: RawComment, blogid: int, is_root: bool = True) -> "Comment":
+    return Comment(id=raw.id, blogid=blogid, time=raw.created_at, likes=raw.like_counts, content=raw.text_raw, is_root=is_root)
+
+
+comments_decoder = msgspec.json.Decoder(CommentsResponse)
+encoder = msgspec.json.Encoder()
+
+
+def decode_comments(text: str | bytes) -> CommentsResponse:
+  """
+  解码评论接口响应
+  Raises:
+    json.decoder.JSONDecodeError: 响应不是JSON（大概率风控）
+    KeyError: 响应结构与预期不符
+  """
+  try:
+    return comments_decoder.decode(text)
+  except msgspec.ValidationError as e:
+    raise KeyError(str(e)) from e
+  except msgspec.DecodeError as e:
+    raise json.decoder.JSONDecodeError(str(e), text if isinstance(text, str) else text.decode(errors="replace"), 0) from e
+
+
+def encode(comment: Comment) -> bytes:
+  """序列化为Redis缓存格式"""
+  return encoder.encode(comment)